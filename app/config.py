@@ -0,0 +1,270 @@
+# app/config.py
+#
+# Настройки сервиса. Все значения можно переопределить переменными окружения.
+
+import os
+import tempfile
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if not value:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# --------------------------------------
+# Внешние сервисы
+# --------------------------------------
+
+# Базовые адреса ground-control и оркестратора (для симулятора –
+# http://localhost:9000, см. simulator/airport.py)
+GROUND_CONTROL_URL = os.getenv("TRANSPORTER_GROUND_CONTROL_URL", "https://ground-control.reaport.ru").rstrip("/")
+ORCHESTRATOR_URL = os.getenv("TRANSPORTER_ORCHESTRATOR_URL", "https://orchestrator.reaport.ru").rstrip("/")
+
+# --------------------------------------
+# HTTP-клиент для ground-control и оркестратора
+# --------------------------------------
+
+# Разрешить HTTP/2 (нужен пакет h2, ставится через httpx[http2])
+HTTP2_ENABLED = _env_bool("TRANSPORTER_HTTP2", True)
+
+# Лимиты пула соединений
+HTTP_MAX_CONNECTIONS = _env_int("TRANSPORTER_HTTP_MAX_CONNECTIONS", 100)
+HTTP_MAX_KEEPALIVE = _env_int("TRANSPORTER_HTTP_MAX_KEEPALIVE", 20)
+HTTP_KEEPALIVE_EXPIRY = _env_float("TRANSPORTER_HTTP_KEEPALIVE_EXPIRY", 30.0)
+
+# Таймауты (сек) по умолчанию и для отдельных эндпоинтов
+HTTP_CONNECT_TIMEOUT = _env_float("TRANSPORTER_HTTP_CONNECT_TIMEOUT", 3.0)
+HTTP_DEFAULT_TIMEOUT = _env_float("TRANSPORTER_HTTP_TIMEOUT", 10.0)
+ENDPOINT_TIMEOUTS = {
+    "register-vehicle": _env_float("TRANSPORTER_TIMEOUT_REGISTER", 10.0),
+    "route": _env_float("TRANSPORTER_TIMEOUT_ROUTE", 5.0),
+    "move": _env_float("TRANSPORTER_TIMEOUT_MOVE", 3.0),
+    "arrived": _env_float("TRANSPORTER_TIMEOUT_ARRIVED", 3.0),
+    "orchestrator": _env_float("TRANSPORTER_TIMEOUT_ORCHESTRATOR", 5.0),
+}
+
+# --------------------------------------
+# Предохранители (circuit breaker) для ground-control и оркестратора
+# --------------------------------------
+
+BREAKER_ENABLED = _env_bool("TRANSPORTER_BREAKER_ENABLED", True)
+# Сколько ошибок подряд (сеть, таймаут, 5xx) открывают предохранитель
+BREAKER_FAILURE_THRESHOLD = _env_int("TRANSPORTER_BREAKER_FAILURE_THRESHOLD", 5)
+# Через сколько секунд после открытия пропустить пробный запрос
+BREAKER_RESET_TIMEOUT = _env_float("TRANSPORTER_BREAKER_RESET_TIMEOUT", 10.0)
+# Сколько пробных запросов одновременно (остальные ждут их итога)
+BREAKER_HALF_OPEN_MAX_CALLS = _env_int("TRANSPORTER_BREAKER_HALF_OPEN_MAX_CALLS", 1)
+
+# --------------------------------------
+# Кэш маршрутов ground-control
+# --------------------------------------
+
+ROUTE_CACHE_TTL = _env_float("TRANSPORTER_ROUTE_CACHE_TTL", 600.0)
+ROUTE_CACHE_MAX_SIZE = _env_int("TRANSPORTER_ROUTE_CACHE_MAX_SIZE", 1024)
+# Использовать развёрнутый маршрут B -> A для запроса A -> B.
+# Включать, только если граф аэропорта в ground-control неориентированный.
+ROUTE_CACHE_REVERSE = _env_bool("TRANSPORTER_ROUTE_CACHE_REVERSE", False)
+
+# --------------------------------------
+# Парк машин
+# --------------------------------------
+
+# Максимальное число машин, которое сервис регистрирует в ground-control
+FLEET_MAX_SIZE = _env_int("TRANSPORTER_FLEET_MAX_SIZE", 6)
+# После отказа ground-control в регистрации (нет свободного узла) новые
+# машины не регистрируются столько секунд; поездки ждут свободную машину
+FLEET_REGISTER_RETRY_SEC = _env_float("TRANSPORTER_FLEET_REGISTER_RETRY_SEC", 5.0)
+
+# --------------------------------------
+# Очередь поездок (диспетчер)
+# --------------------------------------
+
+# Максимум ожидающих поездок; сверх него /load и /upload отвечают 503
+DISPATCH_QUEUE_MAX_SIZE = _env_int("TRANSPORTER_DISPATCH_QUEUE_MAX_SIZE", 1000)
+
+# --------------------------------------
+# Движение машин
+# --------------------------------------
+
+# Запрашивать /move следующего сегмента, пока машина едет по текущему.
+# Если ground-control отказывает в разрешении «заранее», запрос
+# повторяется после прибытия в узел.
+MOVEMENT_PREFETCH = _env_bool("TRANSPORTER_MOVEMENT_PREFETCH", True)
+
+# --------------------------------------
+# Повторы запросов к ground-control и оркестратору
+# --------------------------------------
+
+# Экспоненциальная задержка с полным джиттером: random(0, min(MAX, BASE * 2^n))
+RETRY_BASE_DELAY = _env_float("TRANSPORTER_RETRY_BASE_DELAY", 0.2)
+RETRY_MAX_DELAY = _env_float("TRANSPORTER_RETRY_MAX_DELAY", 5.0)
+RETRY_MAX_ATTEMPTS = _env_int("TRANSPORTER_RETRY_MAX_ATTEMPTS", 5)
+RETRY_DEADLINE = _env_float("TRANSPORTER_RETRY_DEADLINE", 20.0)
+# /move: 409 «узел занят» – штатная ситуация, бюджет больше
+RETRY_MOVE_MAX_ATTEMPTS = _env_int("TRANSPORTER_RETRY_MOVE_MAX_ATTEMPTS", 30)
+RETRY_MOVE_DEADLINE = _env_float("TRANSPORTER_RETRY_MOVE_DEADLINE", 90.0)
+
+# --------------------------------------
+# Журнал аудита
+# --------------------------------------
+
+# У воркера с номером n > 0 (services/worker.py) свой файл: audit.n.log
+AUDIT_LOG_PATH = os.getenv("TRANSPORTER_AUDIT_LOG_PATH", "audit.log")
+AUDIT_LOG_MAX_BYTES = _env_int("TRANSPORTER_AUDIT_LOG_MAX_BYTES", 10 * 1024 * 1024)
+AUDIT_LOG_BACKUPS = _env_int("TRANSPORTER_AUDIT_LOG_BACKUPS", 5)
+
+# --------------------------------------
+# Общее состояние (парк, самолёты, настройки)
+# --------------------------------------
+
+# memory – состояние в памяти процесса (один воркер uvicorn);
+# sqlite – общий файл SQLite в режиме WAL (несколько воркеров на одной машине)
+STATE_BACKEND = os.getenv("TRANSPORTER_STATE_BACKEND", "memory")
+STATE_SQLITE_PATH = os.getenv("TRANSPORTER_STATE_SQLITE_PATH", "transporter_state.db")
+# Как часто диспетчер перепроверяет парк, если машину освободил другой воркер
+STATE_POLL_INTERVAL = _env_float("TRANSPORTER_STATE_POLL_INTERVAL", 1.0)
+# Номер воркера (services/worker.py): пустая строка – первый свободный;
+# файлы блокировок номеров лежат в WORKER_LOCK_DIR, общем для воркеров
+# (по умолчанию – во временном каталоге системы, а не в текущем)
+WORKER_ID = os.getenv("TRANSPORTER_WORKER_ID", "")
+WORKER_LOCK_DIR = os.getenv("TRANSPORTER_WORKER_LOCK_DIR",
+                            os.path.join(tempfile.gettempdir(), "transporter-workers"))
+
+# Вместимость машины по умолчанию (до вызова /updateCapacity)
+DEFAULT_VEHICLE_CAPACITY = _env_int("TRANSPORTER_DEFAULT_VEHICLE_CAPACITY", 400)
+
+# --------------------------------------
+# Журнал поездок (восстановление после перезапуска)
+# --------------------------------------
+
+# Пустая строка – журнал отключён. У воркера с номером n > 0 (services/worker.py)
+# свой файл: trip_journal.n.jsonl
+TRIP_JOURNAL_PATH = os.getenv("TRANSPORTER_TRIP_JOURNAL_PATH", "trip_journal.jsonl")
+# Сжимать журнал (оставлять только активные поездки), когда в нём столько записей
+TRIP_JOURNAL_COMPACT_EVERY = _env_int("TRANSPORTER_TRIP_JOURNAL_COMPACT_EVERY", 1000)
+# fsync после каждой записи: переживает и отключение питания, но медленнее
+TRIP_JOURNAL_FSYNC = _env_bool("TRANSPORTER_TRIP_JOURNAL_FSYNC", False)
+
+# --------------------------------------
+# Планировщик назначений машин
+# --------------------------------------
+
+# True – свободные машины распределяются между поездками в очереди
+# с минимальным суммарным пробегом; False – первая подходящая машина
+PLANNER_ENABLED = _env_bool("TRANSPORTER_PLANNER_ENABLED", True)
+
+# Сколько поездок планируется за раз (остальные – следующим планом): время
+# плана растёт как квадрат числа поездок, а план идёт в цикле событий
+PLANNER_MAX_TRIPS = _env_int("TRANSPORTER_PLANNER_MAX_TRIPS", 100)
+
+# --------------------------------------
+# Цепочки поездок
+# --------------------------------------
+
+# True – после посадки/высадки машина остаётся у самолёта и может сразу
+# ехать к следующему; в гараж – только если простояла дольше порога
+VEHICLE_CHAINING = _env_bool("TRANSPORTER_VEHICLE_CHAINING", False)
+VEHICLE_IDLE_RETURN_SEC = _env_float("TRANSPORTER_VEHICLE_IDLE_RETURN_SEC", 30.0)
+
+# --------------------------------------
+# Симуляция
+# --------------------------------------
+
+# Ускорение времени: движение, посадка и простой машин идут в TIME_SCALE
+# раз быстрее (1 – реальное время). Для прогонов на симуляторе.
+TIME_SCALE = _env_float("TRANSPORTER_TIME_SCALE", 1.0)
+
+# --------------------------------------
+# Оценка сроков обслуживания (пакетные запросы)
+# --------------------------------------
+
+# Расстояние гараж -> самолёт (м), пока планировщик не знает ни одного маршрута
+ETA_DEFAULT_DISTANCE = _env_float("TRANSPORTER_ETA_DEFAULT_DISTANCE", 1000.0)
+
+# Сколько секунд (часов поездок) оценка сроков по очереди переиспользуется,
+# если очередь и парк не менялись
+ETA_CACHE_SEC = _env_float("TRANSPORTER_ETA_CACHE_SEC", 1.0)
+
+# --------------------------------------
+# Отслеживание запросов и поток событий (/jobs, /events)
+# --------------------------------------
+
+# Сколько событий держится в очереди одного подписчика /events;
+# при переполнении вытесняются самые старые
+EVENT_BUFFER_SIZE = _env_int("TRANSPORTER_EVENT_BUFFER_SIZE", 256)
+# Пустое сообщение в поток /events, если событий нет (сек)
+EVENT_HEARTBEAT_SEC = _env_float("TRANSPORTER_EVENT_HEARTBEAT_SEC", 15.0)
+# Сколько завершённых запросов помнит /jobs/{id}
+JOBS_MAX_FINISHED = _env_int("TRANSPORTER_JOBS_MAX_FINISHED", 1000)
+
+# --------------------------------------
+# Админка (/admin/ui, /admin/vehicles)
+# --------------------------------------
+
+# Снимок парка для /admin/vehicles пересобирается при изменении машин в этом
+# процессе. С общим хранилищем (sqlite) машины меняют и другие воркеры –
+# тогда снимок считается свежим не дольше стольких секунд
+ADMIN_SNAPSHOT_MAX_AGE_SEC = _env_float("TRANSPORTER_ADMIN_SNAPSHOT_MAX_AGE_SEC", 1.0)
+
+# --------------------------------------
+# Исходящие уведомления (/arrived, оркестратор)
+# --------------------------------------
+
+# Сколько уведомлений может ждать отправки; при переполнении поездка ждёт места
+OUTBOX_MAX_SIZE = _env_int("TRANSPORTER_OUTBOX_MAX_SIZE", 10000)
+# Обработчики очереди (параллельные запросы к внешним сервисам)
+OUTBOX_WORKERS = _env_int("TRANSPORTER_OUTBOX_WORKERS", 8)
+# Попытки отправить одно уведомление (каждая – со своими повторами http_client)
+OUTBOX_MAX_ATTEMPTS = _env_int("TRANSPORTER_OUTBOX_MAX_ATTEMPTS", 10)
+# Пауза перед повторной попыткой (сек), удваивается с каждой попыткой
+OUTBOX_RETRY_DELAY = _env_float("TRANSPORTER_OUTBOX_RETRY_DELAY", 1.0)
+# Сколько секунд (с постановки) повторять /arrived: следующий маршрут
+# машины ждёт его доставки и дольше не простаивает
+OUTBOX_ARRIVED_MAX_RETRY_SEC = _env_float("TRANSPORTER_OUTBOX_ARRIVED_MAX_RETRY_SEC", 15.0)
+# Файл для неотправленных уведомлений (переживают перезапуск); пустая строка –
+# только в памяти. У воркера с номером n > 0 (services/worker.py) свой файл
+# с номером перед расширением
+OUTBOX_PATH = os.getenv("TRANSPORTER_OUTBOX_PATH", "")
+# Сжимать файл уведомлений, когда в нём столько строк сверх неотправленных
+OUTBOX_COMPACT_EVERY = _env_int("TRANSPORTER_OUTBOX_COMPACT_EVERY", 1000)
+# Сколько секунд при остановке ждать отправки очереди
+OUTBOX_DRAIN_TIMEOUT = _env_float("TRANSPORTER_OUTBOX_DRAIN_TIMEOUT", 5.0)
+
+# --------------------------------------
+# Подготовка при старте (/ready)
+# --------------------------------------
+
+# Сколько машин зарегистрировать заранее (не больше FLEET_MAX_SIZE; 0 – регистрировать
+# только по мере надобности, в поездках)
+WARMUP_FLEET_SIZE = _env_int("TRANSPORTER_WARMUP_FLEET_SIZE", 0)
+# Заранее запросить маршруты от гаражей до мест стоянки самолётов (serviceSpots)
+WARMUP_ROUTES = _env_bool("TRANSPORTER_WARMUP_ROUTES", True)
+# Не дольше стольких секунд: потом сервис считается готовым в любом случае
+WARMUP_TIMEOUT = _env_float("TRANSPORTER_WARMUP_TIMEOUT", 60.0)
+
+# --------------------------------------
+# Диагностика цикла событий (/admin/loop, /admin/profile)
+# --------------------------------------
+
+# Следить за задержкой цикла событий и ловить блокирующий код
+LOOP_MONITOR_ENABLED = _env_bool("TRANSPORTER_LOOP_MONITOR_ENABLED", True)
+# Как часто цикл отмечается (сек); задержка отметки – задержка цикла
+LOOP_MONITOR_INTERVAL = _env_float("TRANSPORTER_LOOP_MONITOR_INTERVAL", 0.1)
+# Цикл занят одним обратным вызовом дольше стольких секунд – записываем стек
+LOOP_SLOW_CALLBACK_SEC = _env_float("TRANSPORTER_LOOP_SLOW_CALLBACK_SEC", 0.1)
+# Сколько последних таких случаев (со стеками) показывает /admin/loop
+LOOP_STALLS_KEPT = _env_int("TRANSPORTER_LOOP_STALLS_KEPT", 50)
+# Самое долгое профилирование через /admin/profile (сек)
+PROFILER_MAX_SECONDS = _env_float("TRANSPORTER_PROFILER_MAX_SECONDS", 60.0)
@@ -2,18 +2,74 @@
 
 import uvicorn
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
-from routes import transporter, admin
+import config
+
+from routes import transporter, jobs, admin, metrics, health
+from services import http_client
+from services.dispatcher import dispatcher
+from services.fleet import fleet
+from services.aircraft import aircraft_registry
+from services.route_cache import route_cache
+from services.retry import retry_stats
+from services.circuit_breaker import breakers
+from services.outbox import outbox
+from services.metrics import install_state_collector
+from services.audit import start_audit_logging, stop_audit_logging
+from services.state_store import state_store
+from services.trip_journal import trip_journal
+from services.warmup import warmup
+from services.loop_monitor import loop_monitor
+from services.worker import worker
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Номер воркера – до журнала поездок: у каждого воркера свой файл
+    worker.start()
+    # Журнал аудита пишется в фоновом потоке (после номера воркера: файл свой)
+    start_audit_logging()
+    # Задержка цикла событий и стеки блокирующего кода (/admin/loop)
+    loop_monitor.start()
+    # Один HTTP-клиент с keep-alive на всё время жизни приложения
+    await http_client.start_client()
+    outbox.start()
+    # Незавершённые поездки из журнала продолжаются с последнего этапа
+    await dispatcher.recover()
+    dispatcher.start()
+    # Регистрация машин и прогрев маршрутов – в фоне, /ready ответит 200 после них
+    warmup.start()
+    try:
+        yield
+    finally:
+        await warmup.stop()
+        await dispatcher.stop()
+        # Уведомления о завершении сеансов, ещё не ушедшие оркестратору
+        await aircraft_registry.stop()
+        await outbox.stop(config.OUTBOX_DRAIN_TIMEOUT)
+        trip_journal.close()
+        await http_client.close_client()
+        stop_audit_logging()
+        state_store.close()
+        loop_monitor.stop()
+        worker.stop()
+
 
 def create_app() -> FastAPI:
     app = FastAPI(
         title="Transporter API",
         description="API для управления посадкой и высадкой пассажиров",
-        version="1.0.0"
+        version="1.0.0",
+        lifespan=lifespan
     )
     app.include_router(transporter.router, tags=["Transporter"])
+    app.include_router(jobs.router, tags=["Jobs"])
     app.include_router(admin.router, tags=["Admin"])
+    app.include_router(metrics.router, tags=["Metrics"])
+    app.include_router(health.router, tags=["Health"])
+    install_state_collector(fleet, aircraft_registry, dispatcher, route_cache, retry_stats, breakers, outbox)
     return app
 
 
@@ -26,18 +82,8 @@ if __name__ == "__main__":
         format='[%(asctime)s] [%(levelname)s] [%(name)s] %(message)s',
         datefmt='%Y-%m-%d %H:%M:%S'
     )
-
-    # Создадим отдельный логгер для аудита, который пишет в файл
-    audit_logger = logging.getLogger("audit")
-    audit_logger.setLevel(logging.INFO)
-
-    # Хендлер в файл audit.log
-    audit_file_handler = logging.FileHandler("audit.log", encoding="utf-8")
-    audit_file_handler.setFormatter(logging.Formatter(
-        fmt='[%(asctime)s] [%(levelname)s] [%(name)s] %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    ))
-    audit_logger.addHandler(audit_file_handler)
+    # Логгер аудита (JSON lines в audit.log) подключается при старте
+    # приложения, см. services/audit.py
 
     # Запуск uvicorn
     uvicorn.run(
@@ -1,66 +1,173 @@
 # app/routes/admin.py
 
 import os
-from fastapi import APIRouter
-from fastapi.responses import HTMLResponse
-from services.tasks import (
-    vehicle_node_mapping,
-    vehicle_node_mapping_place,
-    vehicle_capacity,
-    lock_object
-)
+import asyncio
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, PlainTextResponse
+import config
+from services.route_cache import route_cache
+from services.dispatcher import dispatcher
+from services.planner import planner
+from services import retry, circuit_breaker
+from services.audit import read_audit, format_record
+from services.fleet import fleet
+from services.aircraft import aircraft_registry
+from services.state_store import state_store
+from services.events import event_bus
+from services.jobs import job_registry
+from services.outbox import outbox
+from services.loop_monitor import loop_monitor
+from services.profiler import profiler, ProfilerBusy
+from services.admin_cache import cached_response, fleet_snapshot, load_asset
+from schemas import VehicleCapacity
 
 router = APIRouter()
 
+# Страница админки читается и сжимается один раз, при старте
+_admin_ui = load_asset(os.path.join(os.path.dirname(__file__), "admin_ui.html"))
+
+
 @router.get("/admin/vehicles")
-async def list_vehicles():
+async def list_vehicles(request: Request):
     """
     Возвращает JSON со списком машин,
     их текущим положением и т.д.
+    Ответ – готовый снимок парка: пока машины не менялись, он не
+    пересобирается, а клиент с тем же ETag получает 304.
+    """
+    return cached_response(request, fleet_snapshot.get(), "application/json")
+
+
+@router.put("/admin/vehicles/{vehicle_id}/capacity")
+async def set_vehicle_capacity(vehicle_id: str, new_cap: VehicleCapacity):
+    """
+    Своя вместимость машины (вместо общей из /updateCapacity).
+    """
+    if not await fleet.set_capacity(vehicle_id, new_cap.capacity):
+        raise HTTPException(status_code=404, detail="Машина не найдена")
+    return {"vehicle_id": vehicle_id, "capacity": new_cap.capacity}
+
+
+@router.delete("/admin/vehicles/{vehicle_id}/capacity")
+async def reset_vehicle_capacity(vehicle_id: str):
+    """
+    Возвращает машине общую вместимость.
+    """
+    if not await fleet.set_capacity(vehicle_id, None):
+        raise HTTPException(status_code=404, detail="Машина не найдена")
+    return {"vehicle_id": vehicle_id, "capacity": state_store.get_capacity()}
+
+
+@router.get("/admin/stats")
+async def get_stats():
+    """
+    Счётчики внутренних подсистем (кэш маршрутов, обслуживаемые самолёты и т.д.).
+    """
+    return {
+        "route_cache": route_cache.stats(),
+        "aircraft": aircraft_registry.stats(),
+        "dispatcher": dispatcher.stats(),
+        "pending_trips": dispatcher.pending(),
+        "planner": planner.stats(),
+        "retries": retry.stats_snapshot(),
+        "breakers": circuit_breaker.stats_snapshot(),
+        "outbox": outbox.stats(),
+        "loop": loop_monitor.stats(),
+        "jobs": job_registry.stats(),
+        "events": event_bus.stats(),
+        "fleet_snapshot": fleet_snapshot.stats()
+    }
+
+
+@router.get("/admin/aircraft")
+async def list_aircraft_sessions(aircraft_id: Optional[str] = None):
+    """
+    Открытые сеансы посадки/высадки: сколько поездок и пассажиров
+    запланировано, сколько уже перевезено, какие машины у самолёта.
+    """
+    if aircraft_id is not None:
+        sessions = aircraft_registry.get(aircraft_id)
+        if not sessions:
+            raise HTTPException(status_code=404, detail="Самолёт не обслуживается")
+        return {"sessions": sessions}
+    return {"sessions": list(aircraft_registry.snapshot().values())}
+
+
+@router.delete("/admin/route-cache")
+async def flush_route_cache(node: Optional[str] = None):
+    """
+    Сбрасывает кэш маршрутов: целиком или только маршруты через узел node.
     """
-    with lock_object:
-        data = []
-        for v_id, node in vehicle_node_mapping.items():
-            data.append({
-                "vehicle_id": v_id,
-                "current_node": node,
-                "service_spots": vehicle_node_mapping_place.get(v_id, {})
-            })
-        return {
-            "count": len(data),
-            "vehicles": data,
-            "capacity": vehicle_capacity
-        }
+    removed = route_cache.invalidate(node)
+    return {"removed": removed}
 
 
 @router.get("/admin/audit")
-async def get_audit():
+async def get_audit(
+    tail: int = Query(100, ge=1, le=5000, description="Сколько последних записей вернуть"),
+    cursor: Optional[int] = Query(None, ge=0, description="next_cursor из предыдущего ответа"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    aircraft_id: Optional[str] = None,
+    vehicle_id: Optional[str] = None
+):
     """
-    Возвращает содержимое audit.log в виде JSON-массива строк.
-    Если файл не найден или пуст, возвращаем ["(Нет записей)"].
+    Последние записи audit.log (новые первыми) с фильтрами и постраничным
+    чтением: следующая страница – тот же запрос с cursor=next_cursor.
+    Файл читается с конца в отдельном потоке, не блокируя event loop.
     """
-    logfile_path = "audit.log"  # Путь к вашему лог-файлу
-    if os.path.exists(logfile_path):
-        with open(logfile_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-        # Удаляем переносы строк
-        lines = [line.rstrip("\n\r") for line in lines]
-        if lines:
-            return {"lines": lines}
-    return {"lines": ["(Нет записей или файл не найден)"]}
+    result = await asyncio.to_thread(
+        read_audit,
+        limit=tail,
+        cursor=cursor,
+        since=since.timestamp() if since else None,
+        until=until.timestamp() if until else None,
+        aircraft_id=aircraft_id,
+        vehicle_id=vehicle_id
+    )
+    records = result["records"]
+    lines = [format_record(entry) for entry in records] or ["(Нет записей или файл не найден)"]
+    return {
+        "lines": lines,
+        "records": records,
+        "next_cursor": result["next_cursor"]
+    }
 
 
-@router.get("/admin/ui", response_class=HTMLResponse)
-async def admin_ui():
+@router.get("/admin/loop")
+async def get_loop_stats():
     """
-    Возвращает содержимое admin_ui.html.
+    Задержка цикла событий и последние случаи, когда он был занят дольше
+    LOOP_SLOW_CALLBACK_SEC, со стеком места блокировки.
     """
-    # Определяем путь к файлу admin_ui.html
-    html_path = os.path.join(os.path.dirname(__file__), "admin_ui.html")
-    if not os.path.exists(html_path):
-        return HTMLResponse("<h1>admin_ui.html not found</h1>", status_code=404)
+    return {"monitor": loop_monitor.stats(), "stalls": loop_monitor.recent_stalls()}
 
-    with open(html_path, "r", encoding="utf-8") as f:
-        html_content = f.read()
 
-    return HTMLResponse(html_content)
+@router.get("/admin/profile", response_class=PlainTextResponse)
+async def get_profile(
+    seconds: float = Query(5.0, gt=0, le=config.PROFILER_MAX_SECONDS, description="Сколько секунд профилировать"),
+    interval: float = Query(0.01, ge=0.001, le=1.0, description="Пауза между выборками (сек)"),
+    all_threads: bool = Query(False, description="Все потоки процесса, а не только цикл событий")
+):
+    """
+    Профиль по выборкам стека за seconds секунд в формате collapsed stacks
+    (строка «кадр;кадр;... число выборок»): flamegraph.pl, speedscope.
+    Одновременно идёт только одно профилирование.
+    """
+    try:
+        counts = await profiler.run(seconds, interval, all_threads)
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="Профилирование уже идёт")
+    return PlainTextResponse(profiler.collapsed(counts))
+
+
+@router.get("/admin/ui", response_class=HTMLResponse)
+async def admin_ui(request: Request):
+    """
+    Возвращает содержимое admin_ui.html (из памяти, с ETag и сжатием).
+    """
+    if _admin_ui is None:
+        return HTMLResponse("<h1>admin_ui.html not found</h1>", status_code=404)
+    return cached_response(request, _admin_ui, "text/html; charset=utf-8")
@@ -0,0 +1,25 @@
+# app/routes/health.py
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from services.warmup import warmup
+
+router = APIRouter()
+
+
+@router.get("/health")
+async def health():
+    """
+    Процесс жив (liveness).
+    """
+    return {"status": "ok"}
+
+
+@router.get("/ready")
+async def ready():
+    """
+    Готовность принимать запросы (readiness): 503, пока идёт подготовка
+    при старте (регистрация машин и прогрев маршрутов, services/warmup.py).
+    """
+    return JSONResponse(warmup.as_dict(), status_code=200 if warmup.ready else 503)
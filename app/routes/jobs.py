@@ -0,0 +1,71 @@
+# app/routes/jobs.py
+
+import json
+from datetime import datetime, timezone
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+import config
+from schemas import JobStatus
+from services.dispatcher import dispatcher
+from services.events import event_bus, Event
+from services.jobs import job_registry
+
+router = APIRouter()
+
+
+def _as_datetime(timestamp: Optional[float]) -> Optional[datetime]:
+    return datetime.fromtimestamp(timestamp, timezone.utc) if timestamp is not None else None
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    """
+    Состояние запроса (/load, /upload или /batch): этап, машина и оценка
+    сроков по каждой поездке.
+    """
+    if job_registry.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Запрос не найден")
+    view = job_registry.view(job_id, dispatcher.estimate())
+    for name in ("created_at", "finished_at"):
+        view[name] = _as_datetime(view[name])
+    for trip in view["trips"]:
+        for name in ("estimated_arrival", "estimated_finish"):
+            trip[name] = _as_datetime(trip[name])
+    return JobStatus(**view)
+
+
+def _format_event(event: Event) -> str:
+    data = json.dumps(dict(event.data, ts=round(event.ts, 3)), ensure_ascii=False)
+    return f"id: {event.event_id}\nevent: {event.type}\ndata: {data}\n\n"
+
+
+@router.get("/events")
+async def stream_events(
+    request: Request,
+    types: Optional[str] = Query(None, description="Типы событий через запятую: job, trip, vehicle"),
+    job_id: Optional[str] = Query(None, description="Только события этого запроса (и парка)")
+):
+    """
+    Поток событий (Server-Sent Events): смены статуса запросов, этапы
+    поездок и перемещения машин. Медленный клиент теряет самые старые
+    события – об этом приходит событие overflow с числом пропущенных.
+    """
+    wanted = [t.strip() for t in types.split(",") if t.strip()] if types else None
+    subscription = event_bus.subscribe(wanted, job_id)
+
+    async def stream():
+        try:
+            yield ": connected\n\n"
+            while not await request.is_disconnected():
+                event, dropped = await subscription.get(timeout=config.EVENT_HEARTBEAT_SEC)
+                if dropped:
+                    yield f"event: overflow\ndata: {json.dumps({'dropped': dropped})}\n\n"
+                # Пустая строка-комментарий держит соединение через прокси
+                yield _format_event(event) if event is not None else ": ping\n\n"
+        finally:
+            subscription.close()
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
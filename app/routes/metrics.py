@@ -0,0 +1,15 @@
+# app/routes/metrics.py
+
+from fastapi import APIRouter
+from fastapi.responses import Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def metrics():
+    """
+    Метрики в формате Prometheus.
+    """
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,6 +1,8 @@
 import math
-import asyncio
+import uuid
 import logging
+from datetime import datetime, timezone
+from typing import Optional
 from fastapi import APIRouter, HTTPException
 
 # Импортируем наши схемы из app.schemas
@@ -8,18 +10,18 @@ from schemas import (
     LoadRequest,
     UploadRequest,
     TransporterResponse,
-    VehicleCapacity
+    BatchRequest,
+    BatchResponse,
+    BatchJobEstimate,
+    VehicleCapacity,
+    QueueStats
 )
 
-# Импортируем переменные и функцию "процесса" из tasks.py
-# (где хранится логика поездок и глобальные переменные)
-from services.tasks import (
-    lock_object,
-    vehicle_node_mapping,
-    vehicle_node_mapping_place,
-    vehicle_capacity,
-    process_transporter_task
-)
+# Вместимость хранится в общем состоянии, сами поездки запускает диспетчер
+from services.state_store import state_store
+from services.fleet import fleet
+from services.dispatcher import dispatcher, TripRequest, QueueFullError
+from services import clock
 
 # Создаём роутер
 router = APIRouter()
@@ -30,13 +32,36 @@ logger = logging.getLogger(__name__)
 audit_logger = logging.getLogger("audit")
 
 
+def _enqueue_trips(request, is_boarding: bool):
+    """
+    Ставит перевозку всех пассажиров самолёта в очередь одним запросом:
+    диспетчер делит пассажиров между машинами по их вместимости.
+    Возвращает job_id для /jobs/{job_id}. При переполнении очереди – 503.
+    """
+    priority = _clock_time(request.departure_time)
+    job_id = uuid.uuid4().hex
+    try:
+        dispatcher.submit(TripRequest(
+            aircraft_id=request.aircraft_id,
+            aircraft_coordinates=request.aircraft_coordinates,
+            passenger_count=request.passenger_count,
+            is_boarding=is_boarding,
+            priority=priority,
+            job_id=job_id
+        ))
+    except QueueFullError as e:
+        logger.warning("Очередь поездок переполнена, отклоняем запрос (aircraft=%s)", request.aircraft_id)
+        raise HTTPException(status_code=503, detail=str(e))
+    return job_id
+
+
 @router.post("/load", response_model=TransporterResponse)
 async def load_passengers(request: LoadRequest):
     """
     Запрос на посадку пассажиров.
     """
     # Логируем входной запрос в аудит
-    audit_logger.info("Запрос /load: %s", request.dict())
+    audit_logger.info("Запрос /load: %s", request.dict(), extra={"aircraft_id": request.aircraft_id})
 
     if request.passenger_count <= 0:
         logger.warning("Попытка загрузить 0 или отрицательное число пассажиров")
@@ -45,36 +70,26 @@ async def load_passengers(request: LoadRequest):
         logger.warning("Некорректные поля в запросе load_passengers")
         raise HTTPException(status_code=400, detail="Неверный запрос (пустые поля)")
 
-    # Считаем нужное число машин
-    needed_cars = math.ceil(request.passenger_count / vehicle_capacity)
+    # Оценка числа машин при общей вместимости (для журнала)
+    needed_cars = math.ceil(request.passenger_count / fleet.capacity_of(None))
 
     waiting = False
-    # Проверяем, есть ли хотя бы одна свободная машина
-    with lock_object:
-        found_vehicle = next((k for k, v in vehicle_node_mapping.items() if v != "в пути"), None)
-        if not found_vehicle:
-            waiting = True
-            logger.info("Нет свободных машин -> waiting = True")
-
-    # Запускаем асинхронные "поездки"
-    tasks = []
-    for _ in range(needed_cars):
-        tasks.append(asyncio.create_task(process_transporter_task(
-            aircraft_id=request.aircraft_id,
-            aircraft_coordinates=request.aircraft_coordinates,
-            passenger_count=request.passenger_count,
-            is_boarding=True
-        )))
+    # Проверяем, есть ли свободная машина (или место под новую)
+    if not fleet.has_capacity():
+        waiting = True
+        logger.info("Нет свободных машин -> waiting = True")
 
-    # Не дожидаемся завершения тасков в рамках запроса, чтобы не блокировать
-    if tasks:
-        asyncio.gather(*tasks)
-        logger.info("Запустили %d задач на перевозку (load)", needed_cars)
+    # Ставим поездки в очередь диспетчера
+    job_id = _enqueue_trips(request, is_boarding=True)
+    queue_depth = dispatcher.depth()
+    logger.info("Поставили в очередь посадку %d пассажиров (~%d машин), глубина очереди %d",
+                request.passenger_count, needed_cars, queue_depth)
 
     # Логируем ответ
-    audit_logger.info("Ответ /load: waiting=%s, needed_cars=%d", waiting, needed_cars)
+    audit_logger.info("Ответ /load: waiting=%s, needed_cars=%d", waiting, needed_cars,
+                      extra={"aircraft_id": request.aircraft_id})
 
-    return TransporterResponse(waiting=waiting)
+    return TransporterResponse(waiting=waiting, queue_depth=queue_depth, job_id=job_id)
 
 
 @router.post("/upload", response_model=TransporterResponse)
@@ -82,7 +97,7 @@ async def unload_passengers(request: UploadRequest):
     """
     Запрос на высадку пассажиров.
     """
-    audit_logger.info("Запрос /upload: %s", request.dict())
+    audit_logger.info("Запрос /upload: %s", request.dict(), extra={"aircraft_id": request.aircraft_id})
 
     if request.passenger_count <= 0:
         logger.warning("Попытка выгрузить 0 или отрицательное число пассажиров")
@@ -91,31 +106,99 @@ async def unload_passengers(request: UploadRequest):
         logger.warning("Некорректные поля в запросе unload_passengers")
         raise HTTPException(status_code=400, detail="Неверный запрос (пустые поля)")
 
-    needed_cars = math.ceil(request.passenger_count / vehicle_capacity)
+    needed_cars = math.ceil(request.passenger_count / fleet.capacity_of(None))
 
     waiting = False
-    with lock_object:
-        found_vehicle = next((k for k, v in vehicle_node_mapping.items() if v != "в пути"), None)
-        if not found_vehicle:
-            waiting = True
-            logger.info("Нет свободных машин -> waiting = True")
-
-    tasks = []
-    for _ in range(needed_cars):
-        tasks.append(asyncio.create_task(process_transporter_task(
-            aircraft_id=request.aircraft_id,
-            aircraft_coordinates=request.aircraft_coordinates,
-            passenger_count=request.passenger_count,
-            is_boarding=False
-        )))
+    if not fleet.has_capacity():
+        waiting = True
+        logger.info("Нет свободных машин -> waiting = True")
 
-    if tasks:
-        asyncio.gather(*tasks)
-        logger.info("Запустили %d задач на перевозку (upload)", needed_cars)
+    # Ставим поездки в очередь диспетчера
+    job_id = _enqueue_trips(request, is_boarding=False)
+    queue_depth = dispatcher.depth()
+    logger.info("Поставили в очередь высадку %d пассажиров (~%d машин), глубина очереди %d",
+                request.passenger_count, needed_cars, queue_depth)
 
-    audit_logger.info("Ответ /upload: waiting=%s, needed_cars=%d", waiting, needed_cars)
+    audit_logger.info("Ответ /upload: waiting=%s, needed_cars=%d", waiting, needed_cars,
+                      extra={"aircraft_id": request.aircraft_id})
 
-    return TransporterResponse(waiting=waiting)
+    return TransporterResponse(waiting=waiting, queue_depth=queue_depth, job_id=job_id)
+
+
+def _clock_time(moment: Optional[datetime]) -> Optional[float]:
+    """
+    Срок из запроса (реальное время) в шкале часов поездок – той же, что
+    у приоритета запросов без срока и у оценок services.eta.
+    """
+    return clock.from_wall(moment.timestamp()) if moment is not None else None
+
+
+def _as_datetime(timestamp: Optional[float]) -> Optional[datetime]:
+    return datetime.fromtimestamp(timestamp, timezone.utc) if timestamp is not None else None
+
+
+@router.post("/batch", response_model=BatchResponse)
+async def batch_passengers(request: BatchRequest):
+    """
+    Пакетный запрос: посадка и высадка для нескольких самолётов сразу.
+    Все поездки встают в очередь вместе и планируются совместно; в ответе –
+    идентификатор пакета и оценка начала и конца обслуживания каждого самолёта.
+    """
+    audit_logger.info("Запрос /batch: %d самолётов", len(request.jobs))
+
+    if not request.jobs:
+        raise HTTPException(status_code=400, detail="Неверный запрос: пустой список jobs")
+    for i, job in enumerate(request.jobs):
+        if job.passenger_count <= 0:
+            raise HTTPException(status_code=400, detail=f"Неверный запрос: jobs[{i}].passenger_count <= 0")
+        if not job.aircraft_id or not job.aircraft_coordinates:
+            raise HTTPException(status_code=400, detail=f"Неверный запрос (пустые поля в jobs[{i}])")
+
+    job_id = uuid.uuid4().hex
+    trips = [
+        TripRequest(
+            aircraft_id=job.aircraft_id,
+            aircraft_coordinates=job.aircraft_coordinates,
+            passenger_count=job.passenger_count,
+            is_boarding=job.operation == "boarding",
+            priority=_clock_time(job.deadline),
+            job_id=job_id
+        )
+        for job in request.jobs
+    ]
+    try:
+        queue_depth = dispatcher.submit_batch(trips)
+    except QueueFullError as e:
+        logger.warning("Очередь поездок переполнена, отклоняем пакет из %d самолётов", len(trips))
+        raise HTTPException(status_code=503, detail=str(e))
+
+    # Оценка – до того, как диспетчер начнёт раздавать машины
+    estimates = dispatcher.estimate()
+    result = []
+    for job, trip in zip(request.jobs, trips):
+        estimate = estimates[trip.trip_id]
+        late = (job.deadline is not None and estimate.finish is not None
+                and estimate.finish > _clock_time(job.deadline))
+        result.append(BatchJobEstimate(
+            aircraft_id=job.aircraft_id,
+            operation=job.operation,
+            trip_id=trip.trip_id,
+            vehicles=estimate.vehicles,
+            estimated_start=_as_datetime(estimate.start),
+            estimated_finish=_as_datetime(estimate.finish),
+            late=late
+        ))
+    logger.info("Пакет %s: %d самолётов в очереди, глубина очереди %d", job_id, len(trips), queue_depth)
+    audit_logger.info("Ответ /batch: job_id=%s, опаздывают %d", job_id, sum(e.late for e in result))
+    return BatchResponse(job_id=job_id, queue_depth=queue_depth, estimates=result)
+
+
+@router.get("/queue", response_model=QueueStats)
+async def get_queue_stats():
+    """
+    Состояние очереди поездок: глубина, время ожидания, загрузка парка.
+    """
+    return QueueStats(**dispatcher.stats())
 
 
 @router.get("/getCapacity")
@@ -123,6 +206,7 @@ async def get_vehicle_capacity():
     """
     Получить текущую вместимость транспортного средства.
     """
+    vehicle_capacity = state_store.get_capacity()
     logger.info("[get_vehicle_capacity] Текущая вместимость: %d", vehicle_capacity)
     audit_logger.info("Запрос /getCapacity -> %d", vehicle_capacity)
     return {"capacity": vehicle_capacity}
@@ -133,12 +217,8 @@ async def set_vehicle_capacity(new_cap: VehicleCapacity):
     """
     Обновить вместимость транспортного средства.
     """
-    global vehicle_capacity
     audit_logger.info("Запрос /updateCapacity: %s", new_cap.dict())
-    if new_cap.capacity < 0:
-        logger.error("Некорректное значение вместимости: %d", new_cap.capacity)
-        raise HTTPException(status_code=400, detail="Некорректное значение вместимости")
-
+    await state_store.set_capacity(new_cap.capacity)
     vehicle_capacity = new_cap.capacity
     logger.info("[set_vehicle_capacity] Установлена вместимость: %d", vehicle_capacity)
     audit_logger.info("Обновленная вместимость: %d", vehicle_capacity)
@@ -1,26 +1,105 @@
 # app/schemas.py
-from pydantic import BaseModel
-from typing import Dict
+from datetime import datetime
+from pydantic import BaseModel, Field
+from typing import Dict, List, Literal, Optional
 
-# Вместимость транспортного средства
+# Вместимость транспортного средства (0 и меньше – ошибка 422)
 class VehicleCapacity(BaseModel):
-    capacity: int
+    capacity: int = Field(gt=0)
 
 # Запрос на посадку пассажиров
+# departure_time – плановое время вылета; задаёт приоритет в очереди поездок
 class LoadRequest(BaseModel):
     aircraft_id: str
     passenger_count: int
     aircraft_coordinates: str
+    departure_time: Optional[datetime] = None
 
 # Запрос на высадку пассажиров
 class UploadRequest(BaseModel):
     aircraft_id: str
     passenger_count: int
     aircraft_coordinates: str
+    departure_time: Optional[datetime] = None
 
 # Ответ на запрос посадки/высадки
 class TransporterResponse(BaseModel):
     waiting: bool
+    queue_depth: Optional[int] = None
+    job_id: Optional[str] = None
+
+# Один самолёт в пакетном запросе.
+# deadline – срок (для посадки – время вылета): задаёт приоритет, как
+# departure_time в /load и /upload, и помечает опоздания в оценке
+class BatchJob(BaseModel):
+    operation: Literal["boarding", "unboarding"]
+    aircraft_id: str
+    passenger_count: int
+    aircraft_coordinates: str
+    deadline: Optional[datetime] = None
+
+# Пакетный запрос (/batch): посадка и высадка сразу для многих самолётов
+class BatchRequest(BaseModel):
+    jobs: List[BatchJob]
+
+# Оценка сроков по одному самолёту
+class BatchJobEstimate(BaseModel):
+    aircraft_id: str
+    operation: str
+    trip_id: str
+    vehicles: int
+    estimated_start: Optional[datetime] = None
+    estimated_finish: Optional[datetime] = None
+    late: bool = False
+
+# Ответ на пакетный запрос
+class BatchResponse(BaseModel):
+    job_id: str
+    queue_depth: int
+    estimates: List[BatchJobEstimate]
+
+# Поездка запроса (/jobs/{job_id}): этап, машина и оценка сроков.
+# Для поездок в очереди оценка – по расписанию диспетчера, для запущенных –
+# по положению машины; после посадки – фактическое время
+class JobTrip(BaseModel):
+    trip_id: str
+    aircraft_id: Optional[str] = None
+    operation: str
+    passenger_count: int
+    stage: str
+    vehicle_id: Optional[str] = None
+    node: Optional[str] = None
+    heading_to: Optional[str] = None
+    outcome: Optional[str] = None
+    estimated_arrival: Optional[datetime] = None
+    estimated_finish: Optional[datetime] = None
+
+# Состояние запроса: queued, in_progress или done
+class JobStatus(BaseModel):
+    job_id: str
+    status: str
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    trips: List[JobTrip]
+
+# Состояние очереди поездок
+class QueueStats(BaseModel):
+    queue_depth: int
+    max_queue_size: int
+    active_trips: int
+    submitted: int
+    dispatched: int
+    rejected: int
+    requeued: int
+    recovered: int = 0
+    oldest_wait_sec: float
+    avg_wait_sec: float
+    p95_wait_sec: float
+    max_wait_sec: float
+    fleet_size: int
+    fleet_free: int
+    fleet_max_size: int
+    degraded: bool = False
 
 # Ответ при возникновении ошибки
 class ErrorResponse(BaseModel):
@@ -0,0 +1,170 @@
+# app/services/admin_cache.py
+#
+# Готовые ответы админки: тело в байтах, ETag и сжатые варианты считаются
+# один раз, а не на каждый запрос.
+#   load_asset()     – статический файл (admin_ui.html), читается при старте;
+#   FleetSnapshot    – JSON /admin/vehicles, пересобирается только когда
+#                      изменился парк (FleetRegistry.version) или вместимость;
+#   cached_response  – ответ с ETag/Cache-Control, 304 на If-None-Match и
+#                      gzip (или brotli, если установлен пакет brotli) по
+#                      Accept-Encoding.
+
+import os
+import gzip
+import json
+import time
+import hashlib
+import logging
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+
+import config
+from services.fleet import fleet, FleetRegistry
+from services.state_store import state_store, StateStore
+
+try:
+    import brotli
+except ImportError:  # brotli – необязательная зависимость, без неё только gzip
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Меньше этого сжимать нет смысла
+_MIN_COMPRESS_SIZE = 512
+
+
+class CachedBody:
+    __slots__ = ("body", "etag", "_encoded")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = '"%s"' % hashlib.blake2b(body, digest_size=12).hexdigest()
+        self._encoded: Dict[str, bytes] = {}
+
+    def encoded(self, encoding: str) -> bytes:
+        """
+        Тело в кодировке gzip или br (сжимается при первом запросе).
+        """
+        data = self._encoded.get(encoding)
+        if data is None:
+            if encoding == "br":
+                data = brotli.compress(self.body)
+            else:
+                data = gzip.compress(self.body, mtime=0)
+            self._encoded[encoding] = data
+        return data
+
+
+def load_asset(path: str) -> Optional[CachedBody]:
+    """
+    Читает статический файл и сразу сжимает его. None – файла нет.
+    """
+    if not os.path.exists(path):
+        logger.warning("Файл админки не найден: %s", path)
+        return None
+    with open(path, "rb") as f:
+        asset = CachedBody(f.read())
+    for encoding in _supported_encodings():
+        asset.encoded(encoding)
+    return asset
+
+
+def _supported_encodings() -> Tuple[str, ...]:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def _choose_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = set()
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip().lower())
+    for encoding in _supported_encodings():
+        if encoding in accepted or "*" in accepted:
+            return encoding
+    return None
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Сравнение слабое: W/"x" совпадает с "x" (сжатый вариант – то же содержимое)
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def cached_response(request: Request, cached: CachedBody, media_type: str,
+                    cache_control: str = "no-cache") -> Response:
+    """
+    Ответ из готового тела. no-cache – браузер хранит копию, но каждый раз
+    сверяет ETag и получает 304, если ничего не изменилось.
+    """
+    headers = {"ETag": cached.etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, cached.etag):
+        return Response(status_code=304, headers=headers)
+    body = cached.body
+    encoding = _choose_encoding(request.headers.get("accept-encoding", ""))
+    if encoding is not None and len(body) >= _MIN_COMPRESS_SIZE:
+        body = cached.encoded(encoding)
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type=media_type, headers=headers)
+
+
+class FleetSnapshot:
+    """
+    Список машин для /admin/vehicles. Пересобирается, когда меняется парк
+    в этом процессе или общая вместимость. С общим хранилищем (sqlite)
+    машины меняют и другие воркеры, поэтому там снимок ещё и стареет
+    через max_age секунд.
+    """
+
+    def __init__(self, fleet_registry: FleetRegistry, store: StateStore, max_age: Optional[float]):
+        self.fleet = fleet_registry
+        self.store = store
+        self.max_age = max_age
+        self._key: Optional[Tuple[int, int]] = None
+        self._built_at = 0.0
+        self._cached: Optional[CachedBody] = None
+        self.rebuilds = 0
+        self.hits = 0
+
+    def get(self) -> CachedBody:
+        key = (self.fleet.version, self.store.get_capacity())
+        expired = self.max_age is not None and time.monotonic() - self._built_at > self.max_age
+        if self._cached is None or key != self._key or expired:
+            self._rebuild(key)
+        else:
+            self.hits += 1
+        return self._cached
+
+    def _rebuild(self, key: Tuple[int, int]):
+        data = self.fleet.snapshot()
+        body = json.dumps({
+            "count": len(data),
+            "free": self.fleet.free_count(),
+            "max_size": self.fleet.max_size,
+            "vehicles": data,
+            "capacity": key[1]
+        }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        if self._cached is None or body != self._cached.body:
+            self._cached = CachedBody(body)
+        self._key = key
+        self._built_at = time.monotonic()
+        self.rebuilds += 1
+
+    def stats(self) -> dict:
+        return {
+            "version": self._key[0] if self._key else None,
+            "rebuilds": self.rebuilds,
+            "hits": self.hits,
+            "bytes": len(self._cached.body) if self._cached else 0,
+        }
+
+
+fleet_snapshot = FleetSnapshot(
+    fleet, state_store,
+    max_age=config.ADMIN_SNAPSHOT_MAX_AGE_SEC if config.STATE_BACKEND.lower() == "sqlite" else None
+)
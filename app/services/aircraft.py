@@ -0,0 +1,218 @@
+# app/services/aircraft.py
+#
+# Сеансы посадки/высадки: один сеанс на самолёт и операцию. Сеанс
+# открывается, когда поездки ставятся в очередь (plan), и знает, сколько
+# пассажиров и поездок (машин) запланировано – в том числе частей запроса,
+# которые диспетчер ещё не выдал машинам. Поэтому оркестратор получает
+# ровно одно уведомление о начале (когда к самолёту подъехала первая
+# машина) и одно о завершении – когда обслужены все запланированные
+# поездки, с общим числом пассажиров. Повторные запросы для того же
+# самолёта, пока сеанс открыт, попадают в него же и отдельных уведомлений
+# не порождают.
+#
+# Сеансы – в общем хранилище (services/state_store.py): с SQLite поездки
+# одного самолёта могут вести разные воркеры, а начало и завершение сеанса
+# отмечаются атомарно. Планирование вызывается из синхронного кода
+# диспетчера, поэтому его изменения выполняются по порядку в фоне; приезд
+# и отъезд машины сначала дожидаются их. После перезапуска воркер
+# восстанавливает свои поездки по журналу (restore).
+
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from services.events import event_bus
+from services.state_store import SessionPlan, SessionStatus, StateStore, state_store
+from services.trip_journal import TripStage
+from services.worker import worker
+from services.orchestrator import (
+    start_boarding,
+    finish_boarding,
+    start_unboarding,
+    finish_unboarding
+)
+
+logger = logging.getLogger(__name__)
+
+# Этапы поездки, на которых она ещё не закончила работу у самолёта
+_PLANNED_STAGES = frozenset(stage.value for stage in (
+    TripStage.QUEUED, TripStage.ACQUIRED, TripStage.ROUTING, TripStage.DRIVING, TripStage.BOARDING
+))
+
+
+class AircraftRegistry:
+    def __init__(self, store: StateStore):
+        self.store = store
+        # Изменения сеансов от синхронного кода диспетчера – по порядку
+        self._ops: Deque[Callable[[], Awaitable]] = deque()
+        self._drain: Optional[asyncio.Task] = None
+        # Метрики
+        self.opened = 0
+        self.coalesced = 0   # запросы, влившиеся в уже открытый сеанс
+
+    # --- планирование (диспетчер) ---
+
+    def plan(self, trip_id: str, aircraft_id: str, is_boarding: bool, passenger_count: int):
+        """
+        Поездка запланирована (или снова в очереди). Открывает сеанс, если
+        его ещё нет; запрос к уже открытому сеансу вливается в него.
+        """
+        self._submit(lambda: self._plan(trip_id, aircraft_id, is_boarding, passenger_count))
+
+    async def _plan(self, trip_id: str, aircraft_id: str, is_boarding: bool, passenger_count: int):
+        result = await self.store.plan_trip(trip_id, aircraft_id, is_boarding, passenger_count)
+        if result == SessionPlan.OPENED:
+            self.opened += 1
+        elif result == SessionPlan.JOINED:
+            self.coalesced += 1
+
+    def split(self, trip_id: str, part_id: str, passenger_count: int):
+        """
+        Диспетчер отделил от запроса часть на passenger_count пассажиров.
+        """
+        self._submit(lambda: self.store.split_trip(trip_id, part_id, passenger_count))
+
+    def drop(self, trip_id: str):
+        """
+        Поездка закончилась, не обслужив самолёт (ошибка, нет маршрута).
+        Если она была последней, сеанс закрывается; если оркестратор уже
+        знает о начале, он получит завершение с числом перевезённых.
+        Для уже обслуживших самолёт поездок – ничего не делает.
+        """
+        self._submit(lambda: self._leave(trip_id, 0))
+
+    def _submit(self, op: Callable[[], Awaitable]):
+        self._ops.append(op)
+        if self._drain is None or self._drain.done():
+            self._drain = asyncio.create_task(self._run_ops())
+
+    async def _run_ops(self):
+        while self._ops:
+            op = self._ops.popleft()
+            try:
+                await op()
+            except Exception:
+                logger.exception("Ошибка при изменении сеанса самолёта")
+
+    async def _flush(self):
+        """
+        Дожидается изменений, поставленных синхронными вызовами.
+        """
+        while self._drain is not None and not self._drain.done():
+            await asyncio.shield(self._drain)
+
+    # --- у самолёта (поездка) ---
+
+    async def arrive(self, trip_id: str, aircraft_id: str, is_boarding: bool,
+                     vehicle_id: str, passenger_count: int) -> bool:
+        """
+        Машина подъехала к самолёту. Первая машина сеанса отправляет
+        уведомление о начале. Возвращает True, если это она.
+        """
+        await self._flush()
+        first, session = await self.store.arrive_trip(trip_id, aircraft_id, is_boarding,
+                                                      vehicle_id, passenger_count)
+        if first:
+            await self._notify_start(session)
+        return first
+
+    async def depart(self, trip_id: str, passenger_count: int) -> Tuple[bool, int]:
+        """
+        Машина закончила работу у самолёта. Если в сеансе не осталось
+        запланированных поездок, он закрывается и уходит уведомление
+        о завершении. Возвращает (закрыт ли сеанс, пассажиров за сеанс).
+        """
+        await self._flush()
+        return await self._leave(trip_id, passenger_count)
+
+    async def _leave(self, trip_id: str, served: int) -> Tuple[bool, int]:
+        result = await self.store.leave_trip(trip_id, served)
+        if result is None:
+            return False, 0
+        closed, session = result
+        if closed and session["started_at"] is not None:
+            await self._notify_finish(session)
+        return closed, session["served_passengers"]
+
+    async def _notify_start(self, session: dict):
+        aircraft_id = session["aircraft_id"]
+        if session["operation"] == "boarding":
+            await start_boarding(aircraft_id)
+            logger.info("Начинаем посадку пассажиров (aircraft=%s)", aircraft_id)
+        else:
+            await start_unboarding(aircraft_id)
+            logger.info("Начинаем высадку пассажиров (aircraft=%s)", aircraft_id)
+        event_bus.publish("aircraft", dict(session, status=SessionStatus.IN_PROGRESS))
+
+    async def _notify_finish(self, session: dict):
+        # Завершение не обгонит начало: уведомления одного самолёта
+        # уходят по порядку (services/outbox.py)
+        aircraft_id, total = session["aircraft_id"], session["served_passengers"]
+        if session["operation"] == "boarding":
+            await finish_boarding(aircraft_id, total)
+            logger.info("Завершили посадку (aircraft=%s, %d пассажиров)", aircraft_id, total)
+        else:
+            await finish_unboarding(aircraft_id, total)
+            logger.info("Завершили высадку (aircraft=%s, %d пассажиров)", aircraft_id, total)
+        event_bus.publish("aircraft", dict(session, status="finished"))
+
+    # --- восстановление ---
+
+    async def restore(self, trips: List[dict]):
+        """
+        Восстанавливает поездки этого воркера из журнала, ещё не закончившие
+        работу у самолёта (повторно – без изменений, если сеансы пережили
+        перезапуск в SQLite). Поездки воркера в сеансах, которых в журнале
+        нет, снимаются. Если уведомление о начале не успело уйти (ни одна из
+        поездок на посадке его не отметила), отправляем его сейчас.
+        Пассажиры поездок, завершённых до перезапуска, в итог не попадают.
+        Вызывается до запуска восстановленных поездок.
+        """
+        await self._flush()
+        active = {state["trip_id"] for state in trips if state["stage"] in _PLANNED_STAGES}
+        for trip_id in self.store.session_trips(worker.id):
+            if trip_id not in active:
+                await self._leave(trip_id, 0)
+
+        for state in trips:
+            if state["stage"] in _PLANNED_STAGES:
+                await self._plan(state["trip_id"], state["aircraft_id"], state["is_boarding"],
+                                 state["passenger_count"])
+        for aircraft_id, is_boarding in {(state["aircraft_id"], state["is_boarding"])
+                                         for state in trips if state.get("start_sent")}:
+            await self.store.start_session(aircraft_id, is_boarding)
+        for state in trips:
+            if state["stage"] == TripStage.BOARDING.value:
+                first, session = await self.store.arrive_trip(
+                    state["trip_id"], state["aircraft_id"], state["is_boarding"],
+                    state["vehicle_id"], state["passenger_count"])
+                if first:
+                    await self._notify_start(session)
+
+    async def stop(self):
+        await self._flush()
+
+    # --- просмотр ---
+
+    def get(self, aircraft_id: str) -> List[dict]:
+        return self.store.list_sessions(aircraft_id)
+
+    def count(self) -> int:
+        return self.store.session_counts()[0]
+
+    def snapshot(self) -> Dict[str, dict]:
+        return {f"{session['operation']}/{session['aircraft_id']}": session
+                for session in self.store.list_sessions()}
+
+    def stats(self) -> dict:
+        total, started = self.store.session_counts()
+        return {
+            "open": total,
+            "in_progress": started,
+            "opened": self.opened,
+            "coalesced": self.coalesced,
+        }
+
+
+aircraft_registry = AircraftRegistry(state_store)
@@ -0,0 +1,185 @@
+# app/services/audit.py
+#
+# Журнал аудита: записи в формате JSON lines, запись через очередь в фоновом
+# потоке (QueueHandler/QueueListener) с ротацией файла. Чтение – с конца
+# файла блоками, без загрузки всего журнала в память.
+#
+# Файл у каждого воркера свой (services/worker.py, path_for): несколько
+# процессов не пишут и не ротируют один файл. /admin/audit показывает
+# журнал воркера, который ответил на запрос.
+
+import os
+import json
+import queue
+import logging
+import logging.handlers
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional, Tuple
+
+import config
+from services.worker import worker
+
+AUDIT_LOGGER_NAME = "audit"
+# Поля, которые можно передать через extra={...} и по которым есть фильтры
+AUDIT_FIELDS = ("aircraft_id", "vehicle_id")
+
+_READ_BLOCK = 64 * 1024
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.Handler] = None
+_path: Optional[str] = None    # файл этого воркера (start_audit_logging)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        for field in AUDIT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def start_audit_logging(path: str = None):
+    """
+    Подключает к логгеру "audit" фоновую запись в файл с ротацией.
+    """
+    global _listener, _queue_handler, _path
+    if _listener is not None:
+        return
+    path = _path = worker.path_for(path or config.AUDIT_LOG_PATH)
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        path,
+        maxBytes=config.AUDIT_LOG_MAX_BYTES,
+        backupCount=config.AUDIT_LOG_BACKUPS,
+        encoding="utf-8",
+    )
+    file_handler.setFormatter(JsonLinesFormatter())
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = logging.handlers.QueueHandler(log_queue)
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _listener.start()
+
+    audit_logger = logging.getLogger(AUDIT_LOGGER_NAME)
+    audit_logger.setLevel(logging.INFO)
+    audit_logger.addHandler(_queue_handler)
+
+
+def stop_audit_logging():
+    """
+    Дописывает очередь и отключает фоновую запись.
+    """
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    logging.getLogger(AUDIT_LOGGER_NAME).removeHandler(_queue_handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+    _queue_handler = None
+
+
+# --------------------------------------
+# Чтение журнала
+# --------------------------------------
+
+def _parse(line: str) -> dict:
+    try:
+        entry = json.loads(line)
+        if isinstance(entry, dict):
+            return entry
+    except ValueError:
+        pass
+    # Старые текстовые записи (до перехода на JSON lines)
+    return {"message": line}
+
+
+def _iter_lines_backwards(f, end: int) -> Iterator[Tuple[int, str]]:
+    """
+    Отдаёт строки файла от позиции end к началу: (смещение начала строки, строка).
+    """
+    buffer = b""
+    position = end
+    while position > 0:
+        read_size = min(_READ_BLOCK, position)
+        position -= read_size
+        f.seek(position)
+        buffer = f.read(read_size) + buffer
+        lines = buffer.split(b"\n")
+        # Первая часть может быть неполной строкой – дочитаем со следующим блоком
+        buffer = lines[0]
+        offset = position + len(buffer) + 1
+        tail = []
+        for raw in lines[1:]:
+            tail.append((offset, raw))
+            offset += len(raw) + 1
+        for line_offset, raw in reversed(tail):
+            if raw.strip():
+                yield line_offset, raw.decode("utf-8", errors="replace").rstrip("\r")
+    if buffer.strip():
+        yield 0, buffer.decode("utf-8", errors="replace").rstrip("\r")
+
+
+def _matches(entry: dict, since: Optional[float], until: Optional[float],
+             aircraft_id: Optional[str], vehicle_id: Optional[str]) -> bool:
+    if aircraft_id is not None and entry.get("aircraft_id") != aircraft_id:
+        return False
+    if vehicle_id is not None and entry.get("vehicle_id") != vehicle_id:
+        return False
+    ts = entry.get("ts")
+    if since is not None and (ts is None or ts < since):
+        return False
+    if until is not None and (ts is None or ts > until):
+        return False
+    return True
+
+
+def read_audit(path: str = None, limit: int = 100, cursor: Optional[int] = None,
+               since: Optional[float] = None, until: Optional[float] = None,
+               aircraft_id: Optional[str] = None, vehicle_id: Optional[str] = None) -> dict:
+    """
+    Возвращает до limit последних записей (новые первыми), подходящих под фильтры.
+    cursor – смещение в файле, до которого читать (из next_cursor прошлого ответа).
+    Курсор действителен до ротации файла.
+    Функция блокирующая – из async-кода вызывать через asyncio.to_thread.
+    """
+    path = path or _path or worker.path_for(config.AUDIT_LOG_PATH)
+    if not os.path.exists(path):
+        return {"records": [], "next_cursor": None}
+
+    records: List[dict] = []
+    next_cursor = None
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        end = size if cursor is None else max(0, min(cursor, size))
+        for offset, line in _iter_lines_backwards(f, end):
+            entry = _parse(line)
+            ts = entry.get("ts")
+            if since is not None and ts is not None and ts < since:
+                # Записи упорядочены по времени – дальше только более старые
+                break
+            if _matches(entry, since, until, aircraft_id, vehicle_id):
+                records.append(entry)
+                if len(records) >= limit:
+                    next_cursor = offset if offset > 0 else None
+                    break
+    return {"records": records, "next_cursor": next_cursor}
+
+
+def format_record(entry: dict) -> str:
+    """
+    Строка для отображения в админке (как в старом текстовом формате).
+    """
+    if "ts" not in entry:
+        return entry.get("message", "")
+    stamp = datetime.fromtimestamp(entry["ts"]).strftime("%Y-%m-%d %H:%M:%S")
+    return f"[{stamp}] [{entry.get('level', 'INFO')}] [audit] {entry.get('message', '')}"
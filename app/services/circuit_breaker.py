@@ -0,0 +1,243 @@
+# app/services/circuit_breaker.py
+#
+# Предохранители (circuit breaker) для внешних сервисов: по одному на
+# ground-control и оркестратор, общие для всех запросов к ним
+# (services/http_client.post).
+#   closed    – запросы идут как обычно, подряд идущие ошибки считаются;
+#   open      – после BREAKER_FAILURE_THRESHOLD ошибок подряд запросы сразу
+#               получают CircuitOpenError, без ожидания таймаутов httpx;
+#   half_open – через BREAKER_RESET_TIMEOUT пропускается пробный запрос
+#               (BREAKER_HALF_OPEN_MAX_CALLS), остальные ждут его итога:
+#               успех закрывает предохранитель, ошибка снова открывает.
+# Ошибка – сетевая ошибка, таймаут или ответ 5xx. Любой другой ответ
+# (в том числе 4xx и 409 на /move) означает, что сервис доступен.
+#
+# Пока хоть один предохранитель открыт, диспетчер не запускает новые
+# поездки (деградированный режим): они ждут в очереди и стартуют сами,
+# когда сервис снова отвечает. В half_open запускается одна пробная поездка.
+# Машина, которой ground-control не дал вернуться в гараж, остаётся
+# свободной там, где остановилась (services/tasks._return_to_garage).
+
+import time
+import asyncio
+import logging
+from enum import Enum
+from typing import Callable, Dict, List, Optional, Tuple
+
+import config
+from services.events import event_bus
+from services.metrics import upstream_of
+from services.retry import RetryBudgetExceeded
+
+logger = logging.getLogger(__name__)
+
+
+class BreakerState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RetryBudgetExceeded):
+    """
+    Предохранитель открыт: запрос не отправлялся. Для поездок это то же,
+    что исчерпанный бюджет повторов – поездка возвращается диспетчеру.
+    """
+
+    def __init__(self, endpoint: str, upstream: str, retry_in: float):
+        Exception.__init__(self, f"{endpoint}: {upstream} недоступен, предохранитель открыт "
+                                 f"(проверка через {retry_in:.1f} сек)")
+        self.endpoint = endpoint
+        self.attempts = 0
+        self.last_error = "circuit open"
+        self.upstream = upstream
+        self.retry_in = retry_in
+
+
+def _now() -> float:
+    # Время цикла событий, как у повторов (services/retry.py): при
+    # виртуальных часах предохранитель открывается и закрывается по ним же
+    try:
+        return asyncio.get_running_loop().time()
+    except RuntimeError:
+        return time.monotonic()
+
+
+# Разрешение на запрос: (поколение состояния, пробный ли запрос)
+Token = Tuple[int, bool]
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float, half_open_max_calls: int):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self._state = BreakerState.CLOSED
+        # Итоги запросов, начатых до смены состояния, не учитываются
+        self._generation = 0
+        self._failures = 0           # ошибки подряд
+        self._opened_at = 0.0
+        self._probes = 0             # пробные запросы в полёте (half_open)
+        self._waiters: List[asyncio.Future] = []
+        self._listeners: List[Callable[[], None]] = []
+        # Метрики
+        self.opened = 0
+        self.rejected = 0
+        self.failures_total = 0
+        self.changed_at = time.time()
+
+    def subscribe(self, callback: Callable[[], None]):
+        """
+        callback() вызывается при каждой смене состояния.
+        """
+        self._listeners.append(callback)
+
+    @property
+    def state(self) -> BreakerState:
+        if self._state == BreakerState.OPEN and self.retry_in() <= 0:
+            self._transition(BreakerState.HALF_OPEN)
+        return self._state
+
+    def retry_in(self) -> float:
+        """
+        Сколько секунд до пробного запроса (0 – предохранитель не открыт).
+        """
+        if self._state != BreakerState.OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_timeout - _now())
+
+    async def acquire(self, endpoint: str) -> Token:
+        """
+        Разрешение на запрос. Открыт – CircuitOpenError; в half_open сверх
+        лимита пробных запросов – ждём итога пробы.
+        """
+        while True:
+            state = self.state
+            if state == BreakerState.CLOSED:
+                return self._generation, False
+            if state == BreakerState.OPEN:
+                self.rejected += 1
+                raise CircuitOpenError(endpoint, self.name, self.retry_in())
+            if self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return self._generation, True
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+    def record_success(self, token: Token):
+        if not self._finish(token):
+            return
+        self._failures = 0
+        if self._state != BreakerState.CLOSED:
+            self._transition(BreakerState.CLOSED)
+
+    def record_failure(self, token: Token):
+        self.failures_total += 1
+        if not self._finish(token):
+            return
+        self._failures += 1
+        if self._state == BreakerState.HALF_OPEN or self._failures >= self.failure_threshold:
+            self._transition(BreakerState.OPEN)
+
+    def release(self, token: Token):
+        """
+        Запрос прерван без результата (отмена): пробу может сделать другой.
+        """
+        if self._finish(token):
+            self._wake()
+
+    def _finish(self, token: Token) -> bool:
+        generation, probe = token
+        if generation != self._generation:
+            return False
+        if probe:
+            self._probes -= 1
+        return True
+
+    def _transition(self, state: BreakerState):
+        previous = self._state
+        self._state = state
+        self._generation += 1
+        self._probes = 0
+        self.changed_at = time.time()
+        if state == BreakerState.OPEN:
+            self._opened_at = _now()
+            self.opened += 1
+            logger.warning("Предохранитель %s открыт (%d ошибок подряд), проверка через %.1f сек",
+                           self.name, self._failures, self.reset_timeout)
+        elif state == BreakerState.CLOSED:
+            self._failures = 0
+            logger.info("Предохранитель %s закрыт: сервис снова отвечает", self.name)
+        else:
+            logger.info("Предохранитель %s: пробный запрос", self.name)
+        event_bus.publish("breaker", {"upstream": self.name, "state": state.value, "previous": previous.value})
+        self._wake()
+        for callback in self._listeners:
+            callback()
+
+    def _wake(self):
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def as_dict(self) -> dict:
+        state = self.state
+        return {
+            "state": state.value,
+            "consecutive_failures": self._failures,
+            "retry_in_sec": round(self.retry_in(), 3),
+            "opened": self.opened,
+            "rejected": self.rejected,
+            "failures": self.failures_total,
+            "changed_at": self.changed_at,
+        }
+
+
+breakers: Dict[str, CircuitBreaker] = {
+    name: CircuitBreaker(name, config.BREAKER_FAILURE_THRESHOLD, config.BREAKER_RESET_TIMEOUT,
+                         config.BREAKER_HALF_OPEN_MAX_CALLS)
+    for name in ("ground_control", "orchestrator")
+}
+
+
+def breaker_for(endpoint: str) -> Optional[CircuitBreaker]:
+    if not config.BREAKER_ENABLED:
+        return None
+    return breakers[upstream_of(endpoint)]
+
+
+def holding() -> bool:
+    """
+    True – хоть один сервис недоступен: новые поездки не запускаются.
+    """
+    return config.BREAKER_ENABLED and any(b.state == BreakerState.OPEN for b in breakers.values())
+
+
+def probing() -> bool:
+    """
+    True – хоть один предохранитель пропускает пробные запросы (half_open).
+    """
+    return config.BREAKER_ENABLED and any(b.state == BreakerState.HALF_OPEN for b in breakers.values())
+
+
+def retry_in() -> float:
+    """
+    Через сколько секунд ближайший открытый предохранитель пустит пробный запрос.
+    """
+    return min((b.retry_in() for b in breakers.values() if b.retry_in() > 0), default=0.0)
+
+
+def subscribe(callback: Callable[[], None]):
+    for breaker in breakers.values():
+        breaker.subscribe(callback)
+
+
+def stats_snapshot() -> Dict[str, dict]:
+    return {name: breaker.as_dict() for name, breaker in breakers.items()}
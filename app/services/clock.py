@@ -0,0 +1,220 @@
+# app/services/clock.py
+#
+# Часы движка поездок: движение, посадка, простой машин, время ожидания
+# в очереди. Три реализации:
+#   RealClock    – реальное время;
+#   ScaledClock  – время идёт в scale раз быстрее (TRANSPORTER_TIME_SCALE);
+#   VirtualClock – дискретно-событийное время: когда все задачи ждут,
+#                  часы сразу переходят к ближайшему пробуждению. Тысячи
+#                  поездок занимают секунды процессорного времени, а прогон
+#                  повторяется один в один.
+# Длительности в коде поездок – в секундах часов (симулированных).
+#
+# Движок берёт часы через функции модуля (sleep, time, monotonic, since),
+# поэтому часы подменяются целиком через set_clock() – например, в
+# simulator/loadgen.py --virtual.
+
+import time as _time
+import asyncio
+import selectors
+import logging
+from abc import ABC, abstractmethod
+from typing import Awaitable, Optional, TypeVar
+
+import config
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Clock(ABC):
+    @abstractmethod
+    def time(self) -> float:
+        """Текущее время часов (секунды эпохи, как time.time())."""
+
+    @abstractmethod
+    def monotonic(self) -> float:
+        """Монотонное время часов (для интервалов)."""
+
+    @abstractmethod
+    async def sleep(self, seconds: float):
+        """Ждёт seconds секунд часов."""
+
+    def since(self, timestamp: float) -> float:
+        """
+        Сколько секунд часов прошло с момента timestamp (значение time()).
+        """
+        return self.time() - timestamp
+
+    def from_wall(self, timestamp: float) -> float:
+        """
+        Момент реального времени timestamp (time.time(), например срок
+        вылета из запроса) в шкале этих часов.
+        """
+        return timestamp
+
+
+class RealClock(Clock):
+    def time(self) -> float:
+        return _time.time()
+
+    def monotonic(self) -> float:
+        return _time.monotonic()
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(seconds)
+
+
+class ScaledClock(Clock):
+    """
+    Время идёт в scale раз быстрее реального, начиная с момента создания.
+    """
+
+    def __init__(self, scale: float):
+        if scale <= 0:
+            raise ValueError("scale должен быть > 0")
+        self.scale = scale
+        self._wall_anchor = _time.time()
+        self._mono_anchor = _time.monotonic()
+
+    def time(self) -> float:
+        return self._wall_anchor + (_time.time() - self._wall_anchor) * self.scale
+
+    def monotonic(self) -> float:
+        return self._mono_anchor + (_time.monotonic() - self._mono_anchor) * self.scale
+
+    def from_wall(self, timestamp: float) -> float:
+        return self._wall_anchor + (timestamp - self._wall_anchor) * self.scale
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(seconds / self.scale)
+
+
+class _VirtualSelector(selectors.DefaultSelector):
+    """
+    Селектор цикла событий с виртуальным временем. Если готового
+    ввода-вывода нет и цикл собирается ждать таймер, время часов
+    переводится сразу на момент этого таймера.
+    """
+
+    def __init__(self, clock: "VirtualClock"):
+        super().__init__()
+        self._clock = clock
+
+    def select(self, timeout: Optional[float] = None):
+        events = super().select(0)
+        if events or timeout == 0:
+            return events
+        if timeout is None:
+            # Таймеров нет – ждём только ввод-вывод (в реальном времени)
+            return super().select(None)
+        self._clock._advance(timeout)
+        return []
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    """
+    Цикл событий, в котором loop.time() – время VirtualClock, поэтому
+    asyncio.sleep, wait_for и call_later тоже идут по виртуальному времени.
+    """
+
+    def __init__(self, clock: "VirtualClock"):
+        super().__init__(_VirtualSelector(clock))
+        self.virtual_clock = clock
+
+    def time(self) -> float:
+        return self.virtual_clock.monotonic()
+
+
+class VirtualClock(Clock):
+    """
+    Дискретно-событийные часы. Работают только в своём цикле событий
+    (VirtualClock.run или new_event_loop()): время в нём не идёт, пока
+    есть готовые задачи, и перескакивает к ближайшему таймеру, когда их нет.
+    Подходит для прогонов в одном процессе (ASGITransport, состояние
+    в памяти): ответы по сети или из потоков время не останавливают.
+    """
+
+    def __init__(self, start: Optional[float] = None):
+        self.epoch = _time.time() if start is None else start
+        self._now = 0.0
+
+    def time(self) -> float:
+        return self.epoch + self._now
+
+    def monotonic(self) -> float:
+        return self._now
+
+    async def sleep(self, seconds: float):
+        loop = asyncio.get_running_loop()
+        if getattr(loop, "virtual_clock", None) is not self:
+            raise RuntimeError("VirtualClock работает только в своём цикле событий (VirtualClock.run)")
+        await asyncio.sleep(seconds)
+
+    def _advance(self, seconds: float):
+        self._now += max(0.0, seconds)
+
+    def new_event_loop(self) -> VirtualTimeLoop:
+        return VirtualTimeLoop(self)
+
+    def run(self, main: Awaitable[T]) -> T:
+        """
+        Аналог asyncio.run() с виртуальным временем.
+        """
+        loop = self.new_event_loop()
+        try:
+            asyncio.set_event_loop(loop)
+            return loop.run_until_complete(main)
+        finally:
+            try:
+                pending = asyncio.all_tasks(loop)
+                for task in pending:
+                    task.cancel()
+                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+                loop.run_until_complete(loop.shutdown_asyncgens())
+            finally:
+                asyncio.set_event_loop(None)
+                loop.close()
+
+
+def create_clock() -> Clock:
+    if config.TIME_SCALE == 1:
+        return RealClock()
+    logger.info("Время поездок ускорено в %.1f раз", config.TIME_SCALE)
+    return ScaledClock(config.TIME_SCALE)
+
+
+_clock: Clock = create_clock()
+
+
+def get_clock() -> Clock:
+    return _clock
+
+
+def set_clock(clock: Clock):
+    """
+    Подменяет часы движка (до запуска поездок).
+    """
+    global _clock
+    _clock = clock
+
+
+async def sleep(seconds: float):
+    await _clock.sleep(seconds)
+
+
+def time() -> float:
+    return _clock.time()
+
+
+def monotonic() -> float:
+    return _clock.monotonic()
+
+
+def since(timestamp: float) -> float:
+    return _clock.since(timestamp)
+
+
+def from_wall(timestamp: float) -> float:
+    return _clock.from_wall(timestamp)
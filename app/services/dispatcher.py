@@ -0,0 +1,433 @@
+# app/services/dispatcher.py
+#
+# Диспетчер поездок. /load и /upload не запускают поездки напрямую,
+# а ставят их в очередь с приоритетом (время вылета самолёта или время
+# запроса). Как только в парке появляется свободная машина (или место
+# под новую), диспетчер выдаёт её первой поездке в очереди.
+#
+# Один запрос в очереди – все пассажиры самолёта. Каждая выданная машина
+# забирает из него столько пассажиров, сколько вмещает (вместимость может
+# быть своей у каждой машины), пока запрос не опустеет.
+#
+# Если свободных машин несколько, их распределяет между первыми запросами
+# очереди планировщик (services.planner) – по минимуму суммарного пути
+# от гаражей до самолётов.
+#
+# Пакет запросов (submit_batch) встаёт в очередь целиком до того, как
+# диспетчер проснётся, поэтому планировщик видит весь пакет сразу.
+# Сроки обслуживания оценивает services.eta.
+
+import math
+import uuid
+import heapq
+import asyncio
+import itertools
+import logging
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import config
+from services import clock, circuit_breaker
+from services.fleet import fleet, FleetRegistry, Vehicle, VehicleState
+from services.tasks import (
+    process_transporter_task,
+    resume_trip,
+    schedule_idle_return,
+    stop_idle_returns
+)
+from services.trip_journal import trip_journal, TripStage
+from services.aircraft import aircraft_registry
+from services.planner import planner
+from services.eta import eta, Estimate
+from services.jobs import job_registry
+from services.metrics import STAGE_ACQUISITION
+
+logger = logging.getLogger(__name__)
+
+
+class TripRequest:
+    __slots__ = ("trip_id", "aircraft_id", "aircraft_coordinates", "passenger_count",
+                 "is_boarding", "priority", "enqueued_at", "job_id")
+
+    def __init__(self, aircraft_id: str, aircraft_coordinates: str, passenger_count: int,
+                 is_boarding: bool, priority: Optional[float] = None, trip_id: Optional[str] = None,
+                 job_id: Optional[str] = None):
+        self.trip_id = trip_id or uuid.uuid4().hex
+        self.job_id = job_id      # пакет запросов, к которому относится поездка
+        self.aircraft_id = aircraft_id
+        self.aircraft_coordinates = aircraft_coordinates
+        self.passenger_count = passenger_count
+        self.is_boarding = is_boarding
+        self.enqueued_at = clock.monotonic()
+        # Меньше – раньше. По умолчанию – время запроса (FIFO). Шкала –
+        # clock.time(): сроки из запросов переводятся в неё (clock.from_wall)
+        self.priority = priority if priority is not None else clock.time()
+
+    @classmethod
+    def from_state(cls, state: dict) -> "TripRequest":
+        return cls(state["aircraft_id"], state["aircraft_coordinates"], state["passenger_count"],
+                   state["is_boarding"], priority=state.get("priority"), trip_id=state["trip_id"],
+                   job_id=state.get("job_id"))
+
+    def journal_fields(self) -> dict:
+        return {
+            "aircraft_id": self.aircraft_id,
+            "aircraft_coordinates": self.aircraft_coordinates,
+            "passenger_count": self.passenger_count,
+            "is_boarding": self.is_boarding,
+            "priority": self.priority,
+            "job_id": self.job_id,
+        }
+
+    def split(self, passenger_count: int) -> "TripRequest":
+        """
+        Отделяет поездку на passenger_count пассажиров, остаток остаётся
+        в этом запросе (с тем же приоритетом и временем постановки).
+        """
+        part = TripRequest(self.aircraft_id, self.aircraft_coordinates, passenger_count,
+                           self.is_boarding, priority=self.priority, job_id=self.job_id)
+        part.enqueued_at = self.enqueued_at
+        self.passenger_count -= passenger_count
+        return part
+
+    def as_dict(self) -> dict:
+        return {
+            "trip_id": self.trip_id,
+            "aircraft_id": self.aircraft_id,
+            "aircraft_coordinates": self.aircraft_coordinates,
+            "passenger_count": self.passenger_count,
+            "is_boarding": self.is_boarding,
+            "priority": self.priority,
+            "job_id": self.job_id,
+            "waiting_sec": round(clock.monotonic() - self.enqueued_at, 3),
+        }
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class Dispatcher:
+    def __init__(self, fleet_registry: FleetRegistry, max_queue_size: int):
+        self.fleet = fleet_registry
+        self.max_queue_size = max_queue_size
+        self._heap: List[Tuple[float, int, TripRequest]] = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._loop_task: Optional[asyncio.Task] = None
+        self._trips: Set[asyncio.Task] = set()
+        # Пробная поездка, запущенная, пока предохранитель в half_open
+        self._trial: Optional[asyncio.Task] = None
+        # Метрики
+        self.submitted = 0
+        self.dispatched = 0
+        self.rejected = 0
+        self.requeued = 0
+        self.recovered = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._recent_waits = deque(maxlen=500)
+        self.version = 0    # растёт при каждом изменении очереди
+        # Последняя оценка сроков: (версия очереди, версия парка, когда, оценка)
+        self._estimate: Optional[Tuple[int, int, float, Dict[str, Estimate]]] = None
+        self.fleet.subscribe(self._wakeup.set)
+        circuit_breaker.subscribe(self._wakeup.set)
+
+    # --- очередь ---
+
+    def submit(self, trip: TripRequest) -> int:
+        """
+        Ставит поездку в очередь. Возвращает глубину очереди после вставки.
+        Если очередь переполнена – QueueFullError.
+        """
+        if len(self._heap) >= self.max_queue_size:
+            self.rejected += 1
+            raise QueueFullError(f"Очередь поездок переполнена ({self.max_queue_size})")
+        heapq.heappush(self._heap, (trip.priority, next(self._seq), trip))
+        self.version += 1
+        trip_journal.checkpoint(trip.trip_id, TripStage.QUEUED, **trip.journal_fields())
+        aircraft_registry.plan(trip.trip_id, trip.aircraft_id, trip.is_boarding, trip.passenger_count)
+        self.submitted += 1
+        self._wakeup.set()
+        return len(self._heap)
+
+    def submit_batch(self, trips: Sequence[TripRequest]) -> int:
+        """
+        Ставит пакет поездок в очередь целиком или не ставит ничего
+        (QueueFullError). Диспетчер будится один раз на весь пакет.
+        """
+        if len(self._heap) + len(trips) > self.max_queue_size:
+            self.rejected += len(trips)
+            raise QueueFullError(f"Очередь поездок переполнена ({self.max_queue_size})")
+        for trip in trips:
+            heapq.heappush(self._heap, (trip.priority, next(self._seq), trip))
+            trip_journal.checkpoint(trip.trip_id, TripStage.QUEUED, **trip.journal_fields())
+            aircraft_registry.plan(trip.trip_id, trip.aircraft_id, trip.is_boarding, trip.passenger_count)
+        self.version += 1
+        self.submitted += len(trips)
+        self._wakeup.set()
+        return len(self._heap)
+
+    def estimate(self) -> Dict[str, Estimate]:
+        """
+        Оценка сроков для всех запросов в очереди (в порядке очереди):
+        { trip_id: Estimate }. Расписание строится по всей очереди, поэтому
+        оценка переиспользуется, пока не изменились очередь и парк, но не
+        дольше ETA_CACHE_SEC (/jobs/{job_id} опрашивают часто).
+        """
+        now = clock.monotonic()
+        cached = self._estimate
+        if (cached is not None and cached[:2] == (self.version, self.fleet.version)
+                and now - cached[2] < config.ETA_CACHE_SEC):
+            return cached[3]
+        queued = [trip for _, _, trip in sorted(self._heap)]
+        estimates = eta.estimate([(trip.aircraft_coordinates, trip.passenger_count) for trip in queued])
+        result = {trip.trip_id: estimate for trip, estimate in zip(queued, estimates)}
+        self._estimate = (self.version, self.fleet.version, now, result)
+        return result
+
+    def depth(self) -> int:
+        return len(self._heap)
+
+    def pending(self) -> List[dict]:
+        return [trip.as_dict() for _, _, trip in sorted(self._heap)]
+
+    # --- жизненный цикл ---
+
+    async def recover(self):
+        """
+        Восстанавливает состояние из журнала поездок (до start()): машины
+        возвращаются в парк, сеансы самолётов – по незавершённым поездкам,
+        поездки из очереди – в очередь, остальные продолжаются с последнего
+        этапа. Работа пропорциональна числу активных поездок.
+        """
+        trips, vehicles = trip_journal.open()
+        busy = {state["vehicle_id"] for state in trips
+                if state["stage"] != TripStage.QUEUED.value and "vehicle_id" in state}
+        for data in vehicles:
+            await self.fleet.restore(Vehicle.from_dict(data), busy=data["vehicle_id"] in busy)
+        await self.fleet.reclaim(busy)
+        await self.fleet.reclaim_slots()
+        await aircraft_registry.restore(trips)
+        # Машины, ждавшие у самолётов, снова ждут не дольше VEHICLE_IDLE_RETURN_SEC
+        for vehicle in self.fleet.free_vehicles():
+            if vehicle.state == VehicleState.IDLE:
+                schedule_idle_return(vehicle.vehicle_id, vehicle.current_node)
+
+        for state in trips:
+            trip = TripRequest.from_state(state)
+            job_registry.restore(state)
+            if state["stage"] == TripStage.QUEUED.value:
+                heapq.heappush(self._heap, (trip.priority, next(self._seq), trip))
+                self.version += 1
+            else:
+                self._track(trip, asyncio.create_task(resume_trip(state)))
+                self.recovered += 1
+        if trips:
+            logger.info("Восстановлено из журнала: %d поездок в работе, %d в очереди",
+                        self.recovered, len(self._heap))
+            self._wakeup.set()
+
+    def start(self):
+        if self._loop_task is None or self._loop_task.done():
+            self._loop_task = asyncio.create_task(self._run())
+            logger.info("Диспетчер поездок запущен (парк до %d машин)", self.fleet.max_size)
+
+    async def stop(self):
+        tasks = list(self._trips)
+        if self._loop_task is not None:
+            tasks.append(self._loop_task)
+            self._loop_task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await stop_idle_returns()
+
+    async def _run(self):
+        while True:
+            # Сбрасываем событие до проверки состояния, чтобы не потерять
+            # сигнал, пришедший во время acquire()
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            # Деградированный режим: внешний сервис недоступен, поездки ждут
+            # в очереди. Когда предохранитель пропускает пробный запрос,
+            # запускается одна поездка; остальные – после его закрытия
+            probing = circuit_breaker.probing()
+            if circuit_breaker.holding() or (probing and self._trial is not None and not self._trial.done()):
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(),
+                                           max(0.01, circuit_breaker.retry_in() or config.STATE_POLL_INTERVAL))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            if (config.PLANNER_ENABLED and not probing and self.fleet.free_count()
+                    and await self._dispatch_planned()):
+                continue
+
+            _, _, trip = self._heap[0]
+            # Ближайший к самолёту гараж – первым
+            garage_order = planner.garage_order(self.fleet.free_vehicles(), trip.aircraft_coordinates)
+            vehicle = await self.fleet.acquire(trip.aircraft_coordinates, garage_order)
+            if vehicle is None and not await self.fleet.reserve_slot():
+                if self.fleet.free_count() and self.fleet.size() >= self.fleet.max_size:
+                    # Свободные машины есть, но ни одна не обслуживает эти
+                    # координаты – отдаём любую, поездка сама сообщит об ошибке
+                    vehicle = await self.fleet.acquire()
+                if vehicle is None:
+                    # Ждём возврата машины в гараж или новой поездки. Машину
+                    # может освободить и другой воркер – тогда сигнала не будет,
+                    # поэтому перепроверяем парк по таймауту
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), config.STATE_POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+            self._assign(trip, vehicle)
+
+    async def _dispatch_planned(self) -> bool:
+        """
+        Распределяет свободные машины между первыми запросами очереди
+        (столько поездок, сколько свободных машин, но не больше
+        PLANNER_MAX_TRIPS) с минимальным суммарным путём до самолётов.
+        Возвращает True, если запущена хоть одна поездка.
+        """
+        vehicles = self.fleet.free_vehicles()
+        if not vehicles:
+            return False
+        default_capacity = self.fleet.capacity_of(None)
+        limit = min(len(vehicles), max(1, config.PLANNER_MAX_TRIPS))
+        rows: List[TripRequest] = []
+        for _, _, trip in heapq.nsmallest(limit, self._heap):
+            slots = math.ceil(trip.passenger_count / default_capacity)
+            rows.extend([trip] * min(slots, limit - len(rows)))
+            if len(rows) >= limit:
+                break
+
+        pairs = planner.assign([v.service_spots for v in vehicles],
+                               [trip.aircraft_coordinates for trip in rows],
+                               [v.garage_node for v in vehicles],
+                               [v.current_node for v in vehicles])
+        launched = False
+        finished: Set[str] = set()
+        for r, c in pairs:
+            trip = rows[r]
+            if trip.trip_id in finished:
+                # Запрос уже разобрали машины большей вместимости
+                continue
+            vehicle = await self.fleet.claim(vehicles[c].vehicle_id)
+            if vehicle is None:
+                continue
+            if self._assign(trip, vehicle):
+                finished.add(trip.trip_id)
+            launched = True
+        return launched
+
+    def _assign(self, trip: TripRequest, vehicle: Optional[Vehicle]) -> bool:
+        """
+        Машина берёт столько пассажиров запроса, сколько вмещает; остаток
+        остаётся в очереди с тем же приоритетом и ждёт следующую машину.
+        Возвращает True, если запрос разобран целиком и убран из очереди.
+        """
+        share = min(trip.passenger_count, self.fleet.capacity_of(vehicle))
+        self.version += 1
+        if share < trip.passenger_count:
+            part = trip.split(share)
+            aircraft_registry.split(trip.trip_id, part.trip_id, share)
+            trip_journal.checkpoint(trip.trip_id, TripStage.QUEUED, **trip.journal_fields())
+            trip_journal.checkpoint(part.trip_id, TripStage.QUEUED, **part.journal_fields())
+            self._launch(part, vehicle)
+            return False
+        if self._heap[0][2] is trip:
+            heapq.heappop(self._heap)
+        else:
+            self._heap = [entry for entry in self._heap if entry[2] is not trip]
+            heapq.heapify(self._heap)
+        self._launch(trip, vehicle)
+        return True
+
+    def _launch(self, trip: TripRequest, vehicle):
+        waited = clock.monotonic() - trip.enqueued_at
+        self.dispatched += 1
+        self._total_wait += waited
+        self._max_wait = max(self._max_wait, waited)
+        self._recent_waits.append(waited)
+        STAGE_ACQUISITION.observe(waited)
+        if vehicle is not None:
+            eta.vehicle_busy(vehicle, trip.aircraft_coordinates, trip.passenger_count)
+
+        task = asyncio.create_task(process_transporter_task(
+            aircraft_id=trip.aircraft_id,
+            aircraft_coordinates=trip.aircraft_coordinates,
+            passenger_count=trip.passenger_count,
+            is_boarding=trip.is_boarding,
+            vehicle=vehicle,
+            trip_id=trip.trip_id
+        ))
+        self._track(trip, task)
+        if circuit_breaker.probing():
+            self._trial = task
+        logger.info("Поездка для самолёта %s запущена (ждала %.2f сек, машина %s)",
+                    trip.aircraft_id, waited,
+                    vehicle.vehicle_id if vehicle else "новая")
+
+    def _track(self, trip: TripRequest, task: asyncio.Task):
+        self._trips.add(task)
+        task.add_done_callback(self._trips.discard)
+        task.add_done_callback(lambda t: self._on_trip_done(trip, t))
+
+    def _on_trip_done(self, trip: TripRequest, task: asyncio.Task):
+        if task.cancelled():
+            # Остановка сервиса: поездка остаётся в журнале и продолжится после перезапуска
+            return
+        if task.exception() is not None:
+            trip_journal.checkpoint(trip.trip_id, TripStage.DONE, outcome="error")
+            aircraft_registry.drop(trip.trip_id)
+            return
+        if not task.result():
+            trip_journal.checkpoint(trip.trip_id, TripStage.DONE)
+            # Поездка, не доехавшая до самолёта, больше не ждётся его сеансом
+            aircraft_registry.drop(trip.trip_id)
+            return
+        # Бюджет повторов исчерпан или машину не удалось зарегистрировать –
+        # поездка возвращается в очередь с прежним приоритетом (лимит
+        # очереди не проверяем: она уже была принята)
+        self.requeued += 1
+        heapq.heappush(self._heap, (trip.priority, next(self._seq), trip))
+        self.version += 1
+        trip_journal.checkpoint(trip.trip_id, TripStage.QUEUED, **trip.journal_fields())
+        aircraft_registry.plan(trip.trip_id, trip.aircraft_id, trip.is_boarding, trip.passenger_count)
+        self._wakeup.set()
+        logger.info("Поездка для самолёта %s возвращена в очередь", trip.aircraft_id)
+
+    # --- метрики ---
+
+    def stats(self) -> dict:
+        now = clock.monotonic()
+        oldest = max((now - trip.enqueued_at for _, _, trip in self._heap), default=0.0)
+        recent = sorted(self._recent_waits)
+        return {
+            "queue_depth": len(self._heap),
+            "max_queue_size": self.max_queue_size,
+            "active_trips": len(self._trips),
+            "submitted": self.submitted,
+            "dispatched": self.dispatched,
+            "rejected": self.rejected,
+            "requeued": self.requeued,
+            "recovered": self.recovered,
+            "oldest_wait_sec": round(oldest, 3),
+            "avg_wait_sec": round(self._total_wait / self.dispatched, 3) if self.dispatched else 0.0,
+            "p95_wait_sec": round(recent[min(len(recent) - 1, int(len(recent) * 0.95))], 3) if recent else 0.0,
+            "max_wait_sec": round(self._max_wait, 3),
+            "fleet_size": self.fleet.size(),
+            "fleet_free": self.fleet.free_count(),
+            "fleet_max_size": self.fleet.max_size,
+            "degraded": circuit_breaker.holding(),
+        }
+
+
+dispatcher = Dispatcher(fleet, max_queue_size=config.DISPATCH_QUEUE_MAX_SIZE)
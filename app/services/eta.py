@@ -0,0 +1,183 @@
+# app/services/eta.py
+#
+# Оценка времени начала и окончания обслуживания самолётов по текущему
+# парку и очереди диспетчера. Модель – жадное расписание в порядке очереди:
+# пассажиры запроса делятся между машинами по вместимости (как в
+# диспетчере), каждая часть достаётся машине, которая раньше других доедет
+# до самолёта. Обслуживание начинается с приездом первой машины и
+# заканчивается, когда уезжает последняя. Время в пути – по матрице
+# расстояний планировщика и SPEED_CAR, время посадки – BOARDING_RATE.
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import config
+from services import clock
+from services.fleet import fleet, FleetRegistry, FREE_STATES, Vehicle
+from services.movement import SPEED_CAR
+from services.planner import planner, TravelMatrix
+from services.tasks import BOARDING_RATE
+
+
+class VehicleSlot:
+    """
+    Машина в расписании: когда и где она освободится.
+    node=None – место в парке под машину, которую ещё предстоит
+    зарегистрировать (гараж неизвестен).
+    """
+    __slots__ = ("available_at", "node", "garage_node", "service_spots", "capacity")
+
+    def __init__(self, available_at: float, node: Optional[str], garage_node: Optional[str],
+                 service_spots: Optional[Dict[str, str]], capacity: int):
+        self.available_at = available_at
+        self.node = node
+        self.garage_node = garage_node
+        self.service_spots = service_spots
+        self.capacity = capacity
+
+
+class Estimate:
+    __slots__ = ("start", "finish", "vehicles")
+
+    def __init__(self, start: Optional[float], finish: Optional[float], vehicles: int):
+        self.start = start        # clock.time(); None – ни одна машина не обслуживает координаты
+        self.finish = finish
+        self.vehicles = vehicles
+
+
+class EtaEstimator:
+    def __init__(self, fleet_registry: FleetRegistry, matrix: TravelMatrix):
+        self.fleet = fleet_registry
+        self.matrix = matrix
+        # Когда и где освободится занятая машина: { vehicle_id: (clock.time(), узел) }
+        self._busy_until: Dict[str, Tuple[float, str]] = {}
+
+    # --- время ---
+
+    def _default_distance(self) -> float:
+        mean = self.matrix.mean_distance()
+        return config.ETA_DEFAULT_DISTANCE if mean is None else mean
+
+    def _travel(self, origin: Optional[str], spot: str, distances: Dict[Tuple[str, str], float]) -> float:
+        if origin == spot:
+            return 0.0
+        if origin is None:
+            return self._default_distance() / SPEED_CAR
+        return distances[(origin, spot)] / SPEED_CAR
+
+    def trip_duration(self, vehicle: Vehicle, coordinates: str, passenger_count: int) -> Tuple[float, str]:
+        """
+        Оценка длительности поездки машины (до самолёта, посадка, обратно)
+        и узла, где машина окажется свободной.
+        """
+        spot = vehicle.service_spots.get(coordinates)
+        if spot is None:
+            return 0.0, vehicle.current_node
+        distances = self._distances([vehicle.current_node, vehicle.garage_node], [spot])
+        duration = self._travel(vehicle.current_node, spot, distances) + passenger_count / BOARDING_RATE
+        if config.VEHICLE_CHAINING:
+            return duration, spot
+        return duration + self._travel(vehicle.garage_node, spot, distances), vehicle.garage_node
+
+    def progress(self, node: Optional[str], spot: Optional[str], passenger_count: int,
+                 boarding_started_at: Optional[float] = None) -> Tuple[Optional[float], Optional[float]]:
+        """
+        Оценка для уже запущенной поездки: (приезд к самолёту, конец посадки).
+        node – узел, где машина сейчас или куда едет; boarding_started_at –
+        начало посадки, если машина уже у самолёта.
+        """
+        if boarding_started_at is not None:
+            return boarding_started_at, boarding_started_at + passenger_count / BOARDING_RATE
+        if spot is None:
+            return None, None
+        distances = self._distances([node], [spot])
+        arrival = clock.time() + self._travel(node, spot, distances)
+        return arrival, arrival + passenger_count / BOARDING_RATE
+
+    def vehicle_busy(self, vehicle: Vehicle, coordinates: str, passenger_count: int):
+        """
+        Машина уехала на поездку (вызывает диспетчер).
+        """
+        duration, end_node = self.trip_duration(vehicle, coordinates, passenger_count)
+        self._busy_until[vehicle.vehicle_id] = (clock.time() + duration, end_node)
+
+    def _distances(self, origins: Sequence[str], spots: Sequence[str]) -> Dict[Tuple[str, str], float]:
+        origins = list(dict.fromkeys(o for o in origins if o is not None))
+        spots = list(dict.fromkeys(spots))
+        if not origins or not spots:
+            return {}
+        block = self.matrix.distances(origins, spots, default=self._default_distance())
+        return {(o, s): float(block[i, j]) for i, o in enumerate(origins) for j, s in enumerate(spots)}
+
+    # --- расписание ---
+
+    def _slots(self, now: float) -> List[VehicleSlot]:
+        slots = []
+        default_capacity = self.fleet.capacity_of(None)
+        # Занятая машина без оценки (восстановлена из журнала, регистрируется):
+        # свободна через типичную поездку
+        typical = 2 * self._default_distance() / SPEED_CAR + default_capacity / BOARDING_RATE
+        for vehicle in self.fleet.vehicles():
+            capacity = self.fleet.capacity_of(vehicle)
+            if vehicle.state in FREE_STATES:
+                slots.append(VehicleSlot(now, vehicle.current_node, vehicle.garage_node,
+                                         vehicle.service_spots, capacity))
+                continue
+            until, node = self._busy_until.get(vehicle.vehicle_id, (now + typical, vehicle.garage_node))
+            slots.append(VehicleSlot(max(now, until), node, vehicle.garage_node,
+                                     vehicle.service_spots, capacity))
+        for _ in range(max(0, self.fleet.max_size - self.fleet.size())):
+            slots.append(VehicleSlot(now, None, None, None, default_capacity))
+        return slots
+
+    def estimate(self, trips: Sequence[Tuple[str, int]]) -> List[Estimate]:
+        """
+        trips – (координаты самолёта, пассажиры) в порядке очереди.
+        Возвращает оценку для каждой поездки (время – clock.time()).
+        """
+        now = clock.time()
+        slots = self._slots(now)
+        spot_nodes = {s.service_spots.get(coords) for s in slots if s.service_spots for coords, _ in trips}
+        spot_nodes.discard(None)
+        origins = [s.node for s in slots] + [s.garage_node for s in slots]
+        distances = self._distances(origins, sorted(spot_nodes))
+
+        estimates = []
+        for coordinates, passenger_count in trips:
+            remaining = passenger_count
+            start = finish = None
+            used = 0
+            while remaining > 0:
+                best = None
+                for slot in slots:
+                    spot = slot.service_spots.get(coordinates) if slot.service_spots else coordinates
+                    if spot is None:
+                        continue
+                    if slot.node is not None and (slot.node, spot) not in distances and slot.node != spot:
+                        distances.update(self._distances([slot.node], [spot]))
+                    arrival = slot.available_at + self._travel(slot.node, spot, distances)
+                    if best is None or arrival < best[0]:
+                        best = (arrival, slot, spot)
+                if best is None:
+                    break
+                arrival, slot, spot = best
+                share = min(remaining, max(1, slot.capacity))
+                remaining -= share
+                used += 1
+                done = arrival + share / BOARDING_RATE
+                start = arrival if start is None else min(start, arrival)
+                finish = done if finish is None else max(finish, done)
+                # Машина освобождается у самолёта или после возврата в гараж
+                if slot.garage_node is None:
+                    slot.available_at = done if config.VEHICLE_CHAINING else done + self._travel(None, spot, distances)
+                elif config.VEHICLE_CHAINING:
+                    slot.available_at, slot.node = done, spot
+                else:
+                    if (slot.garage_node, spot) not in distances:
+                        distances.update(self._distances([slot.garage_node], [spot]))
+                    slot.available_at = done + self._travel(slot.garage_node, spot, distances)
+                    slot.node = slot.garage_node
+            estimates.append(Estimate(start, finish, used))
+        return estimates
+
+
+eta = EtaEstimator(fleet, planner.matrix)
@@ -0,0 +1,112 @@
+# app/services/events.py
+#
+# Шина событий в памяти процесса: поездки, пакеты запросов (jobs) и парк.
+# Каждый подписчик (поток /events, SSE) получает свою очередь ограниченного
+# размера. Если подписчик не успевает читать, самые старые события
+# вытесняются, а подписчик узнаёт, сколько пропустил (и может перечитать
+# состояние через /jobs/{id} или /admin/vehicles). Публикация не ждёт
+# подписчиков и не блокирует поездки.
+
+import asyncio
+import itertools
+from collections import deque
+from typing import Deque, Iterable, Optional, Set, Tuple
+
+import config
+from services import clock
+
+
+class Event:
+    __slots__ = ("event_id", "type", "data", "ts")
+
+    def __init__(self, event_id: int, type_: str, data: dict):
+        self.event_id = event_id
+        self.type = type_
+        self.data = data
+        self.ts = clock.time()
+
+    def as_dict(self) -> dict:
+        return {"id": self.event_id, "type": self.type, "ts": round(self.ts, 3), "data": self.data}
+
+
+class Subscription:
+    """
+    Очередь событий одного подписчика. types – какие события получать
+    (None – все), job_id – только события этого пакета (и события парка).
+    """
+
+    def __init__(self, bus: "EventBus", buffer_size: int,
+                 types: Optional[Iterable[str]] = None, job_id: Optional[str] = None):
+        self._bus = bus
+        self._buffer: Deque[Event] = deque(maxlen=buffer_size)
+        self._ready = asyncio.Event()
+        self.types = set(types) if types else None
+        self.job_id = job_id
+        self.dropped = 0
+
+    def wants(self, event: Event) -> bool:
+        if self.types is not None and event.type not in self.types:
+            return False
+        if self.job_id is not None and event.type != "vehicle":
+            return event.data.get("job_id") == self.job_id
+        return True
+
+    def put(self, event: Event):
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+            self._bus.dropped += 1
+        self._buffer.append(event)
+        self._ready.set()
+
+    async def get(self, timeout: Optional[float] = None) -> Tuple[Optional[Event], int]:
+        """
+        Следующее событие и число вытесненных перед ним (с прошлого вызова).
+        По таймауту – (None, 0).
+        """
+        while not self._buffer:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None, 0
+        dropped, self.dropped = self.dropped, 0
+        return self._buffer.popleft(), dropped
+
+    def close(self):
+        self._bus.unsubscribe(self)
+
+
+class EventBus:
+    def __init__(self, buffer_size: int):
+        self.buffer_size = buffer_size
+        self._subscribers: Set[Subscription] = set()
+        self._ids = itertools.count(1)
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, types: Optional[Iterable[str]] = None, job_id: Optional[str] = None) -> Subscription:
+        subscription = Subscription(self, self.buffer_size, types, job_id)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+    def publish(self, type_: str, data: dict):
+        self.published += 1
+        if not self._subscribers:
+            return
+        event = Event(next(self._ids), type_, data)
+        for subscription in self._subscribers:
+            if subscription.wants(event):
+                subscription.put(event)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+event_bus = EventBus(config.EVENT_BUFFER_SIZE)
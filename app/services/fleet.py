@@ -0,0 +1,238 @@
+# app/services/fleet.py
+#
+# Реестр машин: фасад над хранилищем состояния с уведомлением диспетчера
+# о появлении свободных машин. Смены состояния и положения машин
+# публикуются в шину событий (событие "vehicle") и увеличивают version –
+# по нему /admin/vehicles понимает, что снимок парка устарел.
+
+import logging
+from typing import Callable, Iterable, List, Optional
+
+import config
+from services import clock
+from services.state_store import FREE_STATES, StateStore, Vehicle, VehicleState, state_store
+from services.trip_journal import trip_journal
+from services.events import event_bus
+from services.worker import worker
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["FREE_STATES", "FleetRegistry", "Vehicle", "VehicleState", "fleet"]
+
+
+class FleetRegistry:
+    """
+    Состояние парка. Сами данные лежат в хранилище (services.state_store):
+    в памяти процесса или в SQLite, общем для нескольких воркеров.
+    Захват машины и резервирование места атомарны на стороне хранилища.
+    """
+
+    def __init__(self, max_size: int, store: StateStore):
+        self.max_size = max_size
+        self.store = store
+        self._listeners: List[Callable[[], None]] = []
+        self.version = 0    # растёт при каждом изменении машин в этом процессе
+        # До этого момента (clock.monotonic()) новые машины не регистрируем
+        self._register_after = 0.0
+
+    def subscribe(self, callback: Callable[[], None]):
+        """
+        callback() вызывается, когда в пуле появляется свободная машина
+        или освобождается место под регистрацию (в этом процессе).
+        """
+        self._listeners.append(callback)
+
+    def _notify(self):
+        for callback in self._listeners:
+            callback()
+
+    def _publish(self, vehicle: Optional[Vehicle]):
+        if vehicle is None:
+            return
+        self.version += 1
+        event_bus.publish("vehicle", {"vehicle_id": vehicle.vehicle_id, "state": vehicle.state.value,
+                                      "current_node": vehicle.current_node})
+
+    async def acquire(self, aircraft_coordinates: Optional[str] = None,
+                      garage_order: Optional[Iterable[str]] = None) -> Optional[Vehicle]:
+        """
+        Забирает свободную машину и переводит её в EN_ROUTE.
+        garage_order – гаражи в порядке предпочтения (ближайший первым,
+        см. planner.garage_order); гаражи не из списка – после них.
+        Если не задан, берётся любой гараж. Если указаны координаты,
+        подходят только машины, у которых есть для них serviceSpot.
+        """
+        vehicle = await self.store.claim_free_vehicle(aircraft_coordinates, garage_order)
+        self._publish(vehicle)
+        return vehicle
+
+    async def claim(self, vehicle_id: str) -> Optional[Vehicle]:
+        """
+        Забирает конкретную свободную машину (выбранную планировщиком).
+        None – машину уже забрала другая поездка или другой воркер.
+        """
+        vehicle = await self.store.claim_vehicle(vehicle_id)
+        self._publish(vehicle)
+        return vehicle
+
+    async def reserve_slot(self) -> bool:
+        """
+        Резервирует место под новую машину, если лимит парка не исчерпан
+        и ground-control недавно не отказывал в регистрации.
+        После регистрации нужно вызвать add() или release_slot().
+        """
+        if clock.monotonic() < self._register_after:
+            return False
+        return await self.store.reserve_slot(self.max_size)
+
+    def registration_rejected(self):
+        """
+        Ground-control отказал в регистрации (например, 403 – нет свободного
+        узла): FLEET_REGISTER_RETRY_SEC секунд новых машин не просим.
+        """
+        self._register_after = clock.monotonic() + config.FLEET_REGISTER_RETRY_SEC
+
+    async def release_slot(self):
+        await self.store.release_slot()
+        self._notify()
+
+    async def add(self, vehicle: Vehicle, busy: bool = True, reserved: bool = True):
+        """
+        Добавляет зарегистрированную машину. busy=True – машина сразу
+        занята поездкой, которая её зарегистрировала.
+        """
+        await self.store.add_vehicle(vehicle, busy, reserved)
+        self._publish(self.store.get_vehicle(vehicle.vehicle_id))
+        if not busy:
+            self._notify()
+
+    async def release(self, vehicle_id: str, at_node: Optional[str] = None):
+        """
+        Возвращает машину в пул свободных: в своём гараже (at_node=None)
+        или ожидающей на узле at_node (IDLE, цепочка поездок).
+        """
+        if await self.store.release_vehicle(vehicle_id, at_node):
+            # Где стоит свободная машина – нужно и после перезапуска
+            vehicle = self.store.get_vehicle(vehicle_id)
+            if vehicle is not None:
+                trip_journal.record_vehicle(vehicle.as_dict())
+            self._publish(vehicle)
+            self._notify()
+
+    async def restore(self, vehicle: Vehicle, busy: bool):
+        """
+        Возвращает в парк машину из журнала поездок после перезапуска.
+        busy=False – у машины нет незавершённой поездки в журнале этого
+        воркера. Если в общем хранилище она «в пути», её освобождаем, только
+        когда ведёт её этот воркер (его прежний процесс с тем же номером) или
+        её воркер мёртв: машину мог забрать и другой, живой воркер.
+        """
+        at_node = vehicle.current_node if vehicle.state == VehicleState.IDLE else None
+        existing = self.store.get_vehicle(vehicle.vehicle_id)
+        if existing is None:
+            await self.store.add_vehicle(vehicle, busy=True, reserved=False)
+            if not busy:
+                await self.store.release_vehicle(vehicle.vehicle_id, at_node)
+        elif busy:
+            if existing.state in FREE_STATES:
+                # Машину успели вернуть в пул при остановке, но поездка продолжится
+                await self.store.add_vehicle(existing, busy=True, reserved=False)
+            elif existing.owner != worker.id and worker.alive(existing.owner):
+                logger.warning("Машина %s из журнала занята воркером %s", vehicle.vehicle_id, existing.owner)
+        elif existing.state == VehicleState.EN_ROUTE and not self._owned_by_other(existing):
+            await self.store.release_vehicle(vehicle.vehicle_id, at_node)
+        self._publish(self.store.get_vehicle(vehicle.vehicle_id))
+
+    async def reclaim(self, busy: Iterable[str]) -> int:
+        """
+        После перезапуска: освобождает машины, которые в хранилище ведёт
+        этот воркер (прежний процесс с тем же номером), но у которых нет
+        поездки в его журнале (busy) – например, если журнал выключен.
+        Машина остаётся там, где остановилась. Возвращает число машин.
+        """
+        busy = set(busy)
+        reclaimed = 0
+        for vehicle in self.store.list_vehicles():
+            if (vehicle.state == VehicleState.EN_ROUTE and vehicle.owner == worker.id
+                    and vehicle.vehicle_id not in busy):
+                if await self.store.release_vehicle(vehicle.vehicle_id, vehicle.current_node):
+                    reclaimed += 1
+                    self._publish(self.store.get_vehicle(vehicle.vehicle_id))
+        if reclaimed:
+            logger.warning("Освобождено машин прежнего процесса воркера %s: %d", worker.id, reclaimed)
+            self._notify()
+        return reclaimed
+
+    async def reclaim_slots(self) -> int:
+        """
+        После перезапуска: снимает места, зарезервированные под регистрацию
+        прежним процессом этого воркера или упавшими воркерами, – иначе
+        каждое падение посреди регистрации навсегда уменьшало бы парк.
+        Возвращает число мест.
+        """
+        freed = 0
+        for owner in self.store.reservation_owners():
+            if owner == (worker.id or "") or not worker.alive(owner):
+                freed += await self.store.clear_reservations(owner)
+        if freed:
+            logger.warning("Снято резервов под регистрацию прежних процессов: %d", freed)
+            self._notify()
+        return freed
+
+    @staticmethod
+    def _owned_by_other(vehicle: Vehicle) -> bool:
+        return vehicle.owner != worker.id and worker.alive(vehicle.owner)
+
+    async def set_position(self, vehicle: Vehicle, node: str):
+        vehicle.current_node = node
+        await self.store.set_position(vehicle.vehicle_id, node)
+        self._publish(vehicle)
+
+    async def set_capacity(self, vehicle_id: str, capacity: Optional[int]) -> bool:
+        """
+        Своя вместимость машины (None – общая). False, если машины нет.
+        """
+        if not await self.store.set_vehicle_capacity(vehicle_id, capacity):
+            return False
+        # Машины восстанавливаются из журнала поездок – сохраняем и вместимость
+        vehicle = self.store.get_vehicle(vehicle_id)
+        trip_journal.record_vehicle(vehicle.as_dict())
+        self._publish(vehicle)
+        return True
+
+    def capacity_of(self, vehicle: Optional[Vehicle]) -> int:
+        """
+        Сколько пассажиров везёт машина. vehicle=None – новая машина,
+        которую ещё предстоит зарегистрировать (общая вместимость).
+        """
+        if vehicle is not None and vehicle.capacity:
+            return vehicle.capacity
+        return max(1, self.store.get_capacity())
+
+    def get(self, vehicle_id: str) -> Optional[Vehicle]:
+        return self.store.get_vehicle(vehicle_id)
+
+    def size(self) -> int:
+        return self.store.counts()[0]
+
+    def free_count(self) -> int:
+        return self.store.counts()[1]
+
+    def has_capacity(self) -> bool:
+        """
+        Есть свободная машина или можно зарегистрировать новую.
+        """
+        total, free, reserved = self.store.counts()
+        return free > 0 or total + reserved < self.max_size
+
+    def free_vehicles(self) -> List[Vehicle]:
+        return self.store.list_free_vehicles()
+
+    def vehicles(self) -> List[Vehicle]:
+        return self.store.list_vehicles()
+
+    def snapshot(self) -> List[dict]:
+        return [v.as_dict() for v in self.vehicles()]
+
+
+fleet = FleetRegistry(max_size=config.FLEET_MAX_SIZE, store=state_store)
@@ -1,17 +1,20 @@
 # app/services/ground_control.py
 
-import httpx
-import math
 import asyncio
 import logging
 
+import config
 from schemas import RegisterVehicleResponse, MoveResponse
+from services import http_client
+from services.outbox import outbox
+from services.retry import RetryBudgetExceeded
+from services.route_cache import route_cache
 
-# Пример: адреса, куда будем стучаться (меняются при необходимости)
-REGISTER_VEHICLE_URL = "https://ground-control.reaport.ru/register-vehicle"
-ROUTE_URL = "https://ground-control.reaport.ru/route"
-MOVE_URL = "https://ground-control.reaport.ru/move"
-ARRIVED_URL = "https://ground-control.reaport.ru/arrived"
+# Адреса, куда будем стучаться (хост – TRANSPORTER_GROUND_CONTROL_URL)
+REGISTER_VEHICLE_URL = f"{config.GROUND_CONTROL_URL}/register-vehicle"
+ROUTE_URL = f"{config.GROUND_CONTROL_URL}/route"
+MOVE_URL = f"{config.GROUND_CONTROL_URL}/move"
+ARRIVED_URL = f"{config.GROUND_CONTROL_URL}/arrived"
 
 
 async def register_vehicle_async(vehicle_type: str):
@@ -19,42 +22,51 @@ async def register_vehicle_async(vehicle_type: str):
     POST /register-vehicle/{vehicle_type}
     """
     url = f"{REGISTER_VEHICLE_URL}/{vehicle_type}"
-    async with httpx.AsyncClient() as client:
-        try:
-            resp = await client.post(url)
-            if resp.status_code == 200:
-                return RegisterVehicleResponse(**resp.json())
-            elif resp.status_code == 400:
-                logging.warning(f"[register_vehicle_async] 400: Неверные данные. {resp.text}")
-            elif resp.status_code == 403:
-                logging.warning("[register_vehicle_async] 403: Нет свободного узла.")
-            else:
-                logging.warning(f"[register_vehicle_async] Ошибка {resp.status_code}: {resp.text}")
-        except Exception as e:
-            logging.error(f"[register_vehicle_async] Exception: {e}")
+    try:
+        resp = await http_client.post("register-vehicle", url)
+        if resp.status_code == 200:
+            return RegisterVehicleResponse(**resp.json())
+        elif resp.status_code == 400:
+            logging.warning(f"[register_vehicle_async] 400: Неверные данные. {resp.text}")
+        elif resp.status_code == 403:
+            logging.warning("[register_vehicle_async] 403: Нет свободного узла.")
+        else:
+            logging.warning(f"[register_vehicle_async] Ошибка {resp.status_code}: {resp.text}")
+    except RetryBudgetExceeded:
+        raise
+    except Exception as e:
+        logging.error(f"[register_vehicle_async] Exception: {e}")
     return None
 
 
-async def get_route_async(_from: str, _to: str):
+async def get_route_async(_from: str, _to: str, vehicle_type: str = "bus"):
+    """
+    Маршрут между узлами. Ответы ground-control кэшируются (см. route_cache).
+    """
+    return await route_cache.get_or_fetch(_from, _to, vehicle_type, _fetch_route_async)
+
+
+async def _fetch_route_async(_from: str, _to: str, vehicle_type: str):
     """
     POST /route
     """
-    async with httpx.AsyncClient() as client:
-        json_data = {
-            "from": _from,
-            "to": _to,
-            "type": "bus" 
-        }
-        try:
-            resp = await client.post(ROUTE_URL, json=json_data)
-            if resp.status_code == 200:
-                return resp.json()  # ожидаем list[str]
-            elif resp.status_code == 404:
-                logging.warning("[get_route_async] Маршрут не найден.")
-            else:
-                logging.warning(f"[get_route_async] Ошибка {resp.status_code}: {resp.text}")
-        except Exception as e:
-            logging.error(f"[get_route_async] Exception: {e}")
+    json_data = {
+        "from": _from,
+        "to": _to,
+        "type": vehicle_type
+    }
+    try:
+        resp = await http_client.post("route", ROUTE_URL, json=json_data)
+        if resp.status_code == 200:
+            return resp.json()  # ожидаем list[str]
+        elif resp.status_code == 404:
+            logging.warning("[get_route_async] Маршрут не найден.")
+        else:
+            logging.warning(f"[get_route_async] Ошибка {resp.status_code}: {resp.text}")
+    except RetryBudgetExceeded:
+        raise
+    except Exception as e:
+        logging.error(f"[get_route_async] Exception: {e}")
     return None
 
 
@@ -62,54 +74,45 @@ async def get_permission_async(vehicle_id: str, vehicle_type: str, _from: str, _
     """
     POST /move
     Возвращает дистанцию (float), которую нужно проехать.
+    На 409 (узел занят) запрос повторяется по политике повторов;
+    если бюджет исчерпан – RetryBudgetExceeded.
     """
-    async with httpx.AsyncClient() as client:
-        json_data = {
-            "vehicleId": vehicle_id,
-            "vehicleType": vehicle_type,
-            "from": _from,
-            "to": _to
-        }
-        try:
-            resp = await client.post(MOVE_URL, json=json_data)
-            if resp.status_code == 200:
-                move_resp = MoveResponse(**resp.json())
-                return move_resp.distance
-            elif resp.status_code == 400:
-                logging.warning(f"[get_permission_async] 400: Неверный запрос. {resp.text}")
-            elif resp.status_code == 403:
-                logging.warning("[get_permission_async] 403: Перемещение запрещено.")
-            elif resp.status_code == 404:
-                logging.warning("[get_permission_async] 404: Один из узлов не найден.")
-            elif resp.status_code == 409:
-                logging.warning(f"[get_permission_async] 409: Узел {_to} занят. Повторим позже.")
-                # Ждём секунду и пробуем снова
-                await asyncio.sleep(1)
-                return await get_permission_async(vehicle_id, vehicle_type, _from, _to)
-            else:
-                logging.warning(f"[get_permission_async] Ошибка {resp.status_code}: {resp.text}")
-        except Exception as e:
-            logging.error(f"[get_permission_async] Exception: {e}")
+    json_data = {
+        "vehicleId": vehicle_id,
+        "vehicleType": vehicle_type,
+        "from": _from,
+        "to": _to
+    }
+    try:
+        resp = await http_client.post("move", MOVE_URL, json=json_data)
+        if resp.status_code == 200:
+            move_resp = MoveResponse(**resp.json())
+            return move_resp.distance
+        elif resp.status_code == 400:
+            logging.warning(f"[get_permission_async] 400: Неверный запрос. {resp.text}")
+        elif resp.status_code == 403:
+            logging.warning("[get_permission_async] 403: Перемещение запрещено.")
+        elif resp.status_code == 404:
+            logging.warning("[get_permission_async] 404: Один из узлов не найден.")
+        else:
+            logging.warning(f"[get_permission_async] Ошибка {resp.status_code}: {resp.text}")
+    except RetryBudgetExceeded:
+        raise
+    except Exception as e:
+        logging.error(f"[get_permission_async] Exception: {e}")
     return None
 
 
-async def inform_about_arrival_async(vehicle_id: str, vehicle_type: str, node_id: str):
+async def inform_about_arrival_async(vehicle_id: str, vehicle_type: str, node_id: str) -> asyncio.Future:
     """
-    POST /arrived
+    POST /arrived – через очередь исходящих уведомлений (services/outbox.py),
+    по порядку для каждой машины. Возвращает future, завершающийся после
+    ответа ground-control.
     """
-    async with httpx.AsyncClient() as client:
-        json_data = {
-            "vehicleId": vehicle_id,
-            "vehicleType": vehicle_type,
-            "nodeId": node_id
-        }
-        try:
-            resp = await client.post(ARRIVED_URL, json=json_data)
-            if resp.status_code == 200:
-                logging.info(f"[inform_about_arrival_async] Машина {vehicle_id} прибыла в узел {node_id}")
-            elif resp.status_code == 400:
-                logging.warning("[inform_about_arrival_async] 400: Неверный запрос о прибытии.")
-            else:
-                logging.warning(f"[inform_about_arrival_async] Ошибка {resp.status_code}: {resp.text}")
-        except Exception as e:
-            logging.error(f"[inform_about_arrival_async] Exception: {e}")
+    json_data = {
+        "vehicleId": vehicle_id,
+        "vehicleType": vehicle_type,
+        "nodeId": node_id
+    }
+    return await outbox.send("arrived", ARRIVED_URL, json_data, key=f"vehicle/{vehicle_id}",
+                             max_retry_time=config.OUTBOX_ARRIVED_MAX_RETRY_SEC)
@@ -0,0 +1,117 @@
+# app/services/http_client.py
+#
+# Общий HTTP-клиент на всё время жизни приложения.
+# Создаётся при старте FastAPI (main.create_app), закрывается при остановке.
+# Все запросы к ground-control и оркестратору идут через post()
+# (таймауты и повторы – см. services/retry.py, предохранители –
+# services/circuit_breaker.py).
+
+import time
+import logging
+from typing import Optional
+
+import httpx
+
+import config
+from services.retry import send_with_retry
+from services.circuit_breaker import breaker_for
+from services.metrics import UPSTREAM_LATENCY_SECONDS, UPSTREAM_ERRORS, upstream_of
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _build_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=config.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=config.HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(config.HTTP_DEFAULT_TIMEOUT, connect=config.HTTP_CONNECT_TIMEOUT)
+    return httpx.AsyncClient(http2=config.HTTP2_ENABLED, limits=limits, timeout=timeout,
+                             transport=transport)
+
+
+async def start_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    """
+    Создаёт общий клиент (вызывается при старте приложения).
+    transport – свой транспорт httpx, например ASGITransport симулятора
+    для прогона в одном процессе (simulator/loadgen.py).
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client(transport)
+        logger.info("HTTP-клиент создан (http2=%s, max_connections=%d)",
+                    config.HTTP2_ENABLED, config.HTTP_MAX_CONNECTIONS)
+    return _client
+
+
+async def close_client():
+    """
+    Закрывает общий клиент (вызывается при остановке приложения).
+    """
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        logger.info("HTTP-клиент закрыт")
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Возвращает общий клиент. Если приложение ещё не стартовало
+    (например, функции вызваны из скрипта), клиент создаётся лениво.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+def endpoint_timeout(endpoint: str) -> httpx.Timeout:
+    seconds = config.ENDPOINT_TIMEOUTS.get(endpoint, config.HTTP_DEFAULT_TIMEOUT)
+    return httpx.Timeout(seconds, connect=min(seconds, config.HTTP_CONNECT_TIMEOUT))
+
+
+async def post(endpoint: str, url: str, **kwargs) -> httpx.Response:
+    """
+    POST через общий клиент с таймаутом и политикой повторов,
+    настроенными для данного эндпоинта.
+    endpoint – логическое имя ("route", "move", "orchestrator", ...).
+    Если бюджет повторов исчерпан – RetryBudgetExceeded, если сервис
+    недоступен (предохранитель открыт) – CircuitOpenError, её подкласс.
+    """
+    kwargs.setdefault("timeout", endpoint_timeout(endpoint))
+    upstream = upstream_of(endpoint)
+    latency = UPSTREAM_LATENCY_SECONDS.labels(upstream=upstream, endpoint=endpoint)
+    breaker = breaker_for(endpoint)
+
+    async def send() -> httpx.Response:
+        # Каждая попытка спрашивает предохранитель: если он открылся во
+        # время повторов, оставшиеся попытки не отправляются
+        token = await breaker.acquire(endpoint) if breaker is not None else None
+        started = time.perf_counter()
+        try:
+            resp = await get_client().post(url, **kwargs)
+        except httpx.TransportError as e:
+            UPSTREAM_ERRORS.labels(upstream=upstream, endpoint=endpoint, reason=type(e).__name__).inc()
+            if token is not None:
+                breaker.record_failure(token)
+            raise
+        except BaseException:
+            if token is not None:
+                breaker.release(token)
+            raise
+        finally:
+            latency.observe(time.perf_counter() - started)
+        if resp.status_code >= 400:
+            UPSTREAM_ERRORS.labels(upstream=upstream, endpoint=endpoint, reason=str(resp.status_code)).inc()
+        if token is not None:
+            if resp.status_code >= 500:
+                breaker.record_failure(token)
+            else:
+                breaker.record_success(token)
+        return resp
+
+    return await send_with_retry(endpoint, send)
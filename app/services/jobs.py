@@ -0,0 +1,221 @@
+# app/services/jobs.py
+#
+# Учёт запросов (jobs). /load, /upload и /batch возвращают job_id, по нему
+# /jobs/{id} показывает каждую поездку запроса: этап, машину, узел и оценку
+# сроков. Этапы поездок приходят из контрольных точек журнала поездок
+# (trip_journal.subscribe), поэтому учёт работает и при выключенном
+# журнале. Изменения публикуются в шину событий (services/events):
+# "trip" – этап поездки, "job" – статус запроса.
+#
+# Активные запросы ограничены очередью диспетчера, завершённые хранятся
+# последние JOBS_MAX_FINISHED.
+
+from collections import deque
+from typing import Deque, Dict, Optional
+
+import config
+from services import clock
+from services.events import event_bus, EventBus
+from services.fleet import fleet, FleetRegistry
+from services.trip_journal import trip_journal, TripJournal, TripStage
+from services.eta import eta, Estimate, EtaEstimator
+
+
+class JobStatus:
+    QUEUED = "queued"            # все поездки ждут машин
+    IN_PROGRESS = "in_progress"  # хотя бы одна машина выехала
+    DONE = "done"                # все поездки завершены
+
+
+class TripProgress:
+    __slots__ = ("trip_id", "aircraft_id", "is_boarding", "passenger_count", "stage",
+                 "vehicle_id", "plane_node", "node", "heading_to", "boarding_started_at",
+                 "boarding_finished_at", "outcome", "updated_at")
+
+    # Поля контрольных точек, которые переносятся как есть
+    _FIELDS = ("aircraft_id", "is_boarding", "passenger_count", "vehicle_id", "plane_node",
+               "node", "heading_to", "boarding_started_at", "outcome")
+
+    def __init__(self, trip_id: str):
+        self.trip_id = trip_id
+        self.aircraft_id = None
+        self.is_boarding = True
+        self.passenger_count = 0
+        self.stage = TripStage.QUEUED
+        self.vehicle_id = None
+        self.plane_node = None
+        self.node = None
+        self.heading_to = None
+        self.boarding_started_at = None
+        self.boarding_finished_at = None
+        self.outcome = None
+        self.updated_at = clock.time()
+
+    def apply(self, stage: TripStage, fields: dict):
+        if stage == TripStage.QUEUED:
+            # Возврат в очередь: машина и этапы прошлой попытки не в счёт
+            for name in ("vehicle_id", "plane_node", "node", "heading_to",
+                         "boarding_started_at", "outcome"):
+                setattr(self, name, None)
+        if self.stage == TripStage.BOARDING and stage != TripStage.BOARDING:
+            self.boarding_finished_at = clock.time()
+        for name in self._FIELDS:
+            if name in fields:
+                setattr(self, name, fields[name])
+        if stage == TripStage.DONE and self.outcome is None:
+            self.outcome = "completed"
+        self.stage = stage
+        self.updated_at = clock.time()
+
+    def as_event(self, job_id: str) -> dict:
+        return {
+            "job_id": job_id,
+            "trip_id": self.trip_id,
+            "aircraft_id": self.aircraft_id,
+            "stage": self.stage.value,
+            "vehicle_id": self.vehicle_id,
+            "node": self.node,
+            "heading_to": self.heading_to,
+            "outcome": self.outcome,
+        }
+
+
+class Job:
+    __slots__ = ("job_id", "created_at", "finished_at", "status", "trips")
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.created_at = clock.time()
+        self.finished_at: Optional[float] = None
+        self.status = JobStatus.QUEUED
+        self.trips: Dict[str, TripProgress] = {}
+
+    def refresh_status(self) -> bool:
+        """
+        Пересчитывает статус. Возвращает True, если он изменился.
+        """
+        stages = [trip.stage for trip in self.trips.values()]
+        if stages and all(stage == TripStage.DONE for stage in stages):
+            status = JobStatus.DONE
+        elif any(stage != TripStage.QUEUED for stage in stages):
+            status = JobStatus.IN_PROGRESS
+        else:
+            status = JobStatus.QUEUED
+        if status == self.status:
+            return False
+        self.status = status
+        if status == JobStatus.DONE:
+            self.finished_at = clock.time()
+        return True
+
+    def as_event(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "trips": len(self.trips),
+            "done": sum(trip.stage == TripStage.DONE for trip in self.trips.values()),
+        }
+
+
+class JobRegistry:
+    def __init__(self, journal: TripJournal, bus: EventBus, fleet_registry: FleetRegistry,
+                 estimator: EtaEstimator, max_finished: int):
+        self.bus = bus
+        self.fleet = fleet_registry
+        self.estimator = estimator
+        self._jobs: Dict[str, Job] = {}
+        self._trip_jobs: Dict[str, str] = {}         # { trip_id: job_id } активных поездок
+        self._finished: Deque[str] = deque()
+        self.max_finished = max_finished
+        journal.subscribe(self.on_checkpoint)
+
+    def on_checkpoint(self, trip_id: str, stage: TripStage, fields: dict):
+        job_id = fields.get("job_id") or self._trip_jobs.get(trip_id)
+        if job_id is None:
+            return
+        job = self._jobs.get(job_id)
+        if job is None:
+            if stage != TripStage.QUEUED and "aircraft_id" not in fields:
+                # Запрос уже забыт (завершённые вытесняются)
+                return
+            job = self._jobs[job_id] = Job(job_id)
+        created = not job.trips
+        trip = job.trips.get(trip_id)
+        if trip is None:
+            trip = job.trips[trip_id] = TripProgress(trip_id)
+            self._trip_jobs[trip_id] = job_id
+        trip.apply(stage, fields)
+        if stage == TripStage.DONE:
+            self._trip_jobs.pop(trip_id, None)
+        self.bus.publish("trip", trip.as_event(job_id))
+        if job.refresh_status() or created:
+            self.bus.publish("job", job.as_event())
+            if job.status == JobStatus.DONE:
+                self._remember_finished(job_id)
+
+    def restore(self, state: dict):
+        """
+        Поездка из журнала после перезапуска (state – последнее состояние).
+        """
+        self.on_checkpoint(state["trip_id"], TripStage(state["stage"]), state)
+
+    def _remember_finished(self, job_id: str):
+        self._finished.append(job_id)
+        while len(self._finished) > self.max_finished:
+            self._jobs.pop(self._finished.popleft(), None)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def view(self, job_id: str, queued: Dict[str, Estimate]) -> Optional[dict]:
+        """
+        Состояние запроса с оценками сроков. queued – оценки диспетчера
+        для поездок в очереди ({ trip_id: Estimate }).
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        trips = []
+        for trip in job.trips.values():
+            arrival = finish = None
+            if trip.stage == TripStage.QUEUED:
+                estimate = queued.get(trip.trip_id)
+                if estimate is not None:
+                    arrival, finish = estimate.start, estimate.finish
+            elif trip.boarding_finished_at is not None:
+                arrival, finish = trip.boarding_started_at, trip.boarding_finished_at
+            elif trip.stage != TripStage.DONE:
+                vehicle = self.fleet.get(trip.vehicle_id) if trip.vehicle_id else None
+                node = trip.heading_to or trip.node or (vehicle.current_node if vehicle else None)
+                arrival, finish = self.estimator.progress(node, trip.plane_node, trip.passenger_count,
+                                                          trip.boarding_started_at)
+            trips.append({
+                "trip_id": trip.trip_id,
+                "aircraft_id": trip.aircraft_id,
+                "operation": "boarding" if trip.is_boarding else "unboarding",
+                "passenger_count": trip.passenger_count,
+                "stage": trip.stage.value,
+                "vehicle_id": trip.vehicle_id,
+                "node": trip.node,
+                "heading_to": trip.heading_to,
+                "outcome": trip.outcome,
+                "estimated_arrival": arrival,
+                "estimated_finish": finish,
+            })
+        return {
+            "job_id": job.job_id,
+            "status": job.status,
+            "created_at": job.created_at,
+            "finished_at": job.finished_at,
+            "trips": trips,
+        }
+
+    def stats(self) -> dict:
+        return {
+            "jobs": len(self._jobs),
+            "active_trips": len(self._trip_jobs),
+            "finished_kept": len(self._finished),
+        }
+
+
+job_registry = JobRegistry(trip_journal, event_bus, fleet, eta, max_finished=config.JOBS_MAX_FINISHED)
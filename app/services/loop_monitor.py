@@ -0,0 +1,159 @@
+# app/services/loop_monitor.py
+#
+# Слежение за циклом событий:
+#   * отметка раз в LOOP_MONITOR_INTERVAL секунд (loop.call_later) – насколько
+#     она опоздала, настолько цикл был занят другими обратными вызовами
+#     (метрика transporter_event_loop_lag_seconds);
+#   * сторожевой поток: если очередная отметка опаздывает больше чем на
+#     LOOP_SLOW_CALLBACK_SEC, цикл занят одним вызовом (синхронный файл,
+#     threading.Lock, тяжёлый расчёт) – поток снимает стек цикла прямо
+#     во время блокировки. Когда цикл освободится, случай с этим стеком
+#     попадает в /admin/loop и в лог.
+# Накладные расходы – один обратный вызов на интервал в цикле и одно
+# пробуждение потока на полпорога; asyncio debug mode не нужен, поэтому
+# монитор можно держать включённым в продакшене (и с uvloop).
+#
+# На виртуальных часах (services/clock.VirtualClock) не запускается:
+# задержка в виртуальном времени смысла не имеет.
+
+import sys
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+import config
+from services import clock
+from services.metrics import EVENT_LOOP_LAG_SECONDS, EVENT_LOOP_STALLS
+from services.profiler import frame_stack
+
+logger = logging.getLogger(__name__)
+
+
+class Stall:
+    __slots__ = ("at", "lag", "stack")
+
+    def __init__(self, at: float, lag: float, stack: Optional[List[str]]):
+        self.at = at
+        self.lag = lag
+        self.stack = stack   # от корня к месту блокировки; None – не успели снять
+
+    def as_dict(self) -> dict:
+        return {"at": self.at, "lag_sec": round(self.lag, 4), "stack": self.stack}
+
+
+class LoopMonitor:
+    def __init__(self, enabled: bool, interval: float, threshold: float, kept: int):
+        self.enabled = enabled
+        self.interval = max(0.001, interval)
+        self.threshold = max(0.001, threshold)
+        self._stalls: Deque[Stall] = deque(maxlen=max(1, kept))
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._loop_thread: Optional[int] = None
+        # Когда ждём следующую отметку (time.perf_counter); читает и сторожевой поток
+        self._due = 0.0
+        # (_due, стек) – стек, снятый сторожевым потоком для этой отметки
+        self._captured: Optional[Tuple[float, List[str]]] = None
+        # Метрики
+        self.ticks = 0
+        self.stalls = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self._total_lag = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._handle is not None
+
+    def start(self):
+        if not self.enabled or self.running:
+            return
+        if isinstance(clock.get_clock(), clock.VirtualClock):
+            logger.info("Монитор цикла событий не запускается на виртуальных часах")
+            return
+        self._loop_thread = threading.get_ident()
+        self._stopped.clear()
+        self._schedule(time.perf_counter())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if self._watchdog is not None:
+            self._stopped.set()
+            self._watchdog.join()
+            self._watchdog = None
+
+    def _schedule(self, now: float):
+        self._due = now + self.interval
+        self._handle = asyncio.get_running_loop().call_later(self.interval, self._tick)
+
+    def _tick(self):
+        now = time.perf_counter()
+        lag = max(0.0, now - self._due)
+        EVENT_LOOP_LAG_SECONDS.observe(lag)
+        self.ticks += 1
+        self.last_lag = lag
+        self._total_lag += lag
+        self.max_lag = max(self.max_lag, lag)
+        if lag >= self.threshold:
+            self._record(lag)
+        self._schedule(now)
+
+    def _record(self, lag: float):
+        captured = self._captured
+        stack = captured[1] if captured is not None and captured[0] == self._due else None
+        self._stalls.append(Stall(time.time(), lag, stack))
+        self.stalls += 1
+        EVENT_LOOP_STALLS.inc()
+        where = " <- ".join(reversed(stack[-3:])) if stack else "стек не снят"
+        logger.warning("Цикл событий был занят %.3f сек: %s", lag, where)
+
+    def _watch(self):
+        """
+        Сторожевой поток: снимает стек цикла, пока тот заблокирован.
+        """
+        while not self._stopped.wait(self.threshold / 2):
+            due = self._due
+            if time.perf_counter() - due < self.threshold:
+                continue
+            captured = self._captured
+            if captured is not None and captured[0] == due:
+                continue   # эту блокировку уже сняли
+            frame = sys._current_frames().get(self._loop_thread)
+            self._captured = (due, frame_stack(frame, lines=True))
+            frame = None
+
+    # --- просмотр ---
+
+    def recent_stalls(self) -> List[dict]:
+        """
+        Последние случаи блокировки цикла, новые первыми.
+        """
+        return [stall.as_dict() for stall in reversed(self._stalls)]
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "interval_sec": self.interval,
+            "slow_callback_sec": self.threshold,
+            "ticks": self.ticks,
+            "stalls": self.stalls,
+            "last_lag_sec": round(self.last_lag, 4),
+            "avg_lag_sec": round(self._total_lag / self.ticks, 4) if self.ticks else 0.0,
+            "max_lag_sec": round(self.max_lag, 4),
+        }
+
+
+loop_monitor = LoopMonitor(
+    enabled=config.LOOP_MONITOR_ENABLED,
+    interval=config.LOOP_MONITOR_INTERVAL,
+    threshold=config.LOOP_SLOW_CALLBACK_SEC,
+    kept=config.LOOP_STALLS_KEPT,
+)
@@ -0,0 +1,166 @@
+# app/services/metrics.py
+#
+# Метрики Prometheus. На горячем пути – только observe()/inc() у заранее
+# привязанных к меткам объектов; состояние парка, очереди, кэша маршрутов,
+# счётчики повторов, предохранители и очередь исходящих уведомлений
+# читаются коллектором в момент запроса /metrics.
+
+from prometheus_client import Counter, Histogram, REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# --------------------------------------
+# Этапы поездки
+# --------------------------------------
+
+TRIP_STAGE_SECONDS = Histogram(
+    "transporter_trip_stage_seconds",
+    "Длительность этапов поездки",
+    ["stage"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+
+STAGE_ACQUISITION = TRIP_STAGE_SECONDS.labels(stage="acquisition")          # ожидание машины в очереди
+STAGE_REGISTRATION = TRIP_STAGE_SECONDS.labels(stage="registration")        # регистрация новой машины
+STAGE_ROUTE_FETCH = TRIP_STAGE_SECONDS.labels(stage="route_fetch")          # получение маршрута
+STAGE_PERMISSION_WAIT = TRIP_STAGE_SECONDS.labels(stage="permission_wait")  # ожидание /move на сегмент
+STAGE_DRIVING = TRIP_STAGE_SECONDS.labels(stage="driving")                  # проезд сегмента
+STAGE_BOARDING = TRIP_STAGE_SECONDS.labels(stage="boarding")                # посадка/высадка у самолёта
+STAGE_RETURN = TRIP_STAGE_SECONDS.labels(stage="return")                    # возврат в гараж
+
+TRIPS_TOTAL = Counter(
+    "transporter_trips_total",
+    "Завершённые поездки по результату",
+    ["result"],
+)
+
+# --------------------------------------
+# Запросы к ground-control и оркестратору
+# --------------------------------------
+
+UPSTREAM_LATENCY_SECONDS = Histogram(
+    "transporter_upstream_request_seconds",
+    "Время одного HTTP-запроса к внешнему сервису (каждая попытка отдельно)",
+    ["upstream", "endpoint"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+UPSTREAM_ERRORS = Counter(
+    "transporter_upstream_errors_total",
+    "Ошибки запросов к внешнему сервису",
+    ["upstream", "endpoint", "reason"],
+)
+
+
+def upstream_of(endpoint: str) -> str:
+    return "orchestrator" if endpoint == "orchestrator" else "ground_control"
+
+
+# --------------------------------------
+# Цикл событий (services/loop_monitor.py)
+# --------------------------------------
+
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "transporter_event_loop_lag_seconds",
+    "Задержка отметки цикла событий относительно расписания",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+EVENT_LOOP_STALLS = Counter(
+    "transporter_event_loop_stalls_total",
+    "Случаи, когда цикл событий был занят дольше LOOP_SLOW_CALLBACK_SEC",
+)
+
+
+# --------------------------------------
+# Состояние сервиса (читается при сборе метрик)
+# --------------------------------------
+
+class StateCollector:
+    def __init__(self, fleet, aircraft_registry, dispatcher, route_cache, retry_stats, breakers, outbox):
+        self.fleet = fleet
+        self.aircraft_registry = aircraft_registry
+        self.dispatcher = dispatcher
+        self.route_cache = route_cache
+        self.retry_stats = retry_stats
+        self.breakers = breakers
+        self.outbox = outbox
+
+    def collect(self):
+        free = self.fleet.free_count()
+        vehicles = GaugeMetricFamily("transporter_vehicles", "Машины парка по состоянию", labels=["state"])
+        vehicles.add_metric(["free"], free)
+        vehicles.add_metric(["busy"], self.fleet.size() - free)
+        yield vehicles
+        yield GaugeMetricFamily("transporter_fleet_max_size", "Лимит парка", value=self.fleet.max_size)
+        yield GaugeMetricFamily("transporter_aircraft_in_service", "Самолёты, которые сейчас обслуживаются",
+                                value=self.aircraft_registry.count())
+
+        stats = self.dispatcher.stats()
+        yield GaugeMetricFamily("transporter_queue_depth", "Поездки в очереди", value=stats["queue_depth"])
+        yield GaugeMetricFamily("transporter_queue_oldest_wait_seconds", "Ожидание самой старой поездки в очереди",
+                                value=stats["oldest_wait_sec"])
+        yield GaugeMetricFamily("transporter_active_trips", "Выполняемые поездки", value=stats["active_trips"])
+        for name in ("submitted", "dispatched", "rejected", "requeued", "recovered"):
+            yield CounterMetricFamily(f"transporter_queue_{name}", f"Поездки: {name}", value=stats[name])
+
+        cache = self.route_cache.stats()
+        lookups = CounterMetricFamily("transporter_route_cache_lookups", "Обращения к кэшу маршрутов",
+                                      labels=["result"])
+        for result in ("hits", "reverse_hits", "misses", "coalesced"):
+            lookups.add_metric([result], cache[result])
+        yield lookups
+        yield GaugeMetricFamily("transporter_route_cache_size", "Записей в кэше маршрутов", value=cache["size"])
+
+        retries = CounterMetricFamily("transporter_upstream_retries", "Повторы запросов", labels=["endpoint"])
+        backoff = CounterMetricFamily("transporter_upstream_backoff_seconds", "Время ожидания между повторами",
+                                      labels=["endpoint"])
+        exhausted = CounterMetricFamily("transporter_upstream_retry_budget_exhausted",
+                                        "Исчерпанные бюджеты повторов", labels=["endpoint"])
+        for endpoint, s in list(self.retry_stats.items()):
+            retries.add_metric([endpoint], s.retries)
+            backoff.add_metric([endpoint], s.backoff_seconds)
+            exhausted.add_metric([endpoint], s.exhausted)
+        yield retries
+        yield backoff
+        yield exhausted
+
+        state = GaugeMetricFamily("transporter_upstream_breaker_state",
+                                  "Состояние предохранителя (1 – текущее)", labels=["upstream", "state"])
+        opened = CounterMetricFamily("transporter_upstream_breaker_opened", "Сколько раз открывался предохранитель",
+                                     labels=["upstream"])
+        rejected = CounterMetricFamily("transporter_upstream_breaker_rejected",
+                                       "Запросы, отклонённые открытым предохранителем", labels=["upstream"])
+        for upstream, breaker in self.breakers.items():
+            current = breaker.state.value
+            for name in ("closed", "open", "half_open"):
+                state.add_metric([upstream, name], 1 if name == current else 0)
+            opened.add_metric([upstream], breaker.opened)
+            rejected.add_metric([upstream], breaker.rejected)
+        yield state
+        yield opened
+        yield rejected
+
+        outbox = self.outbox.stats()
+        yield GaugeMetricFamily("transporter_outbox_depth", "Уведомления, ждущие отправки", value=outbox["depth"])
+        yield GaugeMetricFamily("transporter_outbox_lag_seconds", "Ожидание самого старого неотправленного уведомления",
+                                value=outbox["lag_sec"])
+        notifications = CounterMetricFamily("transporter_outbox_notifications", "Исходящие уведомления по итогу",
+                                            labels=["result"])
+        for result in ("delivered", "retried", "dropped"):
+            notifications.add_metric([result], outbox[result])
+        yield notifications
+
+
+_state_collector = None
+
+
+def install_state_collector(fleet, aircraft_registry, dispatcher, route_cache, retry_stats, breakers, outbox):
+    """
+    Регистрирует коллектор состояния (однократно, вызывается из main.create_app).
+    """
+    global _state_collector
+    if _state_collector is not None:
+        return
+    _state_collector = StateCollector(fleet, aircraft_registry, dispatcher, route_cache, retry_stats, breakers,
+                                      outbox)
+    REGISTRY.register(_state_collector)
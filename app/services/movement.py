@@ -0,0 +1,106 @@
+# app/services/movement.py
+#
+# Движение машины по маршруту. Время в пути считается без округления,
+# разрешение на следующий сегмент (/move) запрашивается, пока машина
+# едет по текущему, а /arrived уходит через очередь исходящих уведомлений
+# параллельно со следующим /move.
+
+import time
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional
+
+import config
+from services import clock
+from services.fleet import fleet, Vehicle
+from services.ground_control import get_permission_async, inform_about_arrival_async
+from services.metrics import STAGE_PERMISSION_WAIT, STAGE_DRIVING
+from services.planner import planner
+
+SPEED_CAR = 25  # м/с движение
+
+logger = logging.getLogger(__name__)
+
+# Последнее неподтверждённое /arrived по каждой машине. Порядок /arrived
+# одной машины соблюдает очередь исходящих (services/outbox.py), а первый
+# /move следующего маршрута ждёт доставки последнего /arrived – не дольше
+# OUTBOX_ARRIVED_MAX_RETRY_SEC, после чего outbox от него отказывается.
+_pending_arrivals: Dict[str, asyncio.Future] = {}
+
+
+async def notify_arrival(vehicle: Vehicle, node_id: str):
+    """
+    Ставит /arrived в очередь и сразу возвращается.
+    """
+    delivered = await inform_about_arrival_async(vehicle.vehicle_id, vehicle.vehicle_type, node_id)
+    _pending_arrivals[vehicle.vehicle_id] = delivered
+
+    def _cleanup(f: asyncio.Future):
+        if _pending_arrivals.get(vehicle.vehicle_id) is f:
+            del _pending_arrivals[vehicle.vehicle_id]
+    delivered.add_done_callback(_cleanup)
+
+
+def _request_move(vehicle: Vehicle, _from: str, _to: str) -> asyncio.Task:
+    return asyncio.create_task(
+        get_permission_async(vehicle.vehicle_id, vehicle.vehicle_type, _from, _to)
+    )
+
+
+async def drive_route(vehicle: Vehicle, route: List[str],
+                      on_segment: Optional[Callable[[str, str], None]] = None) -> bool:
+    """
+    Проезжает маршрут. Возвращает True, если машина доехала до конца,
+    и False, если ground-control не дал разрешение на один из сегментов.
+    on_segment(from, to) вызывается, когда разрешение на сегмент получено
+    и машина трогается (контрольная точка поездки).
+    """
+    vehicle_id = vehicle.vehicle_id
+    if len(route) < 2:
+        return True
+
+    # Прошлое /arrived должно дойти раньше первого /move этого маршрута
+    previous = _pending_arrivals.get(vehicle_id)
+    if previous is not None:
+        await asyncio.gather(previous, return_exceptions=True)
+
+    move_task: Optional[asyncio.Task] = _request_move(vehicle, route[0], route[1])
+    next_move: Optional[asyncio.Task] = None
+    try:
+        for i in range(len(route) - 1):
+            waited_from = time.perf_counter()
+            dist = await move_task
+            if dist is None and i > 0 and config.MOVEMENT_PREFETCH:
+                # Разрешение, запрошенное заранее, не получено – повторяем из узла
+                dist = await get_permission_async(vehicle_id, vehicle.vehicle_type, route[i], route[i + 1])
+            STAGE_PERMISSION_WAIT.observe(time.perf_counter() - waited_from)
+            if dist is None:
+                logger.warning("[%s] Нет разрешения на %s -> %s", vehicle_id, route[i], route[i + 1])
+                return False
+
+            has_next = i + 2 < len(route)
+            if has_next and config.MOVEMENT_PREFETCH:
+                next_move = _request_move(vehicle, route[i + 1], route[i + 2])
+
+            planner.matrix.observe_segment(route[i], route[i + 1], dist)
+            if on_segment is not None:
+                on_segment(route[i], route[i + 1])
+            logger.info("[%s] Едет %s -> %s (%.2f м)", vehicle_id, route[i], route[i + 1], dist)
+            travel_time = dist / SPEED_CAR
+            await clock.sleep(travel_time)
+            STAGE_DRIVING.observe(travel_time)
+
+            await notify_arrival(vehicle, route[i + 1])
+            await fleet.set_position(vehicle, route[i + 1])
+
+            if has_next and next_move is None:
+                next_move = _request_move(vehicle, route[i + 1], route[i + 2])
+            move_task, next_move = next_move, None
+    finally:
+        # Машина дальше не едет (ошибка, отмена) – запрошенное заранее
+        # разрешение не должно занять сегмент в ground-control
+        for task in (move_task, next_move):
+            if task is not None and not task.done():
+                task.cancel()
+
+    return True
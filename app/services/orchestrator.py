@@ -1,10 +1,20 @@
-import httpx
 import logging
 
-ORCHESTRATOR_URL = "https://orchestrator.reaport.ru"  # общий хост
+import config
+from services.outbox import outbox
+
+ORCHESTRATOR_URL = config.ORCHESTRATOR_URL  # общий хост (TRANSPORTER_ORCHESTRATOR_URL)
 
 logger = logging.getLogger(__name__)
 
+# Уведомления ставятся в очередь исходящих (services/outbox.py) и уходят
+# в фоне; start и finish одного самолёта – строго по порядку.
+
+
+def _key(aircraft_id: str) -> str:
+    return f"aircraft/{aircraft_id}"
+
+
 async def start_unboarding(aircraft_id: str):
     """
     POST /boarding/unboarding/start
@@ -12,15 +22,8 @@ async def start_unboarding(aircraft_id: str):
     """
     url = f"{ORCHESTRATOR_URL}/boarding/unboarding/start"
     data = {"aircraft_id": aircraft_id}
-    async with httpx.AsyncClient() as client:
-        try:
-            resp = await client.post(url, json=data)
-            if resp.status_code == 204:
-                logger.info("[start_unboarding] Успешно отправили старт")
-            else:
-                logger.warning(f"[start_unboarding] Ошибка {resp.status_code}: {resp.text}")
-        except Exception as e:
-            logger.error(f"[start_unboarding] Exception: {e}")
+    await outbox.send("orchestrator", url, data, key=_key(aircraft_id))
+    logger.info("[start_unboarding] Старт поставлен в очередь (aircraft=%s)", aircraft_id)
 
 async def finish_unboarding(aircraft_id: str, passengers_count: int):
     """
@@ -32,15 +35,8 @@ async def finish_unboarding(aircraft_id: str, passengers_count: int):
         "aircraft_id": aircraft_id,
         "passengers_count": passengers_count
     }
-    async with httpx.AsyncClient() as client:
-        try:
-            resp = await client.post(url, json=data)
-            if resp.status_code == 204:
-                logger.info("[finish_unboarding] Успешно отправили финиш")
-            else:
-                logger.warning(f"[finish_unboarding] Ошибка {resp.status_code}: {resp.text}")
-        except Exception as e:
-            logger.error(f"[finish_unboarding] Exception: {e}")
+    await outbox.send("orchestrator", url, data, key=_key(aircraft_id))
+    logger.info("[finish_unboarding] Финиш поставлен в очередь (aircraft=%s)", aircraft_id)
 
 async def start_boarding(aircraft_id: str):
     """
@@ -48,15 +44,8 @@ async def start_boarding(aircraft_id: str):
     """
     url = f"{ORCHESTRATOR_URL}/boarding/boarding/start"
     data = {"aircraft_id": aircraft_id}
-    async with httpx.AsyncClient() as client:
-        try:
-            resp = await client.post(url, json=data)
-            if resp.status_code == 204:
-                logger.info("[start_boarding] Успешно отправили старт")
-            else:
-                logger.warning(f"[start_boarding] Ошибка {resp.status_code}: {resp.text}")
-        except Exception as e:
-            logger.error(f"[start_boarding] Exception: {e}")
+    await outbox.send("orchestrator", url, data, key=_key(aircraft_id))
+    logger.info("[start_boarding] Старт поставлен в очередь (aircraft=%s)", aircraft_id)
 
 async def finish_boarding(aircraft_id: str, passengers_count: int):
     """
@@ -68,12 +57,5 @@ async def finish_boarding(aircraft_id: str, passengers_count: int):
         "aircraft_id": aircraft_id,
         "passengers_count": passengers_count
     }
-    async with httpx.AsyncClient() as client:
-        try:
-            resp = await client.post(url, json=data)
-            if resp.status_code == 204:
-                logger.info("[finish_boarding] Успешно отправили финиш")
-            else:
-                logger.warning(f"[finish_boarding] Ошибка {resp.status_code}: {resp.text}")
-        except Exception as e:
-            logger.error(f"[finish_boarding] Exception: {e}")
+    await outbox.send("orchestrator", url, data, key=_key(aircraft_id))
+    logger.info("[finish_boarding] Финиш поставлен в очередь (aircraft=%s)", aircraft_id)
@@ -0,0 +1,379 @@
+# app/services/outbox.py
+#
+# Исходящие уведомления: /arrived для ground-control и start/finish для
+# оркестратора. Поездка не ждёт ответа – она кладёт уведомление в очередь
+# (send) и едет дальше; очередь разбирают OUTBOX_WORKERS обработчиков
+# через общий HTTP-клиент (services/http_client.post, с его таймаутами,
+# повторами и предохранителями).
+#
+# Порядок: уведомления с одним ключом (машина для /arrived, самолёт для
+# оркестратора) отправляются строго по очереди, разные ключи – параллельно.
+# Временная ошибка (сеть, 5xx, исчерпанный бюджет повторов, открытый
+# предохранитель) – уведомление повторяется через OUTBOX_RETRY_DELAY
+# (с удвоением), не более OUTBOX_MAX_ATTEMPTS раз и, если задано при
+# постановке (max_retry_time), не дольше стольких секунд; ответ 4xx –
+# отброшено. Доставки /arrived ждёт следующий маршрут машины, поэтому его
+# повторы ограничены OUTBOX_ARRIVED_MAX_RETRY_SEC.
+#
+# Неотправленных (в очереди, за уведомлением с тем же ключом и в отправке)
+# не больше OUTBOX_MAX_SIZE: если их столько, send ждёт места.
+# С OUTBOX_PATH уведомления пишутся в файл JSON lines (как журнал поездок)
+# и после перезапуска отправляются заново; файл у каждого воркера свой
+# (services/worker.py, path_for). Запись и сжатие (каждые
+# OUTBOX_COMPACT_EVERY строк) идут в отдельном потоке, по порядку: цикл
+# событий только копит строки и раз в итерацию передаёт их потоку.
+
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict, List, Optional
+
+import config
+from services import clock, http_client
+from services.retry import RetryBudgetExceeded
+from services.circuit_breaker import CircuitOpenError
+from services.worker import worker
+
+logger = logging.getLogger(__name__)
+
+
+class Notification:
+    __slots__ = ("seq", "endpoint", "url", "payload", "key", "created_at", "enqueued_at",
+                 "attempts", "deadline", "delivered")
+
+    def __init__(self, seq: int, endpoint: str, url: str, payload: dict, key: str,
+                 created_at: Optional[float] = None):
+        self.seq = seq
+        self.endpoint = endpoint
+        self.url = url
+        self.payload = payload
+        self.key = key
+        self.created_at = created_at or time.time()
+        self.enqueued_at = clock.monotonic()
+        self.attempts = 0
+        # Не повторять после этого момента (loop.time()); None – без ограничения
+        self.deadline: Optional[float] = None
+        # Ответ получен (или уведомление отброшено); ждут, например, /move
+        self.delivered: Optional[asyncio.Future] = None
+
+    def as_record(self) -> dict:
+        return {"seq": self.seq, "endpoint": self.endpoint, "url": self.url,
+                "payload": self.payload, "key": self.key, "created_at": self.created_at}
+
+
+class Outbox:
+    def __init__(self, max_size: int, workers: int, max_attempts: int, retry_delay: float, path: str,
+                 compact_every: int = 1000):
+        self.max_size = max(1, max_size)
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = retry_delay
+        self.base_path = path
+        self.path = path                             # файл этого воркера (start)
+        self.compact_every = compact_every
+        self._queue: Optional[asyncio.Queue] = None
+        self._drained: Optional[asyncio.Event] = None
+        self._space: Optional[asyncio.Event] = None  # неотправленных стало меньше max_size
+        # { key: уведомления, ждущие отправляемого сейчас с тем же ключом }
+        self._inflight: Dict[str, Deque[Notification]] = {}
+        self._pending: Dict[int, Notification] = {}   # все неотправленные, по seq
+        self._tasks: List[asyncio.Task] = []
+        self._seq = 0
+        self._file = None                            # после start() – только в потоке записи
+        self._records = 0                            # строк в файле (с учётом ещё не записанных)
+        # Запись в файл: один поток, задачи по порядку; строки, ещё не переданные ему
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lines: List[str] = []
+        # Метрики
+        self.enqueued = 0
+        self.delivered = 0
+        self.retried = 0
+        self.dropped = 0
+        self._max_lag = 0.0
+        self._total_lag = 0.0
+
+    @property
+    def persistent(self) -> bool:
+        return bool(self.path)
+
+    # --- жизненный цикл ---
+
+    def start(self):
+        """
+        Запускает обработчики и поднимает неотправленное из файла.
+        Вызывается при старте приложения; send() до start() запускает
+        обработчики сам.
+        """
+        if self._tasks:
+            return
+        self.path = worker.path_for(self.base_path)
+        restored = self._load() if self.persistent else []
+        # Ограничение – на все неотправленные (_pending), а не на очередь
+        self._queue = asyncio.Queue()
+        self._drained = asyncio.Event()
+        self._space = asyncio.Event()
+        for notification in restored:
+            self._pending[notification.seq] = notification
+            self._queue.put_nowait(notification)
+        if not self._pending:
+            self._drained.set()
+        if self.persistent:
+            self._compact(self._snapshot())
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="outbox")
+            if restored:
+                logger.info("Исходящие уведомления из %s: %d к отправке", self.path, len(restored))
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float):
+        """
+        Ждёт отправки очереди не дольше timeout секунд и останавливает
+        обработчики. Неотправленное остаётся в файле (если он задан).
+        """
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._drained.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Не отправлено уведомлений при остановке: %d", len(self._pending))
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._executor is not None:
+            self._flush()
+            self._executor.submit(self._run, self._compact, self._snapshot())
+            self._executor.submit(self._run, self._close)
+            executor, self._executor = self._executor, None
+            await asyncio.to_thread(executor.shutdown)
+        for notification in self._pending.values():
+            if notification.delivered is not None and not notification.delivered.done():
+                notification.delivered.cancel()
+        self._pending.clear()
+        self._inflight.clear()
+        self._queue = None
+        self._drained = None
+        self._space = None
+
+    # --- постановка ---
+
+    async def send(self, endpoint: str, url: str, payload: dict, key: str,
+                   max_retry_time: Optional[float] = None) -> asyncio.Future:
+        """
+        Ставит уведомление в очередь и сразу возвращается (ждёт, только
+        если неотправленных уже max_size). max_retry_time – не повторять
+        дольше стольких секунд с постановки. Возвращает future,
+        завершающийся после ответа (True) или отказа от отправки (False).
+        """
+        if not self._tasks:
+            self.start()
+        while len(self._pending) >= self.max_size:
+            self._space.clear()
+            await self._space.wait()
+        loop = asyncio.get_running_loop()
+        self._seq += 1
+        notification = Notification(self._seq, endpoint, url, payload, key)
+        if max_retry_time is not None:
+            notification.deadline = loop.time() + max_retry_time
+        notification.delivered = loop.create_future()
+        self._pending[notification.seq] = notification
+        self._drained.clear()
+        self._append(notification.as_record())
+        self.enqueued += 1
+        self._queue.put_nowait(notification)
+        return notification.delivered
+
+    # --- отправка ---
+
+    async def _worker(self):
+        while True:
+            notification = await self._queue.get()
+            waiting = self._inflight.get(notification.key)
+            if waiting is not None:
+                # Предыдущее с тем же ключом ещё отправляется – встаём за ним
+                waiting.append(notification)
+                continue
+            waiting = self._inflight[notification.key] = deque()
+            try:
+                while True:
+                    await self._deliver(notification)
+                    if not waiting:
+                        break
+                    notification = waiting.popleft()
+            finally:
+                del self._inflight[notification.key]
+
+    async def _deliver(self, notification: Notification):
+        while True:
+            notification.attempts += 1
+            try:
+                resp = await http_client.post(notification.endpoint, notification.url, json=notification.payload)
+                error = None if resp.status_code < 500 else f"{resp.status_code}"
+                if resp.status_code >= 400:
+                    logger.warning("[outbox] %s %s: ответ %d %s", notification.endpoint, notification.key,
+                                   resp.status_code, resp.text)
+                delay = 0.0
+            except RetryBudgetExceeded as e:
+                error = str(e)
+                # Открытый предохранитель сам говорит, когда пробовать снова
+                delay = e.retry_in if isinstance(e, CircuitOpenError) else 0.0
+            except Exception as e:
+                logger.error("[outbox] %s %s: %s", notification.endpoint, notification.key, e)
+                error = type(e).__name__
+                delay = 0.0
+            if error is None:
+                self._done(notification, delivered=True)
+                return
+            if notification.attempts >= self.max_attempts:
+                logger.error("[outbox] %s %s: не отправлено после %d попыток (%s)",
+                             notification.endpoint, notification.key, notification.attempts, error)
+                self._done(notification, delivered=False)
+                return
+            backoff = max(delay, random.uniform(0.5, 1.0) * self.retry_delay * (2 ** (notification.attempts - 1)))
+            if notification.deadline is not None:
+                left = notification.deadline - asyncio.get_running_loop().time()
+                if left <= 0:
+                    logger.error("[outbox] %s %s: не отправлено за отведённое время, %d попыток (%s)",
+                                 notification.endpoint, notification.key, notification.attempts, error)
+                    self._done(notification, delivered=False)
+                    return
+                backoff = min(backoff, left)
+            self.retried += 1
+            await asyncio.sleep(backoff)
+
+    def _done(self, notification: Notification, delivered: bool):
+        self._pending.pop(notification.seq, None)
+        self._append({"done": notification.seq})
+        lag = clock.monotonic() - notification.enqueued_at
+        if delivered:
+            self.delivered += 1
+            self._total_lag += lag
+            self._max_lag = max(self._max_lag, lag)
+        else:
+            self.dropped += 1
+        if not self._pending:
+            self._drained.set()
+        if len(self._pending) < self.max_size:
+            self._space.set()
+        if notification.delivered is not None and not notification.delivered.done():
+            notification.delivered.set_result(delivered)
+
+    # --- файл ---
+
+    def _load(self) -> List[Notification]:
+        pending: Dict[int, dict] = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        logger.warning("Пропущена повреждённая запись исходящих уведомлений")
+                        continue
+                    if "done" in record:
+                        pending.pop(record["done"], None)
+                    else:
+                        pending[record["seq"]] = record
+        notifications = []
+        for seq, record in sorted(pending.items()):
+            self._seq = max(self._seq, seq)
+            notifications.append(Notification(seq, record["endpoint"], record["url"], record["payload"],
+                                              record["key"], created_at=record.get("created_at")))
+        return notifications
+
+    @staticmethod
+    def _encode(record: dict) -> str:
+        return json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+    def _append(self, record: dict):
+        if self._executor is None:
+            return
+        if not self._lines:
+            # Всё, что накопится за эту итерацию цикла, – одной записью
+            asyncio.get_running_loop().call_soon(self._flush)
+        self._lines.append(self._encode(record))
+        self._records += 1
+        if self._records >= self.compact_every + 2 * len(self._pending):
+            # Строки до снимка – в старый файл (их заменит снимок), после – в новый
+            self._flush()
+            self._executor.submit(self._run, self._compact, self._snapshot())
+            self._records = len(self._pending)
+
+    def _flush(self):
+        if self._lines and self._executor is not None:
+            lines, self._lines = self._lines, []
+            self._executor.submit(self._run, self._write, "".join(lines))
+
+    def _snapshot(self) -> List[dict]:
+        return [n.as_record() for n in sorted(self._pending.values(), key=lambda n: n.seq)]
+
+    # В потоке записи
+
+    def _run(self, operation, *args):
+        try:
+            operation(*args)
+        except Exception as e:
+            logger.error("[outbox] ошибка записи в %s: %s", self.path, e)
+
+    def _write(self, data: str):
+        self._file.write(data)
+        self._file.flush()
+
+    def _compact(self, records: List[dict]):
+        """
+        Перезаписывает файл только с неотправленными (атомарно, os.replace).
+        """
+        self._close()
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(self._encode(record))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    # --- метрики ---
+
+    def depth(self) -> int:
+        return len(self._pending)
+
+    def lag(self) -> float:
+        """
+        Сколько ждёт самое старое неотправленное уведомление (сек).
+        """
+        now = clock.monotonic()
+        return max((now - n.enqueued_at for n in self._pending.values()), default=0.0)
+
+    def stats(self) -> dict:
+        return {
+            "depth": len(self._pending),
+            "max_size": self.max_size,
+            "lag_sec": round(self.lag(), 3),
+            "enqueued": self.enqueued,
+            "delivered": self.delivered,
+            "retried": self.retried,
+            "dropped": self.dropped,
+            "avg_lag_sec": round(self._total_lag / self.delivered, 3) if self.delivered else 0.0,
+            "max_lag_sec": round(self._max_lag, 3),
+            "persistent": self.persistent,
+        }
+
+
+outbox = Outbox(
+    max_size=config.OUTBOX_MAX_SIZE,
+    workers=config.OUTBOX_WORKERS,
+    max_attempts=config.OUTBOX_MAX_ATTEMPTS,
+    retry_delay=config.OUTBOX_RETRY_DELAY,
+    path=config.OUTBOX_PATH,
+    compact_every=config.OUTBOX_COMPACT_EVERY,
+)
@@ -0,0 +1,299 @@
+# app/services/planner.py
+#
+# Планировщик назначений: какая свободная машина едет к какому самолёту.
+# Держит матрицу расстояний «гараж -> место обслуживания», которая
+# заполняется по пройденным маршрутам (длины сегментов берутся из ответов
+# /move), и решает задачу о назначениях «поездки x машины» так, чтобы
+# суммарный холостой пробег машин был минимальным. Решение – O(R² C)
+# (R поездок, C машин), поэтому диспетчер планирует за раз не больше
+# PLANNER_MAX_TRIPS поездок.
+
+import time
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # необязательная зависимость: есть своя реализация
+    linear_sum_assignment = None
+
+logger = logging.getLogger(__name__)
+
+
+def solve_assignment(cost: np.ndarray) -> np.ndarray:
+    """
+    Задача о назначениях: cost – R x C (inf – пара невозможна). Возвращает
+    для каждой строки номер столбца или -1. Назначено как можно больше
+    строк, а среди таких назначений суммарная стоимость минимальна.
+
+    Невозможные пары получают штраф больше любой суммы возможных, так что
+    задача решается на полной матрице: scipy (linear_sum_assignment), если
+    установлен, иначе кратчайшие увеличивающие пути (Jonker–Volgenant в
+    варианте Crouse) с векторизованным по столбцам шагом – O(R² C).
+    """
+    R, C = cost.shape
+    col4row = np.full(R, -1, dtype=np.int64)
+    feasible = np.isfinite(cost)
+    if R == 0 or C == 0 or not feasible.any():
+        return col4row
+    if R > C:
+        row4col = solve_assignment(cost.T)
+        assigned = np.flatnonzero(row4col >= 0)
+        col4row[row4col[assigned]] = assigned
+        return col4row
+    finite = cost[feasible]
+    penalty = (finite.max() - min(finite.min(), 0.0) + 1.0) * (R + 1)
+    full = np.where(feasible, cost, penalty)
+    if linear_sum_assignment is not None:
+        rows, cols = linear_sum_assignment(full)
+        col4row[rows] = cols
+    else:
+        col4row = _shortest_augmenting_paths(full)
+    col4row[~feasible[np.arange(R), col4row]] = -1
+    return col4row
+
+
+def _shortest_augmenting_paths(cost: np.ndarray) -> np.ndarray:
+    """
+    R <= C, все стоимости конечны. Начальное назначение жадное (каждой
+    строке – свободный столбец из самых дешёвых для неё), остальные строки
+    добавляются по одной кратчайшим путём в остаточной сети
+    (Дейкстра с потенциалами u, v).
+    """
+    R, C = cost.shape
+    best = cost.argmin(axis=1)
+    u = cost[np.arange(R), best]
+    v = np.zeros(C)
+    col4row = np.full(R, -1, dtype=np.int64)
+    row4col = np.full(C, -1, dtype=np.int64)
+    for r in range(R):
+        # Среди самых дешёвых столбцов строки – свободный (машины одной
+        # группы дают одинаковые столбцы)
+        free = (cost[r] == u[r]) & (row4col < 0)
+        if free.any():
+            c = int(free.argmax())
+            row4col[c] = r
+            col4row[r] = c
+
+    for start in np.flatnonzero(col4row < 0):
+        path_cost = np.full(C, np.inf)     # длина кратчайшего пути до столбца
+        path = np.full(C, -1, dtype=np.int64)
+        scanned = np.zeros(C, dtype=bool)
+        rows = [start]
+        shortest = 0.0
+        r = start
+        while True:
+            reduced = shortest + cost[r] - u[r] - v
+            better = reduced < path_cost
+            better &= ~scanned
+            path[better] = r
+            path_cost = np.where(better, reduced, path_cost)
+            c = int(np.where(scanned, np.inf, path_cost).argmin())
+            shortest = path_cost[c]
+            scanned[c] = True
+            if row4col[c] < 0:
+                break
+            r = row4col[c]
+            rows.append(r)
+
+        # Потенциалы: приведённые стоимости остаются неотрицательными
+        u[start] += shortest
+        visited = np.array(rows[1:], dtype=np.int64)
+        u[visited] += shortest - path_cost[col4row[visited]]
+        v[scanned] -= shortest - path_cost[scanned]
+        # Разворачиваем путь
+        while True:
+            r = path[c]
+            row4col[c] = r
+            col4row[r], c = c, col4row[r]
+            if r == start:
+                break
+    return col4row
+
+
+class TravelMatrix:
+    """
+    Расстояния от гаражей (и стоянок, где машина может ждать следующую
+    поездку) до мест обслуживания (метры). Длины сегментов
+    приходят из /move, маршруты – из пройденных поездок; обратный маршрут
+    используется, пока прямой не пройден.
+    """
+
+    def __init__(self):
+        self._segments: Dict[Tuple[str, str], float] = {}
+        self._routes: Dict[Tuple[str, str], float] = {}   # { (from, to): длина }
+        self._origins: Dict[str, int] = {}
+        self._spots: Dict[str, int] = {}
+        self._matrix = np.full((0, 0), np.nan)
+
+    # --- обучение ---
+
+    def observe_segment(self, _from: str, _to: str, distance: float):
+        self._segments[(_from, _to)] = distance
+
+    def observe_route(self, route: Sequence[str]):
+        """
+        Маршрут пройден: длина – сумма известных сегментов.
+        """
+        if len(route) < 2:
+            return
+        length = 0.0
+        for a, b in zip(route, route[1:]):
+            distance = self._segments.get((a, b), self._segments.get((b, a)))
+            if distance is None:
+                return
+            length += distance
+        start, end = route[0], route[-1]
+        self._routes[(start, end)] = length
+        if start in self._origins and end in self._spots:
+            self._matrix[self._origins[start], self._spots[end]] = length
+        elif end in self._origins and start in self._spots and (end, start) not in self._routes:
+            self._matrix[self._origins[end], self._spots[start]] = length
+
+    # --- индексы ---
+
+    def _index(self, origins: Sequence[str], spots: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        grown = False
+        for node in origins:
+            if node not in self._origins:
+                self._origins[node] = len(self._origins)
+                grown = True
+        for node in spots:
+            if node not in self._spots:
+                self._spots[node] = len(self._spots)
+                grown = True
+        if grown:
+            self._rebuild()
+        return (np.array([self._origins[g] for g in origins], dtype=np.int64),
+                np.array([self._spots[s] for s in spots], dtype=np.int64))
+
+    def _rebuild(self):
+        matrix = np.full((len(self._origins), len(self._spots)), np.nan)
+        for origin, gi in self._origins.items():
+            for spot, si in self._spots.items():
+                length = self._routes.get((origin, spot), self._routes.get((spot, origin)))
+                if length is not None:
+                    matrix[gi, si] = length
+        self._matrix = matrix
+
+    def mean_distance(self) -> Optional[float]:
+        known = self._matrix[np.isfinite(self._matrix)]
+        return float(known.mean()) if known.size else None
+
+    def distances(self, origins: Sequence[str], spots: Sequence[str], default: float = 0.0) -> np.ndarray:
+        """
+        Матрица len(origins) x len(spots). Неизвестные расстояния – среднее
+        по известным (или default, если не известно ничего).
+        """
+        gi, si = self._index(origins, spots)
+        block = self._matrix[np.ix_(gi, si)]
+        fill = self.mean_distance()
+        return np.where(np.isnan(block), default if fill is None else fill, block)
+
+    def stats(self) -> dict:
+        return {
+            "origins": len(self._origins),
+            "spots": len(self._spots),
+            "known_pairs": int(np.isfinite(self._matrix).sum()),
+            "segments": len(self._segments),
+        }
+
+
+class TripPlanner:
+    def __init__(self):
+        self.matrix = TravelMatrix()
+        self.plans = 0
+        self.assigned = 0
+        self.planned_distance = 0.0
+        self.last_plan_ms = 0.0
+
+    def assign(self, spots: List[Dict[str, str]], coordinates: List[str],
+               garages: List[str], origins: Optional[List[str]] = None) -> List[Tuple[int, int]]:
+        """
+        Назначает машины поездкам с минимальным суммарным пробегом.
+        coordinates[r] – координаты самолёта для поездки r;
+        garages[c] – гараж свободной машины c, spots[c] – её serviceSpots
+        (у машин одного гаража они одинаковые), origins[c] – узел, где
+        машина стоит (по умолчанию – гараж). Машина, у которой нет
+        serviceSpot для координат, поездке не подходит.
+        Возвращает пары (поездка, машина); поездки – в порядке очереди.
+        """
+        started = time.perf_counter()
+        # Группа одинаковых машин: один гараж и одна стоянка
+        keys = list(zip(garages, origins or garages))
+        groups = list(dict.fromkeys(keys))
+        group_index = {key: gi for gi, key in enumerate(groups)}
+        coord_keys = list(dict.fromkeys(coordinates))
+        coord_index = {coords: ki for ki, coords in enumerate(coord_keys)}
+
+        # Места обслуживания: serviceSpots у машин одного гаража одинаковые
+        spots_by_garage: Dict[str, Dict[str, str]] = {}
+        for c, garage in enumerate(garages):
+            spots_by_garage.setdefault(garage, spots[c])
+        garage_nodes = list(spots_by_garage)
+        spot_names = [[spots_by_garage[garage].get(coords) for coords in coord_keys] for garage in garage_nodes]
+        spot_nodes = sorted({node for row in spot_names for node in row} - {None})
+        spot_index = {node: i for i, node in enumerate(spot_nodes)}
+        # [гараж, координаты] -> номер места обслуживания (-1 – нет)
+        garage_spot = np.array([[spot_index.get(node, -1) for node in row] for row in spot_names],
+                               dtype=np.int64).reshape(len(garage_nodes), len(coord_keys))
+
+        # Матрица расстояний группа x координаты самолёта
+        origin_nodes = list(dict.fromkeys(origin for _, origin in groups))
+        origin_index = {node: i for i, node in enumerate(origin_nodes)}
+        garage_index = {node: i for i, node in enumerate(garage_nodes)}
+        group_spot = garage_spot[[garage_index[garage] for garage, _ in groups]]
+        group_origin = np.array([origin_index[origin] for _, origin in groups], dtype=np.int64)
+        cost = np.full(group_spot.shape, np.inf)
+        if spot_nodes:
+            distances = self.matrix.distances(origin_nodes, spot_nodes)
+            known = group_spot >= 0
+            cost[known] = distances[np.broadcast_to(group_origin[:, None], cost.shape)[known], group_spot[known]]
+
+        # Полная матрица поездки x машины
+        trip_coords = np.array([coord_index[coords] for coords in coordinates], dtype=np.int64)
+        vehicle_groups = np.array([group_index[key] for key in keys], dtype=np.int64)
+        trip_cost = cost[np.ix_(vehicle_groups, trip_coords)].T
+        col4row = solve_assignment(trip_cost)
+        assigned = np.flatnonzero(col4row >= 0)
+        pairs = [(int(r), int(col4row[r])) for r in assigned]
+        self.planned_distance += float(trip_cost[assigned, col4row[assigned]].sum())
+        self.plans += 1
+        self.assigned += len(pairs)
+        self.last_plan_ms = (time.perf_counter() - started) * 1000
+        return pairs
+
+    def garage_order(self, vehicles: Sequence, coordinates: str) -> List[str]:
+        """
+        Гаражи свободных машин vehicles, у которых есть serviceSpot для
+        coordinates, от ближайшего к самолёту (по матрице расстояний;
+        неизвестные расстояния – среднее по известным). Для захвата одной
+        машины без планирования (fleet.acquire).
+        """
+        spot_of: Dict[str, str] = {}
+        for vehicle in vehicles:
+            node = vehicle.service_spots.get(coordinates)
+            if node is not None:
+                spot_of.setdefault(vehicle.garage_node, node)
+        if len(spot_of) < 2:
+            return list(spot_of)
+        garages = list(spot_of)
+        spot_nodes = list(dict.fromkeys(spot_of.values()))
+        spot_index = {node: i for i, node in enumerate(spot_nodes)}
+        distances = self.matrix.distances(garages, spot_nodes)
+        nearest = {garage: distances[i, spot_index[spot_of[garage]]] for i, garage in enumerate(garages)}
+        return sorted(garages, key=nearest.__getitem__)
+
+    def stats(self) -> dict:
+        return dict(
+            self.matrix.stats(),
+            plans=self.plans,
+            assigned=self.assigned,
+            planned_distance_m=round(self.planned_distance, 1),
+            last_plan_ms=round(self.last_plan_ms, 3),
+        )
+
+
+planner = TripPlanner()
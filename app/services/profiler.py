@@ -0,0 +1,156 @@
+# app/services/profiler.py
+#
+# Профилировщик по выборкам для /admin/profile: свой поток (не из пула
+# asyncio.to_thread, которым пользуются хранилище и журнал) раз в
+# interval секунд снимает стек потока цикла событий (sys._current_frames)
+# и считает одинаковые стеки. Результат – collapsed stacks, формат
+# flamegraph.pl и speedscope:
+#   main (main.py:12);run (asyncio/base_events.py:600);... 42
+# Сервис ничего не замедляет, пока профилирование не запрошено; во время
+# него – одна выборка на interval (доли процента процессора при 100 Гц).
+# Выборку поток делает, когда получает GIL, поэтому короткие (меньше
+# sys.getswitchinterval(), 5 мс) вызовы между ожиданиями select попадают
+# в профиль реже, чем идут; долгие вызовы, блокирующие цикл, – как есть.
+
+import os
+import sys
+import asyncio
+import threading
+import time
+from types import CodeType, FrameType
+from typing import Dict, List, Optional
+
+# Стеки глубже обрезаются (со стороны корня)
+_MAX_DEPTH = 200
+
+_prefixes = sorted({os.path.abspath(p) + os.sep for p in sys.path if p}, key=len, reverse=True)
+_labels: Dict[CodeType, str] = {}
+
+
+def _short_path(filename: str) -> str:
+    """
+    Путь относительно каталога из sys.path (services/tasks.py,
+    asyncio/events.py), чтобы стеки читались и не зависели от установки.
+    """
+    for prefix in _prefixes:
+        if filename.startswith(prefix):
+            return filename[len(prefix):]
+    return filename
+
+
+def _label(code: CodeType) -> str:
+    label = _labels.get(code)
+    if label is None:
+        # «;» – разделитель кадров в collapsed stacks
+        label = f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+        label = _labels[code] = label.replace(";", ":")
+    return label
+
+
+def frame_stack(frame: Optional[FrameType], lines: bool = False) -> List[str]:
+    """
+    Кадры от корня к текущему. lines=True – с текущей строкой кадра
+    вместо первой строки функции (для стеков заблокированного цикла).
+    """
+    stack = []
+    while frame is not None and len(stack) < _MAX_DEPTH:
+        code = frame.f_code
+        if lines:
+            stack.append(f"{code.co_name} ({_short_path(code.co_filename)}:{frame.f_lineno})")
+        else:
+            stack.append(_label(code))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+class ProfilerBusy(Exception):
+    """Профилирование уже идёт (одновременно – только одно)."""
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self.running = False
+        # Метрики
+        self.runs = 0
+        self.samples = 0
+
+    async def run(self, seconds: float, interval: float, all_threads: bool = False) -> Dict[str, int]:
+        """
+        Профилирует поток цикла событий (all_threads – все потоки процесса)
+        seconds секунд. Возвращает { стек через «;»: число выборок }.
+        """
+        if self.running:
+            raise ProfilerBusy()
+        self.running = True
+        loop = asyncio.get_running_loop()
+        result = loop.create_future()
+        stop = threading.Event()
+
+        def _resolve(counts: Optional[Dict[str, int]], error: Optional[BaseException]):
+            if result.done():
+                return
+            if error is not None:
+                result.set_exception(error)
+            else:
+                result.set_result(counts)
+
+        def target(loop_thread: int):
+            try:
+                counts = self._sample(loop_thread, seconds, interval, all_threads, stop)
+                if stop.is_set():
+                    return   # результат никто не ждёт, цикл мог уже закрыться
+            except BaseException as e:
+                loop.call_soon_threadsafe(_resolve, None, e)
+            else:
+                loop.call_soon_threadsafe(_resolve, counts, None)
+
+        thread = threading.Thread(target=target, args=(threading.get_ident(),),
+                                  name="profiler", daemon=True)
+        try:
+            thread.start()
+            counts = await result
+        finally:
+            # Запрос отменён – поток заканчивает на следующей выборке
+            stop.set()
+            self.running = False
+        self.runs += 1
+        self.samples += sum(counts.values())
+        return counts
+
+    @staticmethod
+    def _sample(loop_thread: int, seconds: float, interval: float, all_threads: bool,
+                stop: threading.Event) -> Dict[str, int]:
+        me = threading.get_ident()
+        names = {}
+        counts: Dict[str, int] = {}
+        deadline = time.perf_counter() + seconds
+        while True:
+            started = time.perf_counter()
+            if started >= deadline or stop.is_set():
+                break
+            frames = sys._current_frames()
+            for thread_id, frame in frames.items():
+                if thread_id == me or (not all_threads and thread_id != loop_thread):
+                    continue
+                stack = frame_stack(frame)
+                if all_threads:
+                    if thread_id not in names:
+                        names = {t.ident: t.name for t in threading.enumerate()}
+                    stack.insert(0, f"thread {names.get(thread_id, thread_id)}".replace(";", ":"))
+                key = ";".join(stack)
+                counts[key] = counts.get(key, 0) + 1
+            # Кадры не держим до следующей выборки
+            frames = frame = None
+            stop.wait(max(0.0, interval - (time.perf_counter() - started)))
+        return counts
+
+    @staticmethod
+    def collapsed(counts: Dict[str, int]) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in sorted(counts.items()))
+
+    def stats(self) -> dict:
+        return {"running": self.running, "runs": self.runs, "samples": self.samples}
+
+
+profiler = SamplingProfiler()
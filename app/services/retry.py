@@ -0,0 +1,154 @@
+# app/services/retry.py
+#
+# Политика повторов для запросов к ground-control и оркестратору:
+# экспоненциальная задержка с полным джиттером, лимит попыток, общий
+# дедлайн и учёт заголовка Retry-After.
+
+import time
+import random
+import asyncio
+import logging
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, FrozenSet, Optional
+
+import httpx
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Временные ошибки, которые имеет смысл повторять для любого эндпоинта
+TRANSIENT_STATUSES = frozenset({429, 502, 503, 504})
+
+
+class RetryPolicy:
+    __slots__ = ("base_delay", "max_delay", "max_attempts", "deadline", "retry_statuses")
+
+    def __init__(self, base_delay: float, max_delay: float, max_attempts: int,
+                 deadline: float, retry_statuses: FrozenSet[int] = TRANSIENT_STATUSES):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.deadline = deadline
+        self.retry_statuses = retry_statuses
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Задержка перед повтором номер attempt (с нуля), full jitter.
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class RetryBudgetExceeded(Exception):
+    """
+    Бюджет повторов исчерпан. Поездку нужно вернуть диспетчеру.
+    """
+
+    def __init__(self, endpoint: str, attempts: int, last_error: str):
+        super().__init__(f"{endpoint}: бюджет повторов исчерпан после {attempts} попыток ({last_error})")
+        self.endpoint = endpoint
+        self.attempts = attempts
+        self.last_error = last_error
+
+
+DEFAULT_POLICY = RetryPolicy(
+    base_delay=config.RETRY_BASE_DELAY,
+    max_delay=config.RETRY_MAX_DELAY,
+    max_attempts=config.RETRY_MAX_ATTEMPTS,
+    deadline=config.RETRY_DEADLINE,
+)
+
+POLICIES: Dict[str, RetryPolicy] = {
+    "move": RetryPolicy(
+        base_delay=config.RETRY_BASE_DELAY,
+        max_delay=config.RETRY_MAX_DELAY,
+        max_attempts=config.RETRY_MOVE_MAX_ATTEMPTS,
+        deadline=config.RETRY_MOVE_DEADLINE,
+        retry_statuses=TRANSIENT_STATUSES | {409},
+    ),
+}
+
+
+def policy_for(endpoint: str) -> RetryPolicy:
+    return POLICIES.get(endpoint, DEFAULT_POLICY)
+
+
+class RetryStats:
+    __slots__ = ("calls", "retries", "backoff_seconds", "exhausted")
+
+    def __init__(self):
+        self.calls = 0
+        self.retries = 0
+        self.backoff_seconds = 0.0
+        self.exhausted = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "backoff_seconds": round(self.backoff_seconds, 3),
+            "exhausted": self.exhausted,
+        }
+
+
+retry_stats: Dict[str, RetryStats] = {}
+
+
+def _retry_after(resp: httpx.Response) -> Optional[float]:
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+async def send_with_retry(endpoint: str, send: Callable[[], Awaitable[httpx.Response]],
+                          policy: Optional[RetryPolicy] = None) -> httpx.Response:
+    """
+    Выполняет send() с повторами по политике эндпоинта.
+    Возвращает первый ответ, который не нужно повторять.
+    Если бюджет исчерпан – RetryBudgetExceeded.
+    """
+    policy = policy or policy_for(endpoint)
+    stats = retry_stats.get(endpoint)
+    if stats is None:
+        stats = retry_stats[endpoint] = RetryStats()
+    stats.calls += 1
+
+    # Время цикла событий: при виртуальных часах (services/clock.py)
+    # задержки и дедлайн идут по одному времени
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + policy.deadline
+    attempt = 0
+    while True:
+        try:
+            resp = await send()
+            if resp.status_code not in policy.retry_statuses:
+                return resp
+            delay = _retry_after(resp)
+            if delay is None:
+                delay = policy.backoff(attempt)
+            last_error = f"HTTP {resp.status_code}"
+        except httpx.TransportError as e:
+            delay = policy.backoff(attempt)
+            last_error = f"{type(e).__name__}: {e}"
+
+        attempt += 1
+        if attempt >= policy.max_attempts or loop.time() + delay > deadline:
+            stats.exhausted += 1
+            raise RetryBudgetExceeded(endpoint, attempt, last_error)
+
+        stats.retries += 1
+        stats.backoff_seconds += delay
+        logger.debug("[%s] %s, повтор %d через %.2f сек", endpoint, last_error, attempt, delay)
+        await asyncio.sleep(delay)
+
+
+def stats_snapshot() -> Dict[str, dict]:
+    return {endpoint: stats.as_dict() for endpoint, stats in retry_stats.items()}
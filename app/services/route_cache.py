@@ -0,0 +1,138 @@
+# app/services/route_cache.py
+#
+# Кэш маршрутов ground-control: TTL + LRU, повторное использование
+# обратного маршрута и single-flight (одновременные запросы одной пары
+# узлов превращаются в один HTTP-запрос). invalidate() увеличивает
+# поколение кэша: маршрут, запрошенный до сброса, в кэш уже не попадает.
+
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import config
+
+logger = logging.getLogger(__name__)
+
+RouteKey = Tuple[str, str, str]  # (from, to, vehicle_type)
+RouteFetcher = Callable[[str, str, str], Awaitable[Optional[List[str]]]]
+
+
+class RouteCache:
+    def __init__(self, ttl: float, max_size: int, reverse: bool):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.reverse = reverse
+        self._entries: "OrderedDict[RouteKey, Tuple[float, List[str]]]" = OrderedDict()
+        self._inflight: Dict[RouteKey, asyncio.Future] = {}
+        self.generation = 0    # растёт при каждом invalidate()
+        self.hits = 0
+        self.reverse_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def _lookup(self, key: RouteKey) -> Optional[List[str]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, route = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return route
+
+    def _store(self, key: RouteKey, route: List[str]):
+        self._entries[key] = (time.monotonic() + self.ttl, route)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_fetch(self, _from: str, _to: str, vehicle_type: str,
+                           fetch: RouteFetcher) -> Optional[List[str]]:
+        """
+        Возвращает маршрут из кэша или запрашивает его через fetch().
+        Неудачные ответы (None) не кэшируются.
+        """
+        key = (_from, _to, vehicle_type)
+        route = self._lookup(key)
+        if route is not None:
+            self.hits += 1
+            return list(route)
+
+        if self.reverse:
+            back = self._lookup((_to, _from, vehicle_type))
+            if back is not None:
+                self.reverse_hits += 1
+                route = back[::-1]
+                self._store(key, route)
+                return list(route)
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            route = await asyncio.shield(inflight)
+            return list(route) if route is not None else None
+
+        self.misses += 1
+        future = asyncio.ensure_future(self._fetch_and_store(key, fetch, self.generation))
+        self._inflight[key] = future
+        # shield: отмена одного вызывающего не отменяет запрос для остальных
+        route = await asyncio.shield(future)
+        return list(route) if route is not None else None
+
+    async def _fetch_and_store(self, key: RouteKey, fetch: RouteFetcher,
+                               generation: int) -> Optional[List[str]]:
+        try:
+            route = await fetch(*key)
+            if not route:
+                return None
+            # Кэш сброшен, пока шёл запрос: ответ отдаём ждущим, но не храним
+            if generation == self.generation:
+                self._store(key, route)
+            return route
+        finally:
+            if generation == self.generation:
+                self._inflight.pop(key, None)
+
+    def invalidate(self, node: Optional[str] = None) -> int:
+        """
+        Сбрасывает кэш целиком или только маршруты, проходящие через node.
+        Возвращает число удалённых записей. Запросы, начатые до сброса,
+        в кэш не попадут, и новые вызовы их не ждут.
+        """
+        self.generation += 1
+        self._inflight.clear()
+        if node is None:
+            removed = len(self._entries)
+            self._entries.clear()
+        else:
+            keys = [k for k, (_, route) in self._entries.items() if node in route]
+            for k in keys:
+                del self._entries[k]
+            removed = len(keys)
+        logger.info("Кэш маршрутов сброшен (node=%s, удалено %d)", node, removed)
+        return removed
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "reverse_hits": self.reverse_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "inflight": len(self._inflight),
+        }
+
+
+route_cache = RouteCache(
+    ttl=config.ROUTE_CACHE_TTL,
+    max_size=config.ROUTE_CACHE_MAX_SIZE,
+    reverse=config.ROUTE_CACHE_REVERSE,
+)
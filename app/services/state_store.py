@@ -0,0 +1,873 @@
+# app/services/state_store.py
+#
+# Хранилище общего состояния: машины парка, сеансы обслуживания самолётов
+# (services/aircraft.py) и настройки (вместимость машины). Две реализации:
+#   MemoryStateStore – в памяти процесса (один воркер);
+#   SQLiteStateStore – файл SQLite в режиме WAL, общий для нескольких
+#                      воркеров uvicorn на одной машине.
+# Чтения синхронные и дешёвые (в WAL читатели не ждут писателей),
+# изменения – асинхронные и атомарные.
+
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from enum import Enum
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import config
+from services.worker import worker
+
+logger = logging.getLogger(__name__)
+
+
+class VehicleState(str, Enum):
+    IN_GARAGE = "in_garage"   # стоит в гараже, свободна
+    IDLE = "idle"             # свободна, ждёт на узле current_node (у самолёта)
+    EN_ROUTE = "en_route"     # выполняет поездку ("в пути")
+
+
+FREE_STATES = (VehicleState.IN_GARAGE, VehicleState.IDLE)
+
+
+class Vehicle:
+    __slots__ = ("vehicle_id", "vehicle_type", "garage_node", "current_node",
+                 "service_spots", "state", "capacity", "owner")
+
+    def __init__(self, vehicle_id: str, vehicle_type: str, garage_node: str,
+                 service_spots: Dict[str, str], capacity: Optional[int] = None):
+        self.vehicle_id = vehicle_id
+        self.vehicle_type = vehicle_type
+        self.garage_node = garage_node
+        self.current_node = garage_node
+        self.service_spots = service_spots
+        self.state = VehicleState.IN_GARAGE
+        # Своя вместимость машины; None – общая (/updateCapacity)
+        self.capacity = capacity
+        # Номер воркера, ведущего машину (services/worker.py); None – свободна
+        self.owner: Optional[str] = None
+
+    def as_dict(self) -> dict:
+        return {
+            "vehicle_id": self.vehicle_id,
+            "vehicle_type": self.vehicle_type,
+            "state": self.state.value,
+            "garage_node": self.garage_node,
+            "current_node": self.current_node,
+            "service_spots": self.service_spots,
+            "capacity": self.capacity,
+            "owner": self.owner,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Vehicle":
+        vehicle = cls(data["vehicle_id"], data["vehicle_type"], data["garage_node"], data["service_spots"],
+                      capacity=data.get("capacity"))
+        vehicle.current_node = data.get("current_node", vehicle.garage_node)
+        vehicle.state = VehicleState(data.get("state", VehicleState.IN_GARAGE.value))
+        vehicle.owner = data.get("owner")
+        return vehicle
+
+
+class SessionStatus:
+    PLANNED = "planned"      # машины ещё едут, оркестратор не уведомлялся
+    IN_PROGRESS = "in_progress"
+
+
+class SessionPlan:
+    """Итог StateStore.plan_trip."""
+    OPENED = "opened"        # открыт новый сеанс
+    JOINED = "joined"        # запрос влился в уже открытый сеанс
+    UPDATED = "updated"      # поездка уже была в сеансе (снова в очереди)
+
+
+def _session_dict(aircraft_id: str, is_boarding: bool, planned_trips: int, planned_passengers: int,
+                  served: int, vehicles: List[str], created_at: float, started_at: Optional[float]) -> dict:
+    return {
+        "aircraft_id": aircraft_id,
+        "operation": "boarding" if is_boarding else "unboarding",
+        "status": SessionStatus.PLANNED if started_at is None else SessionStatus.IN_PROGRESS,
+        "planned_trips": planned_trips,
+        "planned_passengers": served + planned_passengers,
+        "served_passengers": served,
+        "vehicles": sorted(vehicles),
+        "created_at": created_at,
+        "started_at": started_at,
+    }
+
+
+class BoardingSession:
+    """
+    Сеанс посадки/высадки в MemoryStateStore (в SQLite – строки таблиц
+    boarding_sessions и session_trips).
+    """
+    __slots__ = ("aircraft_id", "is_boarding", "planned", "vehicles", "served",
+                 "created_at", "started_at")
+
+    def __init__(self, aircraft_id: str, is_boarding: bool):
+        self.aircraft_id = aircraft_id
+        self.is_boarding = is_boarding
+        # { trip_id: (пассажиров, номер воркера) } – поездки, ещё не закончившие работу у самолёта
+        self.planned: Dict[str, Tuple[int, Optional[str]]] = {}
+        self.vehicles: Dict[str, str] = {}   # { trip_id: машина у самолёта сейчас }
+        self.served = 0                   # пассажиров уже перевезено
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+
+    def as_dict(self) -> dict:
+        return _session_dict(self.aircraft_id, self.is_boarding, len(self.planned),
+                             sum(count for count, _ in self.planned.values()), self.served,
+                             list(self.vehicles.values()), self.created_at, self.started_at)
+
+
+def _preferred_first(garages: Iterable[str], garage_order: Iterable[str]) -> List[str]:
+    """
+    Гаражи из garage_order в его порядке, за ними – остальные из garages
+    (машина могла освободиться в гараже, которого не было в порядке).
+    """
+    garages = list(garages)
+    present = set(garages)
+    preferred = [garage for garage in dict.fromkeys(garage_order) if garage in present]
+    chosen = set(preferred)
+    return preferred + [garage for garage in garages if garage not in chosen]
+
+
+def _reservation_owner() -> str:
+    # Вне жизненного цикла приложения (скрипты, бенчмарк) номера воркера нет
+    return worker.id or ""
+
+
+class StateStore(ABC):
+    """
+    Интерфейс хранилища. Методы claim_*/reserve_* атомарны: две поездки
+    (в том числе из разных процессов) не получат одну машину. Захваченная
+    машина помечается номером воркера (owner), освобождённая – без номера.
+    """
+
+    # --- машины ---
+
+    @abstractmethod
+    async def add_vehicle(self, vehicle: Vehicle, busy: bool, reserved: bool): ...
+
+    @abstractmethod
+    async def reserve_slot(self, max_size: int) -> bool: ...
+
+    @abstractmethod
+    async def release_slot(self): ...
+
+    @abstractmethod
+    def reservation_owners(self) -> List[str]:
+        """
+        Воркеры, у которых есть зарезервированные места.
+        """
+
+    @abstractmethod
+    async def clear_reservations(self, owner: str) -> int:
+        """
+        Снимает все резервы воркера owner (его процесс упал посреди
+        регистрации). Возвращает число освобождённых мест.
+        """
+
+    @abstractmethod
+    async def claim_free_vehicle(self, aircraft_coordinates: Optional[str],
+                                 garage_order: Optional[Iterable[str]]) -> Optional[Vehicle]: ...
+
+    @abstractmethod
+    async def claim_vehicle(self, vehicle_id: str) -> Optional[Vehicle]:
+        """
+        Забирает конкретную свободную машину (None – её уже забрали).
+        """
+
+    @abstractmethod
+    async def release_vehicle(self, vehicle_id: str, at_node: Optional[str] = None) -> bool:
+        """
+        Освобождает машину: в гараже (at_node=None) или там, где она стоит.
+        """
+
+    @abstractmethod
+    async def set_position(self, vehicle_id: str, node: str): ...
+
+    @abstractmethod
+    async def set_vehicle_capacity(self, vehicle_id: str, capacity: Optional[int]) -> bool: ...
+
+    @abstractmethod
+    def get_vehicle(self, vehicle_id: str) -> Optional[Vehicle]: ...
+
+    @abstractmethod
+    def list_vehicles(self) -> List[Vehicle]: ...
+
+    @abstractmethod
+    def list_free_vehicles(self) -> List[Vehicle]: ...
+
+    @abstractmethod
+    def counts(self) -> Tuple[int, int, int]:
+        """
+        (всего машин, свободных, зарезервированных мест под регистрацию)
+        """
+
+    # --- сеансы самолётов ---
+    # Сеанс – самолёт и операция (посадка/высадка). Поездки сеанса
+    # помечаются номером воркера, который их ведёт.
+
+    @abstractmethod
+    async def plan_trip(self, trip_id: str, aircraft_id: str, is_boarding: bool, passenger_count: int) -> str:
+        """
+        Поездка запланирована (или снова в очереди): открывает сеанс, если
+        его нет. Возвращает SessionPlan.
+        """
+
+    @abstractmethod
+    async def split_trip(self, trip_id: str, part_id: str, passenger_count: int):
+        """
+        От поездки отделена часть part_id на passenger_count пассажиров.
+        """
+
+    @abstractmethod
+    async def arrive_trip(self, trip_id: str, aircraft_id: str, is_boarding: bool, vehicle_id: str,
+                          passenger_count: int) -> Tuple[bool, dict]:
+        """
+        Машина поездки у самолёта; отмечает начало сеанса, если его ещё не
+        было. Возвращает (первая ли это машина сеанса, сеанс).
+        """
+
+    @abstractmethod
+    async def leave_trip(self, trip_id: str, served: int) -> Optional[Tuple[bool, dict]]:
+        """
+        Поездка (и её машина) закончила работу у самолёта, перевезя served
+        пассажиров (0 – не обслужила). Сеанс без поездок закрывается.
+        Возвращает (закрыт ли сеанс, сеанс) или None, если поездки нет в сеансах.
+        """
+
+    @abstractmethod
+    async def start_session(self, aircraft_id: str, is_boarding: bool) -> bool:
+        """
+        Отмечает начало сеанса. True, если начала ещё не было.
+        """
+
+    @abstractmethod
+    def list_sessions(self, aircraft_id: Optional[str] = None) -> List[dict]: ...
+
+    @abstractmethod
+    def session_counts(self) -> Tuple[int, int]:
+        """
+        (открытых сеансов, из них начатых)
+        """
+
+    @abstractmethod
+    def session_trips(self, owner: str) -> List[str]:
+        """
+        Поездки сеансов, которые ведёт воркер owner.
+        """
+
+    # --- настройки ---
+
+    @abstractmethod
+    def get_capacity(self) -> int: ...
+
+    @abstractmethod
+    async def set_capacity(self, capacity: int): ...
+
+    def close(self):
+        pass
+
+
+class MemoryStateStore(StateStore):
+    """
+    Состояние в памяти процесса. Методы не содержат await внутри, поэтому
+    каждый из них выполняется в event loop атомарно, без блокировок.
+    """
+
+    def __init__(self, default_capacity: int):
+        self._vehicles: Dict[str, Vehicle] = {}
+        # { garage_node: { vehicle_id: Vehicle } } – только свободные машины
+        self._free_by_garage: Dict[str, Dict[str, Vehicle]] = {}
+        self._reserved_slots: Dict[str, int] = {}    # { воркер: мест под регистрацию }
+        self._sessions: Dict[Tuple[str, bool], BoardingSession] = {}
+        self._session_of_trip: Dict[str, BoardingSession] = {}
+        self._capacity = default_capacity
+
+    def _put_free(self, vehicle: Vehicle, at_node: Optional[str] = None):
+        if at_node is None or at_node == vehicle.garage_node:
+            vehicle.state = VehicleState.IN_GARAGE
+            vehicle.current_node = vehicle.garage_node
+        else:
+            vehicle.state = VehicleState.IDLE
+            vehicle.current_node = at_node
+        vehicle.owner = None
+        self._free_by_garage.setdefault(vehicle.garage_node, {})[vehicle.vehicle_id] = vehicle
+
+    def _take_free(self, vehicle: Vehicle):
+        pool = self._free_by_garage.get(vehicle.garage_node)
+        if pool is not None:
+            pool.pop(vehicle.vehicle_id, None)
+            if not pool:
+                del self._free_by_garage[vehicle.garage_node]
+        vehicle.state = VehicleState.EN_ROUTE
+        vehicle.owner = worker.id
+
+    def _unreserve(self):
+        owner = _reservation_owner()
+        slots = self._reserved_slots.get(owner, 0) - 1
+        if slots > 0:
+            self._reserved_slots[owner] = slots
+        else:
+            self._reserved_slots.pop(owner, None)
+
+    async def add_vehicle(self, vehicle: Vehicle, busy: bool, reserved: bool):
+        if reserved:
+            self._unreserve()
+        self._vehicles[vehicle.vehicle_id] = vehicle
+        if busy:
+            self._take_free(vehicle)
+        else:
+            self._put_free(vehicle)
+
+    async def reserve_slot(self, max_size: int) -> bool:
+        if len(self._vehicles) + sum(self._reserved_slots.values()) >= max_size:
+            return False
+        owner = _reservation_owner()
+        self._reserved_slots[owner] = self._reserved_slots.get(owner, 0) + 1
+        return True
+
+    async def release_slot(self):
+        self._unreserve()
+
+    def reservation_owners(self) -> List[str]:
+        return list(self._reserved_slots)
+
+    async def clear_reservations(self, owner: str) -> int:
+        return self._reserved_slots.pop(owner, 0)
+
+    async def claim_free_vehicle(self, aircraft_coordinates, garage_order):
+        garages = list(self._free_by_garage)
+        if garage_order is not None:
+            garages = _preferred_first(garages, garage_order)
+        for garage in garages:
+            pool = self._free_by_garage.get(garage)
+            if not pool:
+                continue
+            # У машин одного гаража одинаковые serviceSpots – смотрим первую
+            vehicle = next(iter(pool.values()))
+            if aircraft_coordinates is None or aircraft_coordinates in vehicle.service_spots:
+                self._take_free(vehicle)
+                return vehicle
+        return None
+
+    async def claim_vehicle(self, vehicle_id: str) -> Optional[Vehicle]:
+        vehicle = self._vehicles.get(vehicle_id)
+        if vehicle is None or vehicle.state not in FREE_STATES:
+            return None
+        self._take_free(vehicle)
+        return vehicle
+
+    async def release_vehicle(self, vehicle_id: str, at_node: Optional[str] = None) -> bool:
+        vehicle = self._vehicles.get(vehicle_id)
+        if vehicle is None or vehicle.state != VehicleState.EN_ROUTE:
+            return False
+        self._put_free(vehicle, at_node)
+        return True
+
+    async def set_position(self, vehicle_id: str, node: str):
+        vehicle = self._vehicles.get(vehicle_id)
+        if vehicle is not None:
+            vehicle.current_node = node
+
+    async def set_vehicle_capacity(self, vehicle_id: str, capacity: Optional[int]) -> bool:
+        vehicle = self._vehicles.get(vehicle_id)
+        if vehicle is None:
+            return False
+        vehicle.capacity = capacity
+        return True
+
+    def get_vehicle(self, vehicle_id: str) -> Optional[Vehicle]:
+        return self._vehicles.get(vehicle_id)
+
+    def list_vehicles(self) -> List[Vehicle]:
+        return list(self._vehicles.values())
+
+    def list_free_vehicles(self) -> List[Vehicle]:
+        return [vehicle for pool in self._free_by_garage.values() for vehicle in pool.values()]
+
+    def counts(self) -> Tuple[int, int, int]:
+        free = sum(len(pool) for pool in self._free_by_garage.values())
+        return len(self._vehicles), free, sum(self._reserved_slots.values())
+
+    def _session(self, aircraft_id: str, is_boarding: bool) -> Tuple[BoardingSession, bool]:
+        key = (aircraft_id, is_boarding)
+        session = self._sessions.get(key)
+        if session is not None:
+            return session, False
+        session = self._sessions[key] = BoardingSession(aircraft_id, is_boarding)
+        return session, True
+
+    async def plan_trip(self, trip_id: str, aircraft_id: str, is_boarding: bool, passenger_count: int) -> str:
+        session = self._session_of_trip.get(trip_id)
+        if session is not None:
+            session.planned[trip_id] = (passenger_count, worker.id)
+            return SessionPlan.UPDATED
+        session, opened = self._session(aircraft_id, is_boarding)
+        session.planned[trip_id] = (passenger_count, worker.id)
+        self._session_of_trip[trip_id] = session
+        return SessionPlan.OPENED if opened else SessionPlan.JOINED
+
+    async def split_trip(self, trip_id: str, part_id: str, passenger_count: int):
+        session = self._session_of_trip.get(trip_id)
+        if session is None:
+            return
+        count, owner = session.planned[trip_id]
+        session.planned[trip_id] = (count - passenger_count, owner)
+        session.planned[part_id] = (passenger_count, worker.id)
+        self._session_of_trip[part_id] = session
+
+    async def arrive_trip(self, trip_id: str, aircraft_id: str, is_boarding: bool, vehicle_id: str,
+                          passenger_count: int) -> Tuple[bool, dict]:
+        session = self._session_of_trip.get(trip_id)
+        if session is None:
+            session, _ = self._session(aircraft_id, is_boarding)
+            session.planned[trip_id] = (passenger_count, worker.id)
+            self._session_of_trip[trip_id] = session
+        session.vehicles[trip_id] = vehicle_id
+        first = session.started_at is None
+        if first:
+            session.started_at = time.time()
+        return first, session.as_dict()
+
+    async def leave_trip(self, trip_id: str, served: int) -> Optional[Tuple[bool, dict]]:
+        session = self._session_of_trip.pop(trip_id, None)
+        if session is None:
+            return None
+        session.planned.pop(trip_id, None)
+        session.vehicles.pop(trip_id, None)
+        session.served += served
+        closed = not session.planned
+        if closed:
+            del self._sessions[(session.aircraft_id, session.is_boarding)]
+        return closed, session.as_dict()
+
+    async def start_session(self, aircraft_id: str, is_boarding: bool) -> bool:
+        session = self._sessions.get((aircraft_id, is_boarding))
+        if session is None or session.started_at is not None:
+            return False
+        session.started_at = time.time()
+        return True
+
+    def list_sessions(self, aircraft_id: Optional[str] = None) -> List[dict]:
+        return [session.as_dict() for session in self._sessions.values()
+                if aircraft_id is None or session.aircraft_id == aircraft_id]
+
+    def session_counts(self) -> Tuple[int, int]:
+        started = sum(1 for session in self._sessions.values() if session.started_at is not None)
+        return len(self._sessions), started
+
+    def session_trips(self, owner: str) -> List[str]:
+        return [trip_id for trip_id, session in self._session_of_trip.items()
+                if session.planned[trip_id][1] == owner]
+
+    def get_capacity(self) -> int:
+        return self._capacity
+
+    async def set_capacity(self, capacity: int):
+        self._capacity = capacity
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS vehicles (
+    vehicle_id    TEXT PRIMARY KEY,
+    vehicle_type  TEXT NOT NULL,
+    garage_node   TEXT NOT NULL,
+    current_node  TEXT NOT NULL,
+    service_spots TEXT NOT NULL,
+    state         TEXT NOT NULL,
+    capacity      INTEGER,
+    owner         TEXT
+);
+CREATE INDEX IF NOT EXISTS vehicles_free ON vehicles (state, garage_node);
+CREATE TABLE IF NOT EXISTS boarding_sessions (
+    aircraft_id TEXT NOT NULL,
+    is_boarding INTEGER NOT NULL,
+    served      INTEGER NOT NULL,
+    created_at  REAL NOT NULL,
+    started_at  REAL,
+    PRIMARY KEY (aircraft_id, is_boarding)
+);
+CREATE TABLE IF NOT EXISTS session_trips (
+    trip_id     TEXT PRIMARY KEY,
+    aircraft_id TEXT NOT NULL,
+    is_boarding INTEGER NOT NULL,
+    passengers  INTEGER NOT NULL,
+    owner       TEXT,
+    vehicle_id  TEXT
+);
+CREATE INDEX IF NOT EXISTS session_trips_session ON session_trips (aircraft_id, is_boarding);
+CREATE TABLE IF NOT EXISTS reserved_slots (
+    owner TEXT PRIMARY KEY,
+    slots INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+_FREE_STATE_VALUES = tuple(state.value for state in FREE_STATES)
+
+
+class SQLiteStateStore(StateStore):
+    """
+    Состояние в SQLite (WAL). Изменения выполняются в пуле потоков внутри
+    транзакций BEGIN IMMEDIATE, так что атомарны и между процессами.
+    Чтения идут через отдельное соединение прямо в event loop: в режиме WAL
+    они не ждут писателей и занимают микросекунды.
+
+    Зарезервированные под регистрацию места считаются по воркерам
+    (reserved_slots); если воркер упал посреди регистрации, его места
+    освобождаются при восстановлении (FleetRegistry.reclaim_slots).
+    """
+
+    def __init__(self, path: str, default_capacity: int):
+        self.path = path
+        self.default_capacity = default_capacity
+        self._write_lock = threading.Lock()
+        self._writer_conn: Optional[sqlite3.Connection] = None
+        self._reader_conn: Optional[sqlite3.Connection] = None
+        writer = self._writer
+        writer.executescript(_SCHEMA)
+        columns = {row[1] for row in writer.execute("PRAGMA table_info(vehicles)")}
+        if "capacity" not in columns:
+            # Файл создан до появления вместимости по машинам
+            writer.execute("ALTER TABLE vehicles ADD COLUMN capacity INTEGER")
+        if "owner" not in columns:
+            writer.execute("ALTER TABLE vehicles ADD COLUMN owner TEXT")
+        # Общий счётчик резервов из старых версий: чьи это места, уже не узнать
+        writer.execute("DELETE FROM meta WHERE key = 'reserved_slots'")
+        writer.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('capacity', ?)",
+                       (str(default_capacity),))
+
+    # Соединения открываются лениво, чтобы хранилище переживало close()
+    # при перезапуске lifespan приложения в том же процессе
+
+    @property
+    def _writer(self) -> sqlite3.Connection:
+        if self._writer_conn is None:
+            self._writer_conn = self._connect()
+        return self._writer_conn
+
+    @property
+    def _reader(self) -> sqlite3.Connection:
+        if self._reader_conn is None:
+            self._reader_conn = self._connect()
+        return self._reader_conn
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None,
+                               check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    @staticmethod
+    def _row_to_vehicle(row) -> Vehicle:
+        vehicle_id, vehicle_type, garage_node, current_node, service_spots, state, capacity, owner = row
+        vehicle = Vehicle(vehicle_id, vehicle_type, garage_node, json.loads(service_spots), capacity)
+        vehicle.current_node = current_node
+        vehicle.state = VehicleState(state)
+        vehicle.owner = owner
+        return vehicle
+
+    def _transaction(self, fn, *args):
+        with self._write_lock:
+            conn = self._writer
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(conn, *args)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return result
+
+    async def _write(self, fn, *args):
+        return await asyncio.to_thread(self._transaction, fn, *args)
+
+    # --- машины ---
+
+    async def add_vehicle(self, vehicle: Vehicle, busy: bool, reserved: bool):
+        vehicle.state = VehicleState.EN_ROUTE if busy else VehicleState.IN_GARAGE
+        vehicle.owner = worker.id if busy else None
+        owner = _reservation_owner()
+
+        def op(conn):
+            conn.execute(
+                "INSERT OR REPLACE INTO vehicles VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (vehicle.vehicle_id, vehicle.vehicle_type, vehicle.garage_node, vehicle.current_node,
+                 json.dumps(vehicle.service_spots, ensure_ascii=False), vehicle.state.value,
+                 vehicle.capacity, vehicle.owner))
+            if reserved:
+                self._unreserve(conn, owner)
+        await self._write(op)
+
+    @staticmethod
+    def _unreserve(conn: sqlite3.Connection, owner: str):
+        conn.execute("UPDATE reserved_slots SET slots = slots - 1 WHERE owner = ?", (owner,))
+        conn.execute("DELETE FROM reserved_slots WHERE owner = ? AND slots <= 0", (owner,))
+
+    async def reserve_slot(self, max_size: int) -> bool:
+        owner = _reservation_owner()
+
+        def op(conn):
+            (total,) = conn.execute("SELECT COUNT(*) FROM vehicles").fetchone()
+            (reserved,) = conn.execute("SELECT COALESCE(SUM(slots), 0) FROM reserved_slots").fetchone()
+            if total + reserved >= max_size:
+                return False
+            conn.execute("INSERT INTO reserved_slots (owner, slots) VALUES (?, 1) "
+                         "ON CONFLICT (owner) DO UPDATE SET slots = slots + 1", (owner,))
+            return True
+        return await self._write(op)
+
+    async def release_slot(self):
+        owner = _reservation_owner()
+        await self._write(lambda conn: self._unreserve(conn, owner))
+
+    def reservation_owners(self) -> List[str]:
+        return [owner for (owner,) in self._reader.execute("SELECT owner FROM reserved_slots")]
+
+    async def clear_reservations(self, owner: str) -> int:
+        def op(conn):
+            row = conn.execute("SELECT slots FROM reserved_slots WHERE owner = ?", (owner,)).fetchone()
+            conn.execute("DELETE FROM reserved_slots WHERE owner = ?", (owner,))
+            return row[0] if row else 0
+        return await self._write(op)
+
+    async def claim_free_vehicle(self, aircraft_coordinates, garage_order):
+        order = list(garage_order) if garage_order is not None else None
+        owner = worker.id
+
+        def op(conn):
+            rows = conn.execute("SELECT * FROM vehicles WHERE state IN (?, ?)", _FREE_STATE_VALUES).fetchall()
+            if order is not None:
+                rank = {garage: i for i, garage in enumerate(_preferred_first({row[2] for row in rows}, order))}
+                rows.sort(key=lambda row: rank[row[2]])
+            for row in rows:
+                vehicle = self._row_to_vehicle(row)
+                if aircraft_coordinates is None or aircraft_coordinates in vehicle.service_spots:
+                    conn.execute("UPDATE vehicles SET state = ?, owner = ? WHERE vehicle_id = ?",
+                                 (VehicleState.EN_ROUTE.value, owner, vehicle.vehicle_id))
+                    vehicle.state = VehicleState.EN_ROUTE
+                    vehicle.owner = owner
+                    return vehicle
+            return None
+        return await self._write(op)
+
+    async def claim_vehicle(self, vehicle_id: str) -> Optional[Vehicle]:
+        owner = worker.id
+
+        def op(conn):
+            cur = conn.execute("UPDATE vehicles SET state = ?, owner = ? WHERE vehicle_id = ? AND state IN (?, ?)",
+                               (VehicleState.EN_ROUTE.value, owner, vehicle_id, *_FREE_STATE_VALUES))
+            if cur.rowcount == 0:
+                return None
+            row = conn.execute("SELECT * FROM vehicles WHERE vehicle_id = ?", (vehicle_id,)).fetchone()
+            return self._row_to_vehicle(row)
+        return await self._write(op)
+
+    async def release_vehicle(self, vehicle_id: str, at_node: Optional[str] = None) -> bool:
+        def op(conn):
+            if at_node is None:
+                cur = conn.execute(
+                    "UPDATE vehicles SET state = ?, current_node = garage_node, owner = NULL "
+                    "WHERE vehicle_id = ? AND state = ?",
+                    (VehicleState.IN_GARAGE.value, vehicle_id, VehicleState.EN_ROUTE.value))
+            else:
+                cur = conn.execute(
+                    "UPDATE vehicles SET state = CASE WHEN garage_node = ? THEN ? ELSE ? END, "
+                    "current_node = ?, owner = NULL WHERE vehicle_id = ? AND state = ?",
+                    (at_node, VehicleState.IN_GARAGE.value, VehicleState.IDLE.value,
+                     at_node, vehicle_id, VehicleState.EN_ROUTE.value))
+            return cur.rowcount > 0
+        return await self._write(op)
+
+    async def set_position(self, vehicle_id: str, node: str):
+        def op(conn):
+            conn.execute("UPDATE vehicles SET current_node = ? WHERE vehicle_id = ?", (node, vehicle_id))
+        await self._write(op)
+
+    async def set_vehicle_capacity(self, vehicle_id: str, capacity: Optional[int]) -> bool:
+        def op(conn):
+            cur = conn.execute("UPDATE vehicles SET capacity = ? WHERE vehicle_id = ?", (capacity, vehicle_id))
+            return cur.rowcount > 0
+        return await self._write(op)
+
+    def get_vehicle(self, vehicle_id: str) -> Optional[Vehicle]:
+        row = self._reader.execute("SELECT * FROM vehicles WHERE vehicle_id = ?", (vehicle_id,)).fetchone()
+        return self._row_to_vehicle(row) if row else None
+
+    def list_vehicles(self) -> List[Vehicle]:
+        return [self._row_to_vehicle(row) for row in self._reader.execute("SELECT * FROM vehicles")]
+
+    def list_free_vehicles(self) -> List[Vehicle]:
+        return [self._row_to_vehicle(row) for row in self._reader.execute(
+            "SELECT * FROM vehicles WHERE state IN (?, ?)", _FREE_STATE_VALUES)]
+
+    def counts(self) -> Tuple[int, int, int]:
+        total, free = self._reader.execute(
+            "SELECT COUNT(*), COALESCE(SUM(state IN (?, ?)), 0) FROM vehicles",
+            _FREE_STATE_VALUES).fetchone()
+        (reserved,) = self._reader.execute("SELECT COALESCE(SUM(slots), 0) FROM reserved_slots").fetchone()
+        return total, free, reserved
+
+    # --- сеансы самолётов ---
+
+    @staticmethod
+    def _open_session(conn, aircraft_id: str, is_boarding: bool) -> bool:
+        cur = conn.execute("INSERT OR IGNORE INTO boarding_sessions VALUES (?, ?, 0, ?, NULL)",
+                           (aircraft_id, is_boarding, time.time()))
+        return cur.rowcount > 0
+
+    @staticmethod
+    def _trip_session(conn, trip_id: str) -> Optional[Tuple[str, bool]]:
+        row = conn.execute("SELECT aircraft_id, is_boarding FROM session_trips WHERE trip_id = ?",
+                           (trip_id,)).fetchone()
+        return (row[0], bool(row[1])) if row is not None else None
+
+    @staticmethod
+    def _sessions(conn, where: str = "", args: tuple = ()) -> List[dict]:
+        rows = conn.execute(f"SELECT * FROM boarding_sessions {where}", args).fetchall()
+        if not rows:
+            return []
+        planned = {(a, bool(b)): (n, total) for a, b, n, total in conn.execute(
+            f"SELECT aircraft_id, is_boarding, COUNT(*), SUM(passengers) FROM session_trips {where} "
+            "GROUP BY aircraft_id, is_boarding", args)}
+        vehicles: Dict[Tuple[str, bool], List[str]] = {}
+        condition = f"{where} AND vehicle_id IS NOT NULL" if where else "WHERE vehicle_id IS NOT NULL"
+        for a, b, vehicle_id in conn.execute(
+                f"SELECT aircraft_id, is_boarding, vehicle_id FROM session_trips {condition}", args):
+            vehicles.setdefault((a, bool(b)), []).append(vehicle_id)
+        result = []
+        for aircraft_id, is_boarding, served, created_at, started_at in rows:
+            key = (aircraft_id, bool(is_boarding))
+            trips, passengers = planned.get(key, (0, 0))
+            result.append(_session_dict(aircraft_id, bool(is_boarding), trips, passengers, served,
+                                        vehicles.get(key, []), created_at, started_at))
+        return result
+
+    def _session_row(self, conn, aircraft_id: str, is_boarding: bool) -> dict:
+        return self._sessions(conn, "WHERE aircraft_id = ? AND is_boarding = ?", (aircraft_id, is_boarding))[0]
+
+    async def plan_trip(self, trip_id: str, aircraft_id: str, is_boarding: bool, passenger_count: int) -> str:
+        owner = worker.id
+
+        def op(conn):
+            if self._trip_session(conn, trip_id) is not None:
+                conn.execute("UPDATE session_trips SET passengers = ?, owner = ? WHERE trip_id = ?",
+                             (passenger_count, owner, trip_id))
+                return SessionPlan.UPDATED
+            opened = self._open_session(conn, aircraft_id, is_boarding)
+            conn.execute("INSERT INTO session_trips VALUES (?, ?, ?, ?, ?, NULL)",
+                         (trip_id, aircraft_id, is_boarding, passenger_count, owner))
+            return SessionPlan.OPENED if opened else SessionPlan.JOINED
+        return await self._write(op)
+
+    async def split_trip(self, trip_id: str, part_id: str, passenger_count: int):
+        owner = worker.id
+
+        def op(conn):
+            key = self._trip_session(conn, trip_id)
+            if key is None:
+                return
+            conn.execute("UPDATE session_trips SET passengers = passengers - ? WHERE trip_id = ?",
+                         (passenger_count, trip_id))
+            conn.execute("INSERT OR REPLACE INTO session_trips VALUES (?, ?, ?, ?, ?, NULL)",
+                         (part_id, key[0], key[1], passenger_count, owner))
+        await self._write(op)
+
+    async def arrive_trip(self, trip_id: str, aircraft_id: str, is_boarding: bool, vehicle_id: str,
+                          passenger_count: int) -> Tuple[bool, dict]:
+        owner = worker.id
+
+        def op(conn):
+            key = self._trip_session(conn, trip_id)
+            if key is None:
+                key = (aircraft_id, is_boarding)
+                self._open_session(conn, aircraft_id, is_boarding)
+                conn.execute("INSERT INTO session_trips VALUES (?, ?, ?, ?, ?, NULL)",
+                             (trip_id, aircraft_id, is_boarding, passenger_count, owner))
+            conn.execute("UPDATE session_trips SET vehicle_id = ? WHERE trip_id = ?", (vehicle_id, trip_id))
+            cur = conn.execute("UPDATE boarding_sessions SET started_at = ? "
+                               "WHERE aircraft_id = ? AND is_boarding = ? AND started_at IS NULL",
+                               (time.time(), *key))
+            return cur.rowcount > 0, self._session_row(conn, *key)
+        return await self._write(op)
+
+    async def leave_trip(self, trip_id: str, served: int) -> Optional[Tuple[bool, dict]]:
+        def op(conn):
+            key = self._trip_session(conn, trip_id)
+            if key is None:
+                return None
+            conn.execute("DELETE FROM session_trips WHERE trip_id = ?", (trip_id,))
+            conn.execute("UPDATE boarding_sessions SET served = served + ? WHERE aircraft_id = ? "
+                         "AND is_boarding = ?", (served, *key))
+            session = self._session_row(conn, *key)
+            closed = session["planned_trips"] == 0
+            if closed:
+                conn.execute("DELETE FROM boarding_sessions WHERE aircraft_id = ? AND is_boarding = ?", key)
+            return closed, session
+        return await self._write(op)
+
+    async def start_session(self, aircraft_id: str, is_boarding: bool) -> bool:
+        def op(conn):
+            cur = conn.execute("UPDATE boarding_sessions SET started_at = ? "
+                               "WHERE aircraft_id = ? AND is_boarding = ? AND started_at IS NULL",
+                               (time.time(), aircraft_id, is_boarding))
+            return cur.rowcount > 0
+        return await self._write(op)
+
+    def list_sessions(self, aircraft_id: Optional[str] = None) -> List[dict]:
+        if aircraft_id is None:
+            return self._sessions(self._reader)
+        return self._sessions(self._reader, "WHERE aircraft_id = ?", (aircraft_id,))
+
+    def session_counts(self) -> Tuple[int, int]:
+        total, started = self._reader.execute(
+            "SELECT COUNT(*), COUNT(started_at) FROM boarding_sessions").fetchone()
+        return total, started
+
+    def session_trips(self, owner: str) -> List[str]:
+        return [trip_id for (trip_id,) in self._reader.execute(
+            "SELECT trip_id FROM session_trips WHERE owner = ?", (owner,))]
+
+    # --- настройки ---
+
+    def get_capacity(self) -> int:
+        row = self._reader.execute("SELECT value FROM meta WHERE key = 'capacity'").fetchone()
+        return int(row[0]) if row else self.default_capacity
+
+    async def set_capacity(self, capacity: int):
+        def op(conn):
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('capacity', ?)", (str(capacity),))
+        await self._write(op)
+
+    def close(self):
+        with self._write_lock:
+            for conn in (self._reader_conn, self._writer_conn):
+                if conn is not None:
+                    conn.close()
+            self._reader_conn = None
+            self._writer_conn = None
+
+
+def create_state_store() -> StateStore:
+    backend = config.STATE_BACKEND.lower()
+    if backend == "sqlite":
+        logger.info("Общее состояние: SQLite (%s)", config.STATE_SQLITE_PATH)
+        return SQLiteStateStore(config.STATE_SQLITE_PATH, config.DEFAULT_VEHICLE_CAPACITY)
+    if backend != "memory":
+        raise ValueError(f"Неизвестный TRANSPORTER_STATE_BACKEND: {config.STATE_BACKEND}")
+    return MemoryStateStore(config.DEFAULT_VEHICLE_CAPACITY)
+
+
+state_store = create_state_store()
@@ -1,205 +1,397 @@
-import math
+import time
+import uuid
 import asyncio
 import logging
-from threading import Lock
+from typing import Callable, Dict, Optional
 
-from services.ground_control import (
-    register_vehicle_async,
-    get_route_async,
-    get_permission_async,
-    inform_about_arrival_async
-)
-from services.orchestrator import (
-    start_boarding,
-    finish_boarding,
-    start_unboarding,
-    finish_unboarding
+import config
+
+from services import clock
+from services.ground_control import register_vehicle_async, get_route_async
+from services.fleet import fleet, Vehicle, VehicleState
+from services.aircraft import aircraft_registry
+from services.movement import drive_route, notify_arrival
+from services.retry import RetryBudgetExceeded
+from services.trip_journal import trip_journal, TripStage
+from services.planner import planner
+from services.metrics import (
+    STAGE_REGISTRATION,
+    STAGE_ROUTE_FETCH,
+    STAGE_BOARDING,
+    STAGE_RETURN,
+    TRIPS_TOTAL
 )
 
-# Храним состояние
-vehicle_node_mapping = {}          # { vehicle_id: current_node }
-vehicle_node_mapping_place = {}    # { vehicle_id: { coords: plane_node_id } }
+BOARDING_RATE = 50  # пассажиров/сек посадка и высадка
 
-# Учет состояния самолетов и машин
-aircraft_vehicles = {}             # { aircraft_id: set(vehicle_ids) }
-aircraft_status = {}               # { aircraft_id: {"status": "started/finished", "passenger_count": count} }
+logger = logging.getLogger(__name__)
+audit_logger = logging.getLogger("audit")
 
-# Вместимость по умолчанию
-vehicle_capacity = 400
-SPEED_CAR = 25  # м/с движение
+# Таймеры возврата в гараж машин, ждущих у самолётов: { vehicle_id: Task }
+_idle_returns: Dict[str, asyncio.Task] = {}
 
-lock_object = Lock()
 
-logger = logging.getLogger(__name__)
-audit_logger = logging.getLogger("audit")
+async def register_new_vehicle(vehicle_type: str) -> Optional[Vehicle]:
+    """
+    Регистрирует новую машину в ground-control. Место в парке должно быть
+    заранее зарезервировано через fleet.reserve_slot(); если машина не
+    добавлена в парк (отказ, ошибка, отмена), резерв снимается.
+    """
+    added = False
+    try:
+        started = time.perf_counter()
+        try:
+            reg_resp = await register_vehicle_async(vehicle_type)
+        finally:
+            STAGE_REGISTRATION.observe(time.perf_counter() - started)
+        if not reg_resp:
+            logger.error("Не удалось зарегистрировать новую машину (ответ ground-control).")
+            fleet.registration_rejected()
+            return None
+
+        vehicle = Vehicle(reg_resp.vehicleId, vehicle_type, reg_resp.garrageNodeId, reg_resp.serviceSpots)
+        await fleet.add(vehicle, busy=True)
+        added = True
+    finally:
+        if not added:
+            # shield: при отмене (таймаут подготовки, остановка) резерв всё равно снимется
+            await asyncio.shield(fleet.release_slot())
+    trip_journal.record_vehicle(vehicle.as_dict())
+
+    logger.info("Создана новая машина %s -> гараж %s", vehicle.vehicle_id, vehicle.garage_node)
+    audit_logger.info("Новая машина %s зарегистрирована (всего %d)", vehicle.vehicle_id, fleet.size(),
+                      extra={"vehicle_id": vehicle.vehicle_id})
+    return vehicle
+
 
 async def process_transporter_task(
     aircraft_id: str,
     aircraft_coordinates: str,
     passenger_count: int,
-    is_boarding: bool
-):
+    is_boarding: bool,
+    vehicle: Optional[Vehicle] = None,
+    trip_id: Optional[str] = None
+) -> bool:
     """
-    Одна «поездка»:
-      1) Найти/зарегистрировать машину (макс 6 штук).
+    Одна «поездка» (запускается диспетчером):
+      1) Взять выданную диспетчером машину или зарегистрировать новую
+         (vehicle=None – место в парке уже зарезервировано).
       2) Ехать к самолёту.
       3) Сообщить оркестратору, что мы начали boarding/unboarding.
       4) Подождать нужное время на посадку/высадку (passenger_count / 50).
       5) Сообщить оркестратору, что мы закончили boarding/unboarding.
       6) Вернуться в гараж.
+    Каждый этап отмечается в журнале поездок (services.trip_journal),
+    чтобы после перезапуска продолжить поездку через resume_trip().
+    Возвращает True, если поездку нужно вернуть в очередь диспетчера
+    (исчерпан бюджет повторов к ground-control до начала посадки или
+    ground-control отказал в регистрации новой машины).
     """
     vehicle_type = "bus"
-    vehicle_id = None
-    garage_node = None
-    plane_node = None
-
-    # 1) Ищем свободную машину
-    with lock_object:
-        found = None
-        for vid, node in vehicle_node_mapping.items():
-            if node != "в пути":
-                found = (vid, node)
-                break
-
-        if found:
-            vehicle_id, garage_node = found
-            plane_node = vehicle_node_mapping_place[vehicle_id].get(aircraft_coordinates)
-            vehicle_node_mapping[vehicle_id] = "в пути"
-
-    # Если не нашли, регистрируем новую, но максимум 6
-    if not vehicle_id:
-        with lock_object:
-            if len(vehicle_node_mapping) >= 6:
-                logger.warning("Лимит 6 машин уже достигнут, не регистрируем новую.")
-                return  # Выходим, машину создать нельзя
-
-        reg_resp = await register_vehicle_async(vehicle_type)
-        if not reg_resp:
-            logger.error("Не удалось зарегистрировать новую машину (ответ ground-control).")
-            return
-
-        vehicle_id = reg_resp.vehicleId
-        garage_node = reg_resp.garrageNodeId
-        plane_node = reg_resp.serviceSpots.get(aircraft_coordinates)
+    trip_id = trip_id or uuid.uuid4().hex
 
-        with lock_object:
-            vehicle_node_mapping[vehicle_id] = "в пути"
-            vehicle_node_mapping_place[vehicle_id] = reg_resp.serviceSpots
+    # 1) Машина от диспетчера или новая
+    if vehicle is None:
+        try:
+            vehicle = await register_new_vehicle(vehicle_type)
+        except RetryBudgetExceeded as e:
+            logger.warning("Регистрация машины не удалась: %s. Возвращаем поездку в очередь.", e)
+            TRIPS_TOTAL.labels(result="requeued").inc()
+            return True
+        if vehicle is None:
+            # Поездка ждёт в очереди свободную машину или новой попытки регистрации
+            logger.warning("Ground-control отказал в регистрации машины. Возвращаем поездку в очередь.")
+            TRIPS_TOTAL.labels(result="requeued").inc()
+            return True
 
-        logger.info("Создана новая машина %s -> гараж %s", vehicle_id, garage_node)
-        audit_logger.info("Новая машина %s зарегистрирована (всего %d)", vehicle_id, len(vehicle_node_mapping))
+    vehicle_id = vehicle.vehicle_id
+    plane_node = vehicle.service_spots.get(aircraft_coordinates)
 
     # Проверка, нашли ли мы plane_node
     if not plane_node:
         logger.error("Не можем найти узел самолёта для координат %s", aircraft_coordinates)
-        with lock_object:
-            if vehicle_id in vehicle_node_mapping:
-                vehicle_node_mapping[vehicle_id] = garage_node
-        return
+        await fleet.release(vehicle_id)
+        TRIPS_TOTAL.labels(result="failed").inc()
+        return False
 
-    # 2) Едем к самолёту
-    route = await get_route_async(garage_node, plane_node)
+    trip_journal.checkpoint(trip_id, TripStage.ACQUIRED, vehicle_id=vehicle_id, plane_node=plane_node)
+    return await _guarded(vehicle, trip_id, _run_trip(
+        vehicle, trip_id, aircraft_id, plane_node, passenger_count, is_boarding))
 
-    # +++ Добавить здесь +++
-    if not route:
-        logger.error("[%s] Маршрут не найден. Возвращаем машину в гараж.", vehicle_id)
-        async with lock_object:  # Используем asyncio.Lock вместо threading.Lock
-            vehicle_node_mapping[vehicle_id] = garage_node
+
+async def resume_trip(state: dict) -> bool:
+    """
+    Продолжает поездку из журнала с последнего этапа (после перезапуска).
+    Сегмент, на который ground-control уже дал разрешение, считается
+    пройденным: отправляем /arrived и едем дальше из его конца.
+    Возвращает True, если поездку нужно вернуть в очередь.
+    """
+    trip_id = state["trip_id"]
+    stage = TripStage(state["stage"])
+    aircraft_id = state["aircraft_id"]
+    vehicle = fleet.get(state["vehicle_id"])
+    if vehicle is None:
+        logger.error("Поездка %s: машина %s не найдена в парке", trip_id, state["vehicle_id"])
+        TRIPS_TOTAL.labels(result="failed").inc()
+        return False
+
+    logger.info("[%s] Продолжаем поездку %s с этапа %s", vehicle.vehicle_id, trip_id, stage.value)
+    audit_logger.info("Машина %s: поездка восстановлена (этап %s)", vehicle.vehicle_id, stage.value,
+                      extra={"vehicle_id": vehicle.vehicle_id, "aircraft_id": aircraft_id})
+
+    async def resume() -> bool:
+        heading_to = state.get("heading_to")
+        if heading_to:
+            await notify_arrival(vehicle, heading_to)
+            await fleet.set_position(vehicle, heading_to)
+        elif state.get("node"):
+            await fleet.set_position(vehicle, state["node"])
+
+        if stage == TripStage.RETURNING:
+            outcome = state.get("outcome", "completed")
+            await _return_to_garage(vehicle, trip_id, outcome)
+            TRIPS_TOTAL.labels(result=outcome).inc()
+            return outcome == "requeued"
+        if stage == TripStage.BOARDING:
+            return await _serve_aircraft(vehicle, trip_id, aircraft_id, state["passenger_count"],
+                                         state["is_boarding"], resumed_from=state["boarding_started_at"])
+        return await _run_trip(vehicle, trip_id, aircraft_id, state["plane_node"],
+                               state["passenger_count"], state["is_boarding"])
+
+    return await _guarded(vehicle, trip_id, resume())
+
+
+async def _guarded(vehicle: Vehicle, trip_id: str, trip) -> bool:
+    try:
+        return await trip
+    except Exception:
+        # Поездка не должна «терять» машину: возвращаем её в пул
+        logger.exception("[%s] Поездка прервана ошибкой. Возвращаем машину в гараж.", vehicle.vehicle_id)
+        aircraft_registry.drop(trip_id)
+        await fleet.release(vehicle.vehicle_id)
+        TRIPS_TOTAL.labels(result="failed").inc()
+        return False
+
+
+def _segment_checkpoint(trip_id: str, stage: TripStage) -> Callable[[str, str], None]:
+    def on_segment(node: str, heading_to: str):
+        trip_journal.checkpoint(trip_id, stage, node=node, heading_to=heading_to)
+    return on_segment
+
+
+def _position_checkpoint(vehicle: Vehicle) -> Callable[[str, str], None]:
+    """
+    Для перегона без поездки: после перезапуска машина считается
+    свободной в конце сегмента, на который получено разрешение.
+    """
+    def on_segment(node: str, heading_to: str):
+        trip_journal.record_vehicle(dict(vehicle.as_dict(), state=VehicleState.IDLE.value,
+                                         current_node=heading_to))
+    return on_segment
+
+
+def schedule_idle_return(vehicle_id: str, node: str):
+    """
+    Отправит машину, ждущую на узле node, в гараж, если за
+    VEHICLE_IDLE_RETURN_SEC её не заберёт следующая поездка.
+    """
+    previous = _idle_returns.pop(vehicle_id, None)
+    if previous is not None and previous is not asyncio.current_task():
+        previous.cancel()
+    task = asyncio.create_task(_return_when_idle(vehicle_id, node))
+    _idle_returns[vehicle_id] = task
+
+    def _cleanup(t: asyncio.Task):
+        if _idle_returns.get(vehicle_id) is t:
+            del _idle_returns[vehicle_id]
+    task.add_done_callback(_cleanup)
+
+
+async def stop_idle_returns():
+    tasks = list(_idle_returns.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _return_when_idle(vehicle_id: str, node: str):
+    await clock.sleep(config.VEHICLE_IDLE_RETURN_SEC)
+    current = fleet.get(vehicle_id)
+    if current is None or current.state != VehicleState.IDLE or current.current_node != node:
         return
+    vehicle = await fleet.claim(vehicle_id)
+    if vehicle is None:
+        # Машину только что забрала поездка (или другой воркер)
+        return
+    logger.info("[%s] Простаивает у %s дольше %.0f сек, возвращается в гараж",
+                vehicle_id, node, config.VEHICLE_IDLE_RETURN_SEC)
+    try:
+        if not await _return_to_garage(vehicle):
+            return
+    except Exception:
+        logger.exception("[%s] Ошибка при возврате в гараж", vehicle_id)
+    audit_logger.info("Машина %s вернулась в гараж после простоя", vehicle_id,
+                      extra={"vehicle_id": vehicle_id})
+
 
-    if route:
-        logger.info("[%s] Маршрут к самолёту: %s", vehicle_id, route)
-        audit_logger.info("Машина %s -> к самолёту %s", vehicle_id, route)
-        for i in range(len(route) - 1):
-            dist = await get_permission_async(vehicle_id, vehicle_type, route[i], route[i + 1])
-            if dist:
-                logger.info("[%s] Едет %s -> %s (%.2f м)", vehicle_id, route[i], route[i+1], dist)
-                travel_time = dist / SPEED_CAR
-                await asyncio.sleep(math.ceil(travel_time))
-                await inform_about_arrival_async(vehicle_id, vehicle_type, route[i + 1])
+async def _park(vehicle: Vehicle):
+    """
+    Оставляет машину свободной у самолёта (цепочка поездок): диспетчер может
+    сразу отправить её к следующему самолёту.
+    """
+    node = vehicle.current_node
+    await fleet.release(vehicle.vehicle_id, at_node=node)
+    if node != vehicle.garage_node:
+        schedule_idle_return(vehicle.vehicle_id, node)
+
+
+async def _return_to_garage(vehicle: Vehicle, trip_id: Optional[str] = None, outcome: str = "completed") -> bool:
+    """
+    Отгоняет машину из текущего узла в её гараж и возвращает в пул свободных.
+    Если машина не доехала (нет маршрута, ground-control недоступен,
+    /move отказал), она остаётся свободной там, где остановилась, и поедет
+    в гараж позже, как простаивающая.
+    outcome – итог поездки для журнала (completed/failed/requeued);
+    trip_id=None – перегон простаивающей машины вне поездки.
+    Возвращает True, если машина доехала.
+    """
+    vehicle_id = vehicle.vehicle_id
+    arrived = vehicle.current_node == vehicle.garage_node
+    # Длительности этапов – по часам поездок, как и время в пути (movement)
+    started = clock.monotonic()
+    if trip_id is not None:
+        trip_journal.checkpoint(trip_id, TripStage.RETURNING, node=vehicle.current_node,
+                                heading_to=None, outcome=outcome)
+        on_segment = _segment_checkpoint(trip_id, TripStage.RETURNING)
     else:
-        logger.warning("[%s] Не смогли получить маршрут до самолёта.", vehicle_id)
-
-    # 3) Сообщаем оркестратору, что мы начали boarding или unboarding
-    # Добавляем машину в список обслуживающих этот самолет
-    is_first_vehicle = False
-    with lock_object:
-        if aircraft_id not in aircraft_vehicles:
-            aircraft_vehicles[aircraft_id] = set()
-            aircraft_status[aircraft_id] = {"status": "none", "passenger_count": 0}
-            is_first_vehicle = True
-        
-        aircraft_vehicles[aircraft_id].add(vehicle_id)
-        aircraft_status[aircraft_id]["passenger_count"] += passenger_count
-        
-    # Только первая машина отправляет уведомление о начале
-    if is_first_vehicle:
-        if is_boarding:
-            await start_boarding(aircraft_id)
-            logger.info("Начинаем посадку пассажиров (aircraft=%s)", aircraft_id)
-            with lock_object:
-                aircraft_status[aircraft_id]["status"] = "boarding"
+        on_segment = _position_checkpoint(vehicle)
+    try:
+        if not arrived:
+            route_back = await get_route_async(vehicle.current_node, vehicle.garage_node, vehicle.vehicle_type)
+            if not route_back:
+                logger.error("[%s] Обратный маршрут не найден. Машина остаётся у %s.",
+                             vehicle_id, vehicle.current_node)
+            else:
+                logger.info("[%s] Маршрут обратно: %s", vehicle_id, route_back)
+                arrived = await drive_route(vehicle, route_back, on_segment)
+                if arrived:
+                    planner.matrix.observe_route(route_back)
+    except RetryBudgetExceeded as e:
+        logger.warning("[%s] Обратный путь прерван: %s", vehicle_id, e)
+    finally:
+        if arrived or vehicle.current_node == vehicle.garage_node:
+            await fleet.release(vehicle_id)
         else:
-            await start_unboarding(aircraft_id)
-            logger.info("Начинаем высадку пассажиров (aircraft=%s)", aircraft_id)
-            with lock_object:
-                aircraft_status[aircraft_id]["status"] = "unboarding"
+            await fleet.release(vehicle_id, at_node=vehicle.current_node)
+            schedule_idle_return(vehicle_id, vehicle.current_node)
+        STAGE_RETURN.observe(clock.monotonic() - started)
+    return arrived
+
+
+async def _run_trip(
+    vehicle: Vehicle,
+    trip_id: str,
+    aircraft_id: str,
+    plane_node: str,
+    passenger_count: int,
+    is_boarding: bool
+) -> bool:
+    """
+    Шаги 2–6 поездки для уже закреплённой за ней машины: едем из текущего
+    узла машины к самолёту и обслуживаем его.
+    Возвращает True, если поездку нужно вернуть в очередь.
+    """
+    vehicle_id = vehicle.vehicle_id
+    vehicle_type = vehicle.vehicle_type
+
+    # 2) Едем к самолёту
+    try:
+        if vehicle.current_node != plane_node:
+            trip_journal.checkpoint(trip_id, TripStage.ROUTING, node=vehicle.current_node, heading_to=None)
+            started = time.perf_counter()
+            route = await get_route_async(vehicle.current_node, plane_node, vehicle_type)
+            STAGE_ROUTE_FETCH.observe(time.perf_counter() - started)
+
+            if not route:
+                logger.error("[%s] Маршрут не найден. Возвращаем машину в гараж.", vehicle_id)
+                await _return_to_garage(vehicle, trip_id, "failed")
+                TRIPS_TOTAL.labels(result="failed").inc()
+                return False
+
+            logger.info("[%s] Маршрут к самолёту: %s", vehicle_id, route)
+            audit_logger.info("Машина %s -> к самолёту %s", vehicle_id, route,
+                              extra={"vehicle_id": vehicle_id, "aircraft_id": aircraft_id})
+            if not await drive_route(vehicle, route, _segment_checkpoint(trip_id, TripStage.DRIVING)):
+                logger.error("[%s] Не доехали до самолёта. Возвращаем машину в гараж.", vehicle_id)
+                await _return_to_garage(vehicle, trip_id, "failed")
+                TRIPS_TOTAL.labels(result="failed").inc()
+                return False
+            planner.matrix.observe_route(route)
+    except RetryBudgetExceeded as e:
+        # ground-control перегружен: машину домой, поездку – обратно диспетчеру
+        logger.warning("[%s] %s. Возвращаем поездку в очередь.", vehicle_id, e)
+        await _return_to_garage(vehicle, trip_id, "requeued")
+        TRIPS_TOTAL.labels(result="requeued").inc()
+        return True
+
+    return await _serve_aircraft(vehicle, trip_id, aircraft_id, passenger_count, is_boarding)
+
+
+async def _serve_aircraft(
+    vehicle: Vehicle,
+    trip_id: str,
+    aircraft_id: str,
+    passenger_count: int,
+    is_boarding: bool,
+    resumed_from: Optional[float] = None
+) -> bool:
+    """
+    Шаги 3–6: посадка/высадка у самолёта и возврат в гараж.
+    resumed_from – время начала посадки (clock.time()) для поездки,
+    восстановленной из журнала: машина уже учтена в сеансе самолёта
+    (aircraft_registry.restore), ждём только оставшееся время.
+    """
+    vehicle_id = vehicle.vehicle_id
+    boarding_started = clock.monotonic()
+    operation_time = passenger_count / BOARDING_RATE
+
+    if resumed_from is None:
+        # 3) Сообщаем оркестратору, что мы начали boarding или unboarding –
+        # один раз на сеанс самолёта (services/aircraft.py)
+        is_first_vehicle = await aircraft_registry.arrive(trip_id, aircraft_id, is_boarding,
+                                                          vehicle_id, passenger_count)
+        if not is_first_vehicle:
+            logger.info("[%s] Присоединяется к %s самолета %s",
+                       vehicle_id, "посадке" if is_boarding else "высадке", aircraft_id)
+        resumed_from = clock.time()
+        trip_journal.checkpoint(trip_id, TripStage.BOARDING, node=vehicle.current_node, heading_to=None,
+                                boarding_started_at=resumed_from, start_sent=is_first_vehicle or None)
     else:
-        logger.info("[%s] Присоединяется к %s самолета %s", 
-                   vehicle_id, "посадке" if is_boarding else "высадке", aircraft_id)
+        # Часть времени посадки прошла до перезапуска
+        operation_time = max(0.0, operation_time - clock.since(resumed_from))
 
-    # 4) Время посадки/высадки = passenger_count / 50 пассажиров/сек (без округления)
-    operation_time = passenger_count / 50
-    logger.info("Требуется %.2f сек на %s %d пассажиров", operation_time, 
+    # 4) Время посадки/высадки = passenger_count / BOARDING_RATE (без округления)
+    logger.info("Требуется %.2f сек на %s %d пассажиров", operation_time,
                 ("посадку" if is_boarding else "высадку"), passenger_count)
-    await asyncio.sleep(operation_time)
-
-    # 5) Сообщаем оркестратору, что закончили boarding/unboarding
-    is_last_vehicle = False
-    with lock_object:
-        # Удаляем машину из списка обслуживающих этот самолет
-        if aircraft_id in aircraft_vehicles:
-            aircraft_vehicles[aircraft_id].remove(vehicle_id)
-            # Если это последняя машина, отправляем уведомление о завершении
-            if not aircraft_vehicles[aircraft_id]:
-                is_last_vehicle = True
-                total_passengers = aircraft_status[aircraft_id]["passenger_count"]
-                # Очищаем данные по самолету
-                del aircraft_vehicles[aircraft_id]
-                del aircraft_status[aircraft_id]
-
-    if is_last_vehicle:
-        if is_boarding:
-            await finish_boarding(aircraft_id, total_passengers)
-            logger.info("Завершили посадку (aircraft=%s, %d пассажиров)", aircraft_id, total_passengers)
-        else:
-            await finish_unboarding(aircraft_id, total_passengers)
-            logger.info("Завершили высадку (aircraft=%s, %d пассажиров)", aircraft_id, total_passengers)
-    else:
-        logger.info("[%s] Завершил свою часть %s для самолета %s", 
-                   vehicle_id, "посадки" if is_boarding else "высадки", aircraft_id)
+    await clock.sleep(operation_time)
 
-    # 6) Возвращаемся в гараж
-    route_back = await get_route_async(plane_node, garage_node)
+    # 5) Сообщаем оркестратору, что закончили boarding/unboarding – когда
+    # обслужены все запланированные поездки сеанса
+    is_last_vehicle, _ = await aircraft_registry.depart(trip_id, passenger_count)
+    if not is_last_vehicle:
+        logger.info("[%s] Завершил свою часть %s для самолета %s",
+                   vehicle_id, "посадки" if is_boarding else "высадки", aircraft_id)
 
-    if not route_back:
-        logger.error("[%s] Обратный маршрут не найден. Возвращаем машину в гараж.", vehicle_id)
-        async with lock_object:
-            vehicle_node_mapping[vehicle_id] = garage_node
-        return
+    STAGE_BOARDING.observe(clock.monotonic() - boarding_started)
 
-    if route_back:
-        logger.info("[%s] Маршрут обратно: %s", vehicle_id, route_back)
-        for i in range(len(route_back) - 1):
-            dist = await get_permission_async(vehicle_id, vehicle_type, route_back[i], route_back[i + 1])
-            if dist:
-                travel_time = dist / SPEED_CAR
-                await asyncio.sleep(math.ceil(travel_time))
-                await inform_about_arrival_async(vehicle_id, vehicle_type, route_back[i + 1])
-
-        with lock_object:
-            vehicle_node_mapping[vehicle_id] = garage_node
-        logger.info("Машина %s вернулась в гараж %s", vehicle_id, garage_node)
-        audit_logger.info("Машина %s свободна", vehicle_id)
+    # 6) Возвращаемся в гараж – или ждём у самолёта следующую поездку
+    if config.VEHICLE_CHAINING:
+        await _park(vehicle)
+        logger.info("Машина %s свободна у узла %s", vehicle_id, vehicle.current_node)
     else:
-        logger.warning("[%s] Не смогли получить маршрут обратно в гараж.", vehicle_id)
+        await _return_to_garage(vehicle, trip_id, "completed")
+        logger.info("Машина %s вернулась в гараж %s", vehicle_id, vehicle.garage_node)
+    audit_logger.info("Машина %s свободна", vehicle_id,
+                      extra={"vehicle_id": vehicle_id, "aircraft_id": aircraft_id})
+    TRIPS_TOTAL.labels(result="completed").inc()
+    return False
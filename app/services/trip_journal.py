@@ -0,0 +1,256 @@
+# app/services/trip_journal.py
+#
+# Журнал поездок для восстановления после перезапуска. Каждая поездка –
+# конечный автомат: queued -> acquired -> routing -> driving (сегмент k)
+# -> boarding -> returning -> done. Переходы дописываются в файл JSON lines,
+# зарегистрированные машины – туда же.
+#
+# В памяти держится последнее состояние активных поездок, поэтому сжатие
+# (перезапись файла только с активными поездками и машинами) не читает
+# журнал заново. Журнал сжимается каждые TRIP_JOURNAL_COMPACT_EVERY записей
+# и при остановке, так что время старта зависит от числа активных поездок,
+# а не от того, сколько поездок было выполнено.
+#
+# Запись синхронная (write + flush): контрольная точка оказывается в ОС
+# раньше, чем поездка сделает следующий внешний вызов, и падение процесса
+# её не теряет. Строка журнала – сотни байт, поэтому запись дешевле
+# передачи в поток. Сжатие во время работы (новый файл + fsync) идёт
+# в отдельном потоке; записи, сделанные за это время, пишутся и в старый
+# файл, и в конец нового перед подменой.
+#
+# Файл у каждого воркера свой (services/worker.py, path_for): воркер 0
+# пишет в TRIP_JOURNAL_PATH, воркер n – в trip_journal.n.jsonl.
+
+import os
+import json
+import time
+import asyncio
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from enum import Enum
+from typing import Callable, Dict, List, Optional, Tuple
+
+import config
+from services.worker import worker
+
+logger = logging.getLogger(__name__)
+
+
+class TripStage(str, Enum):
+    QUEUED = "queued"          # в очереди диспетчера
+    ACQUIRED = "acquired"      # машина выделена, в гараже
+    ROUTING = "routing"        # запрашиваем маршрут к самолёту
+    DRIVING = "driving"        # едем к самолёту (node -> heading_to)
+    BOARDING = "boarding"      # посадка/высадка у самолёта
+    RETURNING = "returning"    # возврат в гараж (node -> heading_to)
+    DONE = "done"              # поездка завершена (удачно или нет)
+
+
+class TripJournal:
+    def __init__(self, path: str, compact_every: int, fsync: bool = False):
+        self.base_path = path
+        self.path = path                       # файл этого воркера (open)
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self._trips: Dict[str, dict] = {}      # { trip_id: последнее состояние }
+        self._vehicles: Dict[str, dict] = {}   # { vehicle_id: Vehicle.as_dict() }
+        self._file = None
+        self._records = 0                      # записей в файле
+        # Сжатие в потоке: задача и строки, записанные, пока оно идёт
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._compaction: Optional[Future] = None
+        self._tail: List[str] = []
+        self._listeners: List[Callable[[str, TripStage, dict], None]] = []
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def open(self) -> Tuple[List[dict], List[dict]]:
+        """
+        Читает журнал и сразу сжимает его.
+        Возвращает (активные поездки, известные машины).
+        """
+        if not self.enabled or self._file is not None:
+            return list(self._trips.values()), list(self._vehicles.values())
+        self.path = worker.path_for(self.base_path)
+        self._trips.clear()
+        self._vehicles.clear()
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Недописанная последняя строка после падения
+                        logger.warning("Пропущена повреждённая запись журнала поездок")
+                        continue
+                    self._apply(record)
+        self._compact()
+        logger.info("Журнал поездок %s: активных поездок %d, машин %d",
+                    self.path, len(self._trips), len(self._vehicles))
+        return list(self._trips.values()), list(self._vehicles.values())
+
+    def close(self):
+        if self._file is None:
+            return
+        compaction, self._compaction = self._compaction, None
+        if compaction is not None:
+            # Недописанный в потоке файл не нужен: сжимаем заново, целиком
+            compaction.exception()
+        self._compact()
+        self._file.close()
+        self._file = None
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def subscribe(self, callback: Callable[[str, TripStage, dict], None]):
+        """
+        callback(trip_id, stage, fields) вызывается на каждой контрольной
+        точке, в том числе при выключенном журнале (учёт запросов, services/jobs).
+        """
+        self._listeners.append(callback)
+
+    # --- запись ---
+
+    def checkpoint(self, trip_id: str, stage: TripStage, **fields):
+        """
+        Переход поездки в stage. fields дополняют сохранённое состояние
+        (значение None удаляет поле).
+        """
+        for callback in self._listeners:
+            try:
+                callback(trip_id, stage, fields)
+            except Exception:
+                logger.exception("Ошибка в обработчике контрольной точки поездки %s", trip_id)
+        if not self.enabled:
+            return
+        record = {"trip_id": trip_id, "stage": stage.value, **fields}
+        self._apply(record)
+        self._append(record)
+
+    def record_vehicle(self, vehicle: dict):
+        if not self.enabled:
+            return
+        record = {"vehicle": vehicle}
+        self._apply(record)
+        self._append(record)
+
+    def active_trips(self) -> List[dict]:
+        return list(self._trips.values())
+
+    # --- внутреннее ---
+
+    def _apply(self, record: dict):
+        vehicle = record.get("vehicle")
+        if vehicle is not None:
+            self._vehicles[vehicle["vehicle_id"]] = vehicle
+            return
+        trip_id = record["trip_id"]
+        if record["stage"] == TripStage.DONE.value:
+            self._trips.pop(trip_id, None)
+            return
+        if record["stage"] == TripStage.QUEUED.value:
+            # Возврат в очередь начинает поездку заново
+            self._trips.pop(trip_id, None)
+        state = self._trips.setdefault(trip_id, {})
+        for key, value in record.items():
+            if value is None:
+                state.pop(key, None)
+            else:
+                state[key] = value
+        state["updated_at"] = record.get("updated_at", time.time())
+
+    @staticmethod
+    def _encode(record: dict) -> str:
+        return json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+    def _append(self, record: dict):
+        if self._file is None:
+            return
+        record.setdefault("updated_at", time.time())
+        line = self._encode(record)
+        self._file.write(line)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._records += 1
+        if self._compaction is not None:
+            self._tail.append(line)
+        elif self._records >= max(self.compact_every, 2 * (len(self._trips) + len(self._vehicles))):
+            self._compact_in_background()
+
+    def _snapshot(self) -> List[dict]:
+        # Копии: состояние поездок меняется, пока поток пишет файл
+        return [{"vehicle": dict(vehicle)} for vehicle in self._vehicles.values()] + \
+               [dict(state) for state in self._trips.values()]
+
+    def _write_tmp(self, records: List[dict]) -> str:
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(self._encode(record))
+            f.flush()
+            os.fsync(f.fileno())
+        return tmp_path
+
+    def _compact(self):
+        """
+        Перезаписывает журнал: одна строка на машину и на активную поездку.
+        Новый файл подменяет старый атомарно (os.replace). Синхронно –
+        при открытии и закрытии журнала.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        records = self._snapshot()
+        os.replace(self._write_tmp(records), self.path)
+        self._records = len(records)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _compact_in_background(self):
+        """
+        Сжатие во время работы: новый файл пишется и синхронизируется
+        в потоке, подмена – в event loop (_finish_compaction).
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._compact()
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trip-journal")
+        records = self._snapshot()
+        self._tail = []
+        compaction = self._compaction = self._executor.submit(self._write_tmp, records)
+        compaction.add_done_callback(
+            lambda f: loop.call_soon_threadsafe(self._finish_compaction, f, len(records)))
+
+    def _finish_compaction(self, compaction: Future, written: int):
+        if compaction is not self._compaction:
+            return   # журнал закрыт, пока шло сжатие
+        self._compaction = None
+        tail, self._tail = self._tail, []
+        error = compaction.exception()
+        if error is not None:
+            logger.error("Не удалось сжать журнал поездок %s: %s", self.path, error)
+            return
+        tmp_path = compaction.result()
+        # Записи, сделанные за время сжатия, – в конец нового файла
+        with open(tmp_path, "a", encoding="utf-8") as f:
+            f.write("".join(tail))
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._file.close()
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._records = written + len(tail)
+
+
+trip_journal = TripJournal(
+    config.TRIP_JOURNAL_PATH,
+    compact_every=config.TRIP_JOURNAL_COMPACT_EVERY,
+    fsync=config.TRIP_JOURNAL_FSYNC,
+)
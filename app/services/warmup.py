@@ -0,0 +1,132 @@
+# app/services/warmup.py
+#
+# Подготовка к работе при старте (main.lifespan), в фоне:
+#   1) парк доводится до WARMUP_FLEET_SIZE машин – регистрации в
+#      ground-control идут параллельно, а не по одной внутри первых поездок;
+#   2) маршруты от гаража каждой машины до её serviceSpots запрашиваются
+#      заранее и попадают в кэш маршрутов (services/route_cache.py).
+# Пока подготовка не закончилась, GET /ready отвечает 503, и балансировщик
+# не отправляет сервису запросы. Ошибки подготовки не мешают работе: машины
+# и маршруты, которые не удалось получить заранее, запрашиваются как раньше,
+# в поездках.
+
+import time
+import asyncio
+import logging
+from typing import List, Optional
+
+import config
+from services.fleet import fleet, FleetRegistry, Vehicle
+from services.ground_control import get_route_async
+from services.retry import RetryBudgetExceeded
+from services.tasks import register_new_vehicle
+
+logger = logging.getLogger(__name__)
+
+
+class WarmupStatus:
+    PENDING = "pending"
+    RUNNING = "running"
+    READY = "ready"
+
+
+class Warmup:
+    def __init__(self, fleet_registry: FleetRegistry, fleet_size: int, warm_routes: bool, timeout: float):
+        self.fleet = fleet_registry
+        self.fleet_size = fleet_size
+        self.warm_routes = warm_routes
+        self.timeout = timeout
+        self.status = WarmupStatus.PENDING
+        self.registered = 0
+        self.routes = 0
+        self.errors: List[str] = []
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status == WarmupStatus.READY
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def run(self):
+        self.status = WarmupStatus.RUNNING
+        self.started_at = time.time()
+        try:
+            await asyncio.wait_for(self._warm(), self.timeout)
+        except asyncio.TimeoutError:
+            self.errors.append(f"не уложились в {self.timeout:.0f} сек")
+            logger.warning("Подготовка при старте прервана по таймауту (%.0f сек)", self.timeout)
+        except Exception as e:
+            # Подготовка необязательна: ошибка не должна держать /ready в 503
+            self.errors.append(f"{type(e).__name__}: {e}")
+            logger.exception("Ошибка подготовки при старте")
+        finally:
+            self.finished_at = time.time()
+            self.status = WarmupStatus.READY
+        logger.info("Сервис готов: зарегистрировано машин %d, маршрутов в кэше %d (%.2f сек)",
+                    self.registered, self.routes, self.finished_at - self.started_at)
+
+    async def _warm(self):
+        missing = min(self.fleet_size, self.fleet.max_size) - self.fleet.size()
+        if missing > 0:
+            logger.info("Регистрируем %d машин заранее", missing)
+            await asyncio.gather(*(self._register() for _ in range(missing)))
+        if self.warm_routes:
+            pairs = {(vehicle.garage_node, spot, vehicle.vehicle_type)
+                     for vehicle in self.fleet.vehicles() for spot in vehicle.service_spots.values()}
+            await asyncio.gather(*(self._fetch_route(*pair) for pair in sorted(pairs)))
+
+    async def _register(self):
+        if not await self.fleet.reserve_slot():
+            return
+        try:
+            vehicle: Optional[Vehicle] = await register_new_vehicle("bus")
+        except RetryBudgetExceeded as e:
+            self.errors.append(str(e))
+            return
+        if vehicle is None:
+            self.errors.append("регистрация машины отклонена")
+            return
+        # Новая машина ждёт в гараже первую поездку
+        await self.fleet.release(vehicle.vehicle_id)
+        self.registered += 1
+
+    async def _fetch_route(self, garage_node: str, spot: str, vehicle_type: str):
+        try:
+            route = await get_route_async(garage_node, spot, vehicle_type)
+        except RetryBudgetExceeded as e:
+            self.errors.append(str(e))
+            return
+        if route:
+            self.routes += 1
+        else:
+            self.errors.append(f"нет маршрута {garage_node} -> {spot}")
+
+    def as_dict(self) -> dict:
+        return {
+            "status": self.status,
+            "fleet_size": self.fleet.size(),
+            "fleet_target": min(self.fleet_size, self.fleet.max_size),
+            "registered": self.registered,
+            "routes_cached": self.routes,
+            "errors": self.errors[-20:],
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+warmup = Warmup(
+    fleet,
+    fleet_size=config.WARMUP_FLEET_SIZE,
+    warm_routes=config.WARMUP_ROUTES,
+    timeout=config.WARMUP_TIMEOUT,
+)
@@ -0,0 +1,120 @@
+# app/services/worker.py
+#
+# Номер воркера среди процессов сервиса на одной машине (uvicorn --workers N
+# с общим SQLite, services/state_store.py). Номер – «слот»: воркер при
+# старте берёт первый свободный файл блокировки
+# TRANSPORTER_WORKER_LOCK_DIR/transporter-worker-<n>.lock (fcntl.flock).
+# Блокировку держит ОС, пока жив процесс, и снимает её сама, если он упал:
+#   * у живых воркеров номера разные, поэтому и файлы (журнал поездок,
+#     исходящие уведомления, path_for) у них свои;
+#   * перезапущенный после падения воркер получает освободившийся номер
+#     и продолжает поездки из журнала упавшего;
+#   * захваченные машины помечаются номером воркера (owner в хранилище),
+#     и alive(owner) говорит, жив ли их владелец.
+# TRANSPORTER_WORKER_ID задаёт номер явно (например, один воркер на
+# контейнер); если он уже занят живым процессом – ошибка при старте.
+
+import os
+import logging
+from typing import Optional
+
+import config
+
+try:
+    import fcntl
+except ImportError:  # не Unix: блокировок нет, процесс считается единственным
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Больше воркеров на одной машине не бывает
+_MAX_SLOTS = 1024
+
+
+class WorkerBusy(Exception):
+    """Номер воркера (TRANSPORTER_WORKER_ID) уже занят живым процессом."""
+
+
+class WorkerSlot:
+    def __init__(self, lock_dir: str, worker_id: str = ""):
+        self.lock_dir = lock_dir
+        self.requested_id = worker_id
+        self.id: Optional[str] = None
+        self._fd: Optional[int] = None
+
+    def _lock_path(self, worker_id: str) -> str:
+        return os.path.join(self.lock_dir, f"transporter-worker-{worker_id}.lock")
+
+    def _try_lock(self, worker_id: str) -> Optional[int]:
+        fd = os.open(self._lock_path(worker_id), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    def start(self) -> str:
+        """
+        Занимает номер (при старте приложения, до открытия журнала поездок).
+        """
+        if self.id is not None:
+            return self.id
+        if fcntl is None:
+            self.id = self.requested_id or "0"
+            return self.id
+        os.makedirs(self.lock_dir, exist_ok=True)
+        if self.requested_id:
+            self._fd = self._try_lock(self.requested_id)
+            if self._fd is None:
+                raise WorkerBusy(f"Номер воркера {self.requested_id} уже занят другим процессом")
+            self.id = self.requested_id
+        else:
+            for slot in range(_MAX_SLOTS):
+                self._fd = self._try_lock(str(slot))
+                if self._fd is not None:
+                    self.id = str(slot)
+                    break
+            else:
+                raise WorkerBusy(f"Все {_MAX_SLOTS} номеров воркеров заняты")
+        logger.info("Номер воркера: %s (pid %d)", self.id, os.getpid())
+        return self.id
+
+    def stop(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self.id = None
+
+    def alive(self, worker_id: Optional[str]) -> bool:
+        """
+        Жив ли воркер worker_id (держит ли кто-то его блокировку).
+        """
+        if worker_id is None or worker_id == self.id or fcntl is None:
+            return worker_id is not None
+        try:
+            fd = os.open(self._lock_path(worker_id), os.O_RDWR)
+        except FileNotFoundError:
+            return False
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        finally:
+            # Закрытие снимает и нашу пробную блокировку
+            os.close(fd)
+        return False
+
+    def path_for(self, path: str) -> str:
+        """
+        Свой файл воркера: у воркера 0 – сам path (как у единственного
+        процесса), у остальных – с номером перед расширением
+        (trip_journal.jsonl -> trip_journal.2.jsonl).
+        """
+        if not path or self.id in (None, "0"):
+            return path
+        root, ext = os.path.splitext(path)
+        return f"{root}.{self.id}{ext}"
+
+
+worker = WorkerSlot(config.WORKER_LOCK_DIR, config.WORKER_ID)
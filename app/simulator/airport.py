@@ -0,0 +1,327 @@
+# app/simulator/airport.py
+#
+# Симулятор ground-control и оркестратора: нагрузочные прогоны и проверка
+# изменений без ground-control.reaport.ru и orchestrator.reaport.ru.
+#
+# Граф аэропорта – сетка дорог width x height (ребро edge_length метров),
+# к узлам сетки подключены гаражи и стоянки самолётов. Полоса дороги
+# (ребро в одном направлении) вмещает lane_capacity машин: /move на
+# заполненную полосу отвечает 409, как настоящий ground-control. Встречные
+# машины едут по разным полосам и не запирают друг друга. Подъезды к
+# гаражам и стоянкам вмещают сколько угодно машин. Машина занимает
+# последнюю полосу, на которую получила разрешение.
+#
+# Отдельным процессом:
+#   python -m simulator.airport --port 9000
+#   TRANSPORTER_GROUND_CONTROL_URL=http://localhost:9000 \
+#   TRANSPORTER_ORCHESTRATOR_URL=http://localhost:9000 uvicorn main:app
+# В одном процессе с сервисом – см. simulator/loadgen.py; без FastAPI,
+# прямо в транспорте httpx (mock_transport) – см. simulator/bench.py.
+
+import json
+import time
+import heapq
+import random
+import asyncio
+import argparse
+import itertools
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import httpx
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+
+
+class AirportGraph:
+    """
+    Граф аэропорта. Самолёт на стоянке k имеет координаты aircraft-k,
+    машины обслуживают его с узла stand-k.
+    """
+
+    def __init__(self, width: int = 8, height: int = 8, garages: int = 2, stands: int = 16,
+                 edge_length: float = 100.0, seed: int = 0):
+        rng = random.Random(seed)
+        self.adjacency: Dict[str, Dict[str, float]] = {}
+        for x, y in itertools.product(range(width), range(height)):
+            if x + 1 < width:
+                self._connect(f"road-{x}-{y}", f"road-{x + 1}-{y}", edge_length)
+            if y + 1 < height:
+                self._connect(f"road-{x}-{y}", f"road-{x}-{y + 1}", edge_length)
+        roads = list(self.adjacency) or ["road-0-0"]
+        self.adjacency.setdefault("road-0-0", {})
+
+        self.garages = [f"garage-{i}" for i in range(garages)]
+        self.stands = [f"stand-{k}" for k in range(stands)]
+        attach = rng.sample(roads, min(len(roads), garages + stands))
+        for i, node in enumerate(self.garages + self.stands):
+            self._connect(node, attach[i % len(attach)], edge_length / 2)
+        self.service_spots = {f"aircraft-{k}": stand for k, stand in enumerate(self.stands)}
+        self._routes: Dict[tuple, Optional[List[str]]] = {}
+
+    def _connect(self, a: str, b: str, length: float):
+        self.adjacency.setdefault(a, {})[b] = length
+        self.adjacency.setdefault(b, {})[a] = length
+
+    def is_road(self, node: str) -> bool:
+        return node.startswith("road-")
+
+    def route(self, _from: str, _to: str) -> Optional[List[str]]:
+        """
+        Кратчайший маршрут (Дейкстра), с кэшем.
+        """
+        key = (_from, _to)
+        if key in self._routes:
+            return self._routes[key]
+        if _from not in self.adjacency or _to not in self.adjacency:
+            return None
+        dist = {_from: 0.0}
+        prev: Dict[str, str] = {}
+        heap = [(0.0, _from)]
+        while heap:
+            d, node = heapq.heappop(heap)
+            if node == _to:
+                break
+            if d > dist[node]:
+                continue
+            for neighbour, length in self.adjacency[node].items():
+                nd = d + length
+                if nd < dist.get(neighbour, float("inf")):
+                    dist[neighbour] = nd
+                    prev[neighbour] = node
+                    heapq.heappush(heap, (nd, neighbour))
+        if _to not in dist:
+            route = None
+        else:
+            route = [_to]
+            while route[-1] != _from:
+                route.append(prev[route[-1]])
+            route.reverse()
+        self._routes[key] = route
+        return route
+
+
+class AirportSimulator:
+    """
+    Состояние симулятора: машины, занятость полос, счётчики вызовов
+    и события оркестратора (для подсчёта времени обслуживания самолётов).
+    """
+
+    def __init__(self, graph: Optional[AirportGraph] = None, lane_capacity: int = 2,
+                 conflict_rate: float = 0.0, latency: float = 0.0, seed: int = 0,
+                 now: Callable[[], float] = time.time):
+        self.graph = graph or AirportGraph(seed=seed)
+        self.now = now                       # часы для отметок оркестратора
+        self.lane_capacity = lane_capacity
+        self.conflict_rate = conflict_rate   # доля случайных 409 на /move
+        self.latency = latency               # задержка ответа, сек (реальные)
+        self._rng = random.Random(seed)
+        self._ids = itertools.count(1)
+        self.vehicles: Dict[str, str] = {}                     # { vehicle_id: текущий узел }
+        self.lanes: Dict[str, Tuple[str, str]] = {}            # { vehicle_id: занятая полоса }
+        self.occupancy: Dict[Tuple[str, str], Set[str]] = {}   # { полоса: машины }
+        self.calls: Counter = Counter()
+        self.conflicts = 0
+        self.outage_rejected = 0
+        # Имитация отказа: { "ground_control" | "orchestrator": до какого момента (now()) отвечать 503 }
+        self.outages: Dict[str, float] = {}
+        self.arrivals = 0
+        self.finished = 0
+        # { "boarding/<aircraft_id>": {"start": ts, "finish": ts, "passengers": n} }
+        self.operations: Dict[str, dict] = {}
+
+    # --- ground-control ---
+
+    def register(self, vehicle_type: str) -> dict:
+        n = next(self._ids)
+        vehicle_id = f"{vehicle_type}-{n}"
+        garage = self.graph.garages[n % len(self.graph.garages)]
+        self.vehicles[vehicle_id] = garage
+        return {"garrageNodeId": garage, "vehicleId": vehicle_id,
+                "serviceSpots": self.graph.service_spots}
+
+    def move(self, vehicle_id: str, _from: str, _to: str):
+        """
+        Возвращает длину ребра или код ответа: 409 – полоса занята,
+        400/403/404 – нельзя ехать.
+        """
+        if vehicle_id not in self.vehicles:
+            return 400
+        if _from not in self.graph.adjacency or _to not in self.graph.adjacency:
+            return 404
+        length = self.graph.adjacency[_from].get(_to)
+        if length is None:
+            return 403
+        lane = (_from, _to)
+        occupants = self.occupancy.get(lane, set())
+        full = self.graph.is_road(_to) and len(occupants - {vehicle_id}) >= self.lane_capacity
+        if full or (self.conflict_rate and self._rng.random() < self.conflict_rate):
+            self.conflicts += 1
+            return 409
+        held = self.lanes.pop(vehicle_id, None)
+        if held is not None:
+            self.occupancy[held].discard(vehicle_id)
+        if self.graph.is_road(_to):
+            self.occupancy.setdefault(lane, set()).add(vehicle_id)
+            self.lanes[vehicle_id] = lane
+        self.vehicles[vehicle_id] = _to
+        return length
+
+    # --- оркестратор ---
+
+    def operation(self, operation: str, event: str, aircraft_id: str, passengers: Optional[int]):
+        record = self.operations.setdefault(f"{operation}/{aircraft_id}", {})
+        if event == "finish" and event not in record:
+            self.finished += 1
+        record[event] = self.now()
+        if passengers is not None:
+            record["passengers"] = passengers
+
+    def stats(self, operations: bool = True) -> dict:
+        stats = {
+            "calls": dict(self.calls),
+            "conflicts": self.conflicts,
+            "outage_rejected": self.outage_rejected,
+            "arrivals": self.arrivals,
+            "vehicles": len(self.vehicles),
+            "finished": self.finished,
+        }
+        if operations:
+            stats["operations"] = self.operations
+        return stats
+
+
+def create_app(sim: Optional[AirportSimulator] = None) -> FastAPI:
+    sim = sim or AirportSimulator()
+    app = FastAPI(title="Airport simulator", description="ground-control и оркестратор для тестов")
+    app.state.sim = sim
+
+    @app.middleware("http")
+    async def count_calls(request: Request, call_next):
+        path = request.url.path
+        if not path.startswith("/sim/"):
+            sim.calls["register-vehicle" if path.startswith("/register-vehicle") else path.lstrip("/")] += 1
+            upstream = "orchestrator" if path.startswith("/boarding/") else "ground_control"
+            if sim.now() < sim.outages.get(upstream, 0.0):
+                sim.outage_rejected += 1
+                return Response(status_code=503)
+        if sim.latency:
+            await asyncio.sleep(sim.latency)
+        return await call_next(request)
+
+    @app.post("/register-vehicle/{vehicle_type}")
+    async def register_vehicle(vehicle_type: str):
+        return sim.register(vehicle_type)
+
+    @app.post("/route")
+    async def route(body: dict):
+        route = sim.graph.route(body.get("from"), body.get("to"))
+        if route is None:
+            return JSONResponse(status_code=404, content={"error": "route not found"})
+        return route
+
+    @app.post("/move")
+    async def move(body: dict):
+        result = sim.move(body.get("vehicleId"), body.get("from"), body.get("to"))
+        if isinstance(result, int):
+            return Response(status_code=result)
+        return {"distance": result}
+
+    @app.post("/arrived")
+    async def arrived(body: dict):
+        sim.arrivals += 1
+        return Response(status_code=200)
+
+    @app.post("/boarding/{operation}/{event}")
+    async def orchestrator(operation: str, event: str, body: dict):
+        if operation not in ("boarding", "unboarding") or event not in ("start", "finish"):
+            return Response(status_code=404)
+        sim.operation(operation, event, body.get("aircraft_id"), body.get("passengers_count"))
+        return Response(status_code=204)
+
+    @app.post("/sim/outage")
+    async def outage(body: dict):
+        """
+        {"upstream": "ground_control" | "orchestrator", "seconds": 30} –
+        сервис отвечает 503 указанное время (по часам симулятора).
+        """
+        upstream = body.get("upstream", "ground_control")
+        sim.outages[upstream] = sim.now() + float(body.get("seconds", 0))
+        return {"upstream": upstream, "until": sim.outages[upstream]}
+
+    @app.get("/sim/stats")
+    async def stats(operations: bool = True):
+        return sim.stats(operations)
+
+    return app
+
+
+def mock_transport(sim: AirportSimulator) -> httpx.MockTransport:
+    """
+    Те же ответы, что у create_app, но без ASGI и FastAPI: транспорт httpx
+    вызывает симулятор напрямую. Для замеров, где накладные расходы
+    симулятора не должны заслонять сервис (simulator/bench.py).
+    """
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        sim.calls["register-vehicle" if path.startswith("/register-vehicle") else path.lstrip("/")] += 1
+        upstream = "orchestrator" if path.startswith("/boarding/") else "ground_control"
+        if sim.now() < sim.outages.get(upstream, 0.0):
+            sim.outage_rejected += 1
+            return httpx.Response(503)
+        body = json.loads(request.content) if request.content else {}
+        if path.startswith("/register-vehicle/"):
+            return httpx.Response(200, json=sim.register(path.rsplit("/", 1)[1]))
+        if path == "/route":
+            route = sim.graph.route(body.get("from"), body.get("to"))
+            if route is None:
+                return httpx.Response(404, json={"error": "route not found"})
+            return httpx.Response(200, json=route)
+        if path == "/move":
+            result = sim.move(body.get("vehicleId"), body.get("from"), body.get("to"))
+            if isinstance(result, int):
+                return httpx.Response(result)
+            return httpx.Response(200, json={"distance": result})
+        if path == "/arrived":
+            sim.arrivals += 1
+            return httpx.Response(200)
+        parts = path.strip("/").split("/")
+        if len(parts) == 3 and parts[0] == "boarding" and parts[1] in ("boarding", "unboarding") \
+                and parts[2] in ("start", "finish"):
+            sim.operation(parts[1], parts[2], body.get("aircraft_id"), body.get("passengers_count"))
+            return httpx.Response(204)
+        return httpx.Response(404)
+
+    return httpx.MockTransport(handler)
+
+
+app = create_app()
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Симулятор ground-control и оркестратора")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--width", type=int, default=8)
+    parser.add_argument("--height", type=int, default=8)
+    parser.add_argument("--garages", type=int, default=2)
+    parser.add_argument("--stands", type=int, default=16)
+    parser.add_argument("--lane-capacity", type=int, default=2)
+    parser.add_argument("--conflict-rate", type=float, default=0.0)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа, сек")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def simulator_from_args(args) -> AirportSimulator:
+    graph = AirportGraph(args.width, args.height, args.garages, args.stands, seed=args.seed)
+    return AirportSimulator(graph, lane_capacity=args.lane_capacity,
+                            conflict_rate=args.conflict_rate, latency=args.latency, seed=args.seed)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    args = _parse_args()
+    uvicorn.run(create_app(simulator_from_args(args)), host=args.host, port=args.port)
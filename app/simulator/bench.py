@@ -0,0 +1,392 @@
+# app/simulator/bench.py
+#
+# Замеры горячих путей сервиса без сети и без внешних сервисов: симулятор
+# аэропорта подключён прямо в транспорт httpx (airport.mock_transport),
+# время – виртуальное (services/clock.VirtualClock), поэтому прогон
+# ограничен только процессором и повторяется при том же --seed.
+#
+#   trip_engine  – поездки через process_transporter_task: поездок в секунду
+#                  (реальных), задержка цикла событий, вызовы внешних сервисов;
+#   trip_memory  – те же поездки под tracemalloc: рост памяти по ходу прогона
+#                  и сколько памяти остаётся занятой на каждую поездку;
+#   api          – /load и /upload: запросов в секунду и задержка ответа;
+#   admin        – /admin/vehicles (полный ответ и 304) и /admin/audit.
+#
+# Из каталога app:
+#   python -m simulator.bench --trips 10000 --output bench.json
+# Сравнение с прошлым прогоном (например, с другого коммита):
+#   python -m simulator.bench --trips 10000 --compare bench.json
+#
+# Задержки и «в секунду» – по реальным часам (time.perf_counter), время
+# поездок (simulated_sec) – по виртуальным.
+
+import os
+import gc
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+from typing import Dict, List, Optional
+
+import httpx
+
+# Запуск из каталога app: python -m simulator.bench
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from simulator.loadgen import _percentile
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры Transporter на виртуальных часах")
+    parser.add_argument("--trips", type=int, default=10000, help="поездок в trip_engine и trip_memory")
+    parser.add_argument("--requests", type=int, default=2000, help="запросов /load и /upload")
+    parser.add_argument("--admin-requests", type=int, default=1000, help="запросов к каждому эндпоинту админки")
+    parser.add_argument("--concurrency", type=int, default=50, help="запросов API в полёте")
+    parser.add_argument("--fleet", type=int, default=20, help="TRANSPORTER_FLEET_MAX_SIZE")
+    parser.add_argument("--stands", type=int, default=16)
+    parser.add_argument("--passengers", type=int, nargs=2, default=(50, 300), metavar=("MIN", "MAX"))
+    parser.add_argument("--checkpoints", type=int, default=10, help="замеров памяти за прогон trip_memory")
+    parser.add_argument("--skip", nargs="*", default=[],
+                        choices=("trip_engine", "trip_memory", "api", "admin"), help="не выполнять замеры")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="записать результаты (JSON) в файл")
+    parser.add_argument("--compare", help="JSON прошлого прогона: вывести изменения")
+    return parser.parse_args(argv)
+
+
+def _configure_service(args, workdir: str):
+    """
+    Настройки сервиса (читаются при импорте config): файлы – во временном
+    каталоге, журналы, которые не замеряются, выключены.
+    """
+    os.environ["TRANSPORTER_TIME_SCALE"] = "1"
+    os.environ["TRANSPORTER_FLEET_MAX_SIZE"] = str(args.fleet)
+    os.environ["TRANSPORTER_TRIP_JOURNAL_PATH"] = ""
+    os.environ["TRANSPORTER_OUTBOX_PATH"] = ""
+    os.environ["TRANSPORTER_WARMUP_FLEET_SIZE"] = "0"
+    os.environ["TRANSPORTER_AUDIT_LOG_PATH"] = os.path.join(workdir, "audit.log")
+    os.environ["TRANSPORTER_DISPATCH_QUEUE_MAX_SIZE"] = str(max(1000, args.requests))
+    os.environ["TRANSPORTER_HTTP_MAX_CONNECTIONS"] = "1000"
+
+
+def _rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / 2 ** 20, 1)
+    except (OSError, ValueError):
+        return None
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             timeout=5, cwd=os.path.dirname(os.path.abspath(__file__)))
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+class LagProbe:
+    """
+    Задержка цикла событий: раз в interval (виртуальных) секунд ставит
+    обратный вызов в очередь готовых и меряет по реальным часам, сколько
+    он ждал, пока выполнятся остальные.
+    """
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._handle: Optional[asyncio.TimerHandle] = None
+
+    def start(self):
+        self._schedule()
+
+    def stop(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _schedule(self):
+        self._handle = asyncio.get_running_loop().call_later(self.interval, self._tick)
+
+    def _tick(self):
+        asyncio.get_running_loop().call_soon(self._measure, time.perf_counter())
+
+    def _measure(self, queued_at: float):
+        self.samples.append(time.perf_counter() - queued_at)
+        if self._handle is not None:
+            self._schedule()
+
+    def as_dict(self) -> dict:
+        ms = [x * 1000 for x in self.samples]
+        return {"samples": len(ms), "p50": _percentile(ms, 0.50), "p99": _percentile(ms, 0.99),
+                "max": _percentile(ms, 1.0)}
+
+
+async def _run_trips(args, sim, count: int, rng: random.Random, on_progress=None) -> dict:
+    """
+    count поездок через process_transporter_task, по одной на машину
+    парка одновременно. Самолёты у всех поездок разные.
+    """
+    from services import clock
+    from services.fleet import fleet
+    from services.tasks import process_transporter_task
+
+    plan = [(f"aircraft-{rng.randrange(args.stands)}", rng.randint(*args.passengers), rng.random() < 0.5)
+            for _ in range(count)]
+    calls_before = sum(sim.calls.values())
+    next_trip = iter(range(count))
+    done = 0
+
+    async def worker():
+        nonlocal done
+        for i in next_trip:
+            coordinates, passengers, is_boarding = plan[i]
+            vehicle = await fleet.acquire(coordinates)
+            if vehicle is None and not await fleet.reserve_slot():
+                vehicle = await fleet.acquire()
+            await process_transporter_task(aircraft_id=f"bench-{id(plan)}-{i}", aircraft_coordinates=coordinates,
+                                           passenger_count=passengers, is_boarding=is_boarding, vehicle=vehicle)
+            done += 1
+            if on_progress is not None:
+                on_progress(done)
+
+    sim_started = clock.monotonic()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.fleet)))
+    wall = time.perf_counter() - started
+    calls = sum(sim.calls.values()) - calls_before
+    return {
+        "trips": count,
+        "wall_sec": round(wall, 3),
+        "trips_per_sec": round(count / wall, 1) if wall else None,
+        "simulated_sec": round(clock.monotonic() - sim_started, 1),
+        "upstream_calls_per_trip": round(calls / count, 2) if count else None,
+    }
+
+
+async def bench_trip_engine(args, sim) -> dict:
+    probe = LagProbe()
+    probe.start()
+    try:
+        result = await _run_trips(args, sim, args.trips, random.Random(args.seed))
+    finally:
+        probe.stop()
+    result["loop_lag_ms"] = probe.as_dict()
+    return result
+
+
+async def bench_trip_memory(args, sim) -> dict:
+    """
+    Поездки под tracemalloc. Замер после gc.collect() каждые
+    trips / checkpoints поездок; retained_bytes_per_trip – насколько выросла
+    занятая память между первым и последним замером в расчёте на поездку
+    (у сервиса без утечек – около нуля: кэши и учёт ограничены).
+    """
+    checkpoints: List[dict] = []
+    step = max(1, args.trips // max(1, args.checkpoints))
+
+    def snapshot(done: int):
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+        checkpoints.append({"trips": done, "traced_mb": round(current / 2 ** 20, 3),
+                            "blocks": sys.getallocatedblocks(), "rss_mb": _rss_mb()})
+
+    def on_progress(done: int):
+        if done % step == 0:
+            snapshot(done)
+
+    tracemalloc.start()
+    try:
+        snapshot(0)
+        result = await _run_trips(args, sim, args.trips, random.Random(args.seed + 1), on_progress)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # Первый замер – после прогрева (парк зарегистрирован, кэши заполнены)
+    first, last = checkpoints[min(1, len(checkpoints) - 1)], checkpoints[-1]
+    trips = max(1, last["trips"] - first["trips"])
+    return {
+        "trips": result["trips"],
+        "wall_sec": result["wall_sec"],
+        "peak_traced_mb": round(peak / 2 ** 20, 3),
+        "traced_growth_mb": round(last["traced_mb"] - first["traced_mb"], 3),
+        "retained_bytes_per_trip": round((last["traced_mb"] - first["traced_mb"]) * 2 ** 20 / trips, 1),
+        "retained_blocks_per_trip": round((last["blocks"] - first["blocks"]) / trips, 3),
+        "rss_growth_mb": (round(last["rss_mb"] - first["rss_mb"], 1)
+                          if first["rss_mb"] is not None and last["rss_mb"] is not None else None),
+        "checkpoints": checkpoints,
+    }
+
+
+async def _hammer(client: httpx.AsyncClient, count: int, concurrency: int, request) -> dict:
+    """
+    count запросов request(client, i), не больше concurrency одновременно.
+    """
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    next_request = iter(range(count))
+
+    async def worker():
+        for i in next_request:
+            sent = time.perf_counter()
+            resp = await request(client, i)
+            latencies.append(time.perf_counter() - sent)
+            statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    wall = time.perf_counter() - started
+    ms = [x * 1000 for x in latencies]
+    return {
+        "requests": count,
+        "rps": round(count / wall, 1) if wall else None,
+        "latency_ms": {"p50": _percentile(ms, 0.50), "p99": _percentile(ms, 0.99)},
+        "statuses": {str(code): n for code, n in sorted(statuses.items())},
+    }
+
+
+async def bench_api(args, client: httpx.AsyncClient, sim) -> dict:
+    from services import clock
+
+    rng = random.Random(args.seed + 2)
+    plan = [(rng.random() < 0.5, f"aircraft-{rng.randrange(args.stands)}", rng.randint(*args.passengers))
+            for _ in range(args.requests)]
+    finished_before = sim.finished
+
+    async def request(c: httpx.AsyncClient, i: int) -> httpx.Response:
+        upload, coordinates, passengers = plan[i]
+        return await c.post("/upload" if upload else "/load", json={
+            "aircraft_id": f"api-{i}", "passenger_count": passengers, "aircraft_coordinates": coordinates})
+
+    probe = LagProbe()
+    probe.start()
+    try:
+        result = await _hammer(client, args.requests, args.concurrency, request)
+        # Поездки по принятым запросам доезжают до конца
+        started = time.perf_counter()
+        accepted = result["statuses"].get("200", 0)
+        while sim.finished - finished_before < accepted:
+            await clock.sleep(1.0)
+        result["drain_wall_sec"] = round(time.perf_counter() - started, 3)
+    finally:
+        probe.stop()
+    result["loop_lag_ms"] = probe.as_dict()
+    return result
+
+
+async def bench_admin(args, client: httpx.AsyncClient) -> dict:
+    etag = (await client.get("/admin/vehicles")).headers.get("etag", "")
+
+    async def vehicles(c: httpx.AsyncClient, i: int) -> httpx.Response:
+        return await c.get("/admin/vehicles", headers={"Accept-Encoding": "gzip"})
+
+    async def vehicles_304(c: httpx.AsyncClient, i: int) -> httpx.Response:
+        return await c.get("/admin/vehicles", headers={"If-None-Match": etag})
+
+    async def audit(c: httpx.AsyncClient, i: int) -> httpx.Response:
+        return await c.get("/admin/audit", params={"tail": 100})
+
+    return {
+        "vehicles": await _hammer(client, args.admin_requests, args.concurrency, vehicles),
+        "vehicles_not_modified": await _hammer(client, args.admin_requests, args.concurrency, vehicles_304),
+        "audit": await _hammer(client, args.admin_requests, min(args.concurrency, 8), audit),
+    }
+
+
+async def run(args) -> dict:
+    from simulator.airport import AirportGraph, AirportSimulator, mock_transport
+    from services import clock, http_client
+    from main import app
+
+    sim = AirportSimulator(AirportGraph(stands=args.stands, seed=args.seed), seed=args.seed, now=clock.time)
+    await http_client.start_client(mock_transport(sim))
+    results = {}
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://transporter",
+                                     timeout=30) as client:
+            if "trip_engine" not in args.skip:
+                results["trip_engine"] = await bench_trip_engine(args, sim)
+            if "trip_memory" not in args.skip:
+                results["trip_memory"] = await bench_trip_memory(args, sim)
+            if "api" not in args.skip:
+                results["api"] = await bench_api(args, client, sim)
+            if "admin" not in args.skip:
+                results["admin"] = await bench_admin(args, client)
+    return results
+
+
+def _flatten(data, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if key in ("checkpoints", "statuses"):
+                continue
+            flat.update(_flatten(value, f"{prefix}{key}."))
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        flat[prefix.rstrip(".")] = data
+    return flat
+
+
+def compare(previous: dict, current: dict) -> List[str]:
+    """
+    Строки «метрика: было -> стало (изменение)» для общих числовых метрик.
+    """
+    old, new = _flatten(previous.get("results", {})), _flatten(current["results"])
+    lines = []
+    for key in sorted(old.keys() & new.keys()):
+        change = f"{(new[key] - old[key]) / old[key] * 100:+.1f}%" if old[key] else "n/a"
+        lines.append(f"{key}: {old[key]} -> {new[key]} ({change})")
+    return lines
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    # Аудит пишется только в файл (его читает /admin/audit), без вывода в консоль
+    logging.getLogger("audit").propagate = False
+    with tempfile.TemporaryDirectory(prefix="transporter-bench-") as workdir:
+        _configure_service(args, workdir)
+        from services import clock
+
+        # Джиттер повторов (services/retry.py) – тоже из seed
+        random.seed(args.seed)
+        virtual = clock.VirtualClock()
+        clock.set_clock(virtual)
+        started = time.perf_counter()
+        results = virtual.run(run(args))
+        report = {
+            "meta": {
+                "commit": _git_commit(),
+                "timestamp": time.time(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "wall_sec": round(time.perf_counter() - started, 3),
+                "args": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+            },
+            "results": results,
+        }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+        print(f"\nСравнение с {args.compare} (коммит {previous.get('meta', {}).get('commit')}):", file=sys.stderr)
+        for line in compare(previous, report):
+            print("  " + line, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
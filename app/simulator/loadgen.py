@@ -0,0 +1,224 @@
+# app/simulator/loadgen.py
+#
+# Нагрузочный прогон: поток /load и /upload к Transporter на симуляторе
+# аэропорта. Отчёт (JSON): пропускная способность API, время обслуживания
+# самолёта от запроса до /finish у оркестратора (p50/p99) и число вызовов
+# ground-control/оркестратора.
+#
+# В одном процессе (сервис и симулятор через ASGITransport, без сети):
+#   python -m simulator.loadgen --requests 2000 --rate 120 --time-scale 200
+# Там же на виртуальных часах (время перескакивает к ближайшему событию,
+# прогон детерминирован и ограничен только процессором):
+#   python -m simulator.loadgen --requests 5000 --rate 120 --virtual
+# С отдельно запущенными сервисом и симулятором:
+#   python -m simulator.loadgen --target http://localhost:8080 \
+#       --simulator http://localhost:9000 --time-scale 200
+# (--time-scale должен совпадать с TRANSPORTER_TIME_SCALE сервиса)
+#
+# Время в отчёте – симулированное (по часам сервиса), кроме задержек API и wall_sec.
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import logging
+from contextlib import AsyncExitStack
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+# Запуск из каталога app: python -m simulator.loadgen
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон Transporter на симуляторе")
+    parser.add_argument("--requests", type=int, default=1000, help="число запросов /load и /upload")
+    parser.add_argument("--rate", type=float, default=60.0, help="запросов в симулированную минуту")
+    parser.add_argument("--time-scale", type=float, default=100.0)
+    parser.add_argument("--virtual", action="store_true",
+                        help="виртуальные часы (только в одном процессе, --time-scale не нужен)")
+    parser.add_argument("--passengers", type=int, nargs=2, default=(50, 300), metavar=("MIN", "MAX"))
+    parser.add_argument("--upload-share", type=float, default=0.5, help="доля /upload")
+    parser.add_argument("--fleet", type=int, default=20, help="TRANSPORTER_FLEET_MAX_SIZE (в одном процессе)")
+    parser.add_argument("--stands", type=int, default=16)
+    parser.add_argument("--conflict-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=600.0, help="ожидание завершения, сек (реальные)")
+    parser.add_argument("--target", help="URL запущенного Transporter")
+    parser.add_argument("--simulator", help="URL запущенного симулятора (вместе с --target)")
+    parser.add_argument("--output", help="записать отчёт в файл")
+    return parser.parse_args(argv)
+
+
+async def _fire(client: httpx.AsyncClient, args, plan: List[dict], submitted: Dict[str, float],
+                api_latency: List[float], rejected: List[str], now: Callable[[], float],
+                sleep: Callable[[float], object]):
+    """
+    Открытая нагрузка: запросы уходят по расписанию (в симулированном
+    времени), не дожидаясь ответов.
+    """
+    interval = 60.0 / args.rate
+    started = now()
+
+    async def send(item: dict):
+        path = "/upload" if item["upload"] else "/load"
+        body = {k: item[k] for k in ("aircraft_id", "passenger_count", "aircraft_coordinates")}
+        sent = time.perf_counter()
+        resp = await client.post(path, json=body)
+        api_latency.append(time.perf_counter() - sent)
+        if resp.status_code == 200:
+            submitted[item["key"]] = now()
+        else:
+            rejected.append(f"{path} {resp.status_code}")
+
+    tasks = []
+    for i, item in enumerate(plan):
+        delay = started + i * interval - now()
+        if delay > 0:
+            await sleep(delay)
+        tasks.append(asyncio.create_task(send(item)))
+    await asyncio.gather(*tasks)
+
+
+def _configure_service(args):
+    """
+    Настройки сервиса для прогона в одном процессе (читаются при импорте config).
+    """
+    os.environ["TRANSPORTER_TIME_SCALE"] = str(args.time_scale)
+    os.environ["TRANSPORTER_FLEET_MAX_SIZE"] = str(args.fleet)
+    os.environ.setdefault("TRANSPORTER_TRIP_JOURNAL_PATH", "")
+    os.environ.setdefault("TRANSPORTER_DISPATCH_QUEUE_MAX_SIZE", str(max(1000, args.requests)))
+    os.environ.setdefault("TRANSPORTER_HTTP_MAX_CONNECTIONS", "1000")
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    plan = []
+    for i in range(args.requests):
+        upload = rng.random() < args.upload_share
+        operation = "unboarding" if upload else "boarding"
+        aircraft_id = f"{operation}-{i}"
+        plan.append({
+            "key": f"{operation}/{aircraft_id}",
+            "upload": upload,
+            "aircraft_id": aircraft_id,
+            "passenger_count": rng.randint(*args.passengers),
+            "aircraft_coordinates": f"aircraft-{rng.randrange(args.stands)}",
+        })
+
+    submitted: Dict[str, float] = {}
+    api_latency: List[float] = []
+    rejected: List[str] = []
+    async with AsyncExitStack() as stack:
+        if args.target:
+            client = await stack.enter_async_context(httpx.AsyncClient(base_url=args.target, timeout=30))
+            sim_client = await stack.enter_async_context(httpx.AsyncClient(base_url=args.simulator, timeout=30))
+            # Сервис и симулятор в других процессах: отметки в реальном
+            # времени, в симулированное переводим через --time-scale
+            scale = args.time_scale
+
+            def now() -> float:
+                return time.time()
+
+            async def sleep(seconds: float):
+                await asyncio.sleep(seconds / scale)
+        else:
+            from simulator.airport import AirportGraph, AirportSimulator, create_app
+            from services import clock, http_client
+            from main import app
+
+            scale = 1.0
+            now = clock.time
+            sleep = clock.sleep
+            sim = AirportSimulator(AirportGraph(stands=args.stands, seed=args.seed),
+                                   conflict_rate=args.conflict_rate, seed=args.seed, now=clock.time)
+            sim_transport = httpx.ASGITransport(app=create_app(sim))
+            await http_client.start_client(sim_transport)
+            await stack.enter_async_context(app.router.lifespan_context(app))
+            client = await stack.enter_async_context(
+                httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://transporter", timeout=30))
+            sim_client = await stack.enter_async_context(
+                httpx.AsyncClient(transport=sim_transport, base_url="http://simulator"))
+
+        wall_started = time.monotonic()
+        sim_started = now()
+        await _fire(client, args, plan, submitted, api_latency, rejected, now, sleep)
+        fire_sec = time.monotonic() - wall_started
+
+        # Ждём /finish по всем принятым запросам (у каждого свой самолёт)
+        deadline = time.monotonic() + args.timeout
+        while time.monotonic() < deadline:
+            progress = (await sim_client.get("/sim/stats", params={"operations": False})).json()
+            if progress["finished"] >= len(submitted):
+                break
+            await sleep(1.0)
+        wall_sec = time.monotonic() - wall_started
+        sim_sec = (now() - sim_started) * scale
+        stats = (await sim_client.get("/sim/stats")).json()
+        finished = {key: op["finish"] for key, op in stats["operations"].items() if "finish" in op}
+
+    latencies = [(finished[key] - ts) * scale for key, ts in submitted.items() if key in finished]
+    return {
+        "requests": args.requests,
+        "accepted": len(submitted),
+        "rejected": len(rejected),
+        "completed": len(latencies),
+        "clock": "virtual" if args.virtual else f"x{args.time_scale:g}",
+        "wall_sec": round(wall_sec, 3),
+        "simulated_sec": round(sim_sec, 1),
+        "api_rps": round(len(api_latency) / fire_sec, 1) if fire_sec else None,
+        "api_latency_ms": {
+            "p50": _percentile([x * 1000 for x in api_latency], 0.50),
+            "p99": _percentile([x * 1000 for x in api_latency], 0.99),
+        },
+        "aircraft_per_sim_hour": round(len(latencies) / sim_sec * 3600, 1) if sim_sec else None,
+        "trip_latency_sim_sec": {
+            "p50": _percentile(latencies, 0.50),
+            "p99": _percentile(latencies, 0.99),
+            "max": _percentile(latencies, 1.0),
+        },
+        "upstream_calls": stats["calls"],
+        "move_conflicts": stats["conflicts"],
+    }
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    if bool(args.target) != bool(args.simulator):
+        raise SystemExit("--target и --simulator задаются вместе")
+    if args.virtual and args.target:
+        raise SystemExit("--virtual работает только в одном процессе")
+    logging.basicConfig(level=logging.WARNING)
+    if args.target:
+        report = asyncio.run(run(args))
+    else:
+        _configure_service(args)
+        from services import clock
+        if args.virtual:
+            # Джиттер повторов (services/retry.py) – тоже из seed: прогон повторяем
+            random.seed(args.seed)
+            virtual = clock.VirtualClock()
+            clock.set_clock(virtual)
+            report = virtual.run(run(args))
+        else:
+            report = asyncio.run(run(args))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
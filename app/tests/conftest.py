@@ -0,0 +1,41 @@
+# app/tests/conftest.py
+#
+# Настройки сервиса читаются при импорте config, поэтому окружение
+# тестов задаётся здесь, до импорта модулей приложения: состояние в памяти,
+# журнал поездок и файл уведомлений выключены (тесты включают их сами,
+# во временных каталогах), файлы блокировок и аудит – во временном каталоге.
+# Запуск: cd app && python -m pytest
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+_tmp = tempfile.mkdtemp(prefix="transporter-tests-")
+os.environ.update({
+    "TRANSPORTER_STATE_BACKEND": "memory",
+    "TRANSPORTER_TRIP_JOURNAL_PATH": "",
+    "TRANSPORTER_OUTBOX_PATH": "",
+    "TRANSPORTER_AUDIT_LOG_PATH": os.path.join(_tmp, "audit.log"),
+    "TRANSPORTER_WORKER_LOCK_DIR": _tmp,
+    "TRANSPORTER_TIME_SCALE": "1",
+    "TRANSPORTER_WARMUP_FLEET_SIZE": "0",
+    "TRANSPORTER_WARMUP_ROUTES": "false",
+})
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def virtual_clock():
+    """
+    Виртуальные часы движка (services/clock.py): clock.sleep не ждёт
+    по-настоящему. Тест запускает корутину через virtual_clock.run(...).
+    """
+    from services import clock
+    previous = clock.get_clock()
+    virtual = clock.VirtualClock()
+    clock.set_clock(virtual)
+    yield virtual
+    clock.set_clock(previous)
@@ -0,0 +1,119 @@
+# app/tests/test_movement.py
+#
+# drive_route: запрошенное заранее разрешение на следующий сегмент (/move)
+# отменяется на любом выходе из маршрута – ошибка, отмена, отказ.
+# Ground-control подменяется (services/movement.get_permission_async).
+
+import asyncio
+
+import pytest
+
+from services import movement
+from services.state_store import Vehicle
+
+
+class _GroundControl:
+    """Разрешение на сегмент из first_node – сразу, на остальные – через hold сек."""
+
+    def __init__(self, first_node: str = "n0", hold: float = 60.0, deny: frozenset = frozenset()):
+        self.first_node = first_node
+        self.hold = hold
+        self.deny = deny
+        self.requested = []
+        self.cancelled = []
+
+    async def get_permission(self, vehicle_id, vehicle_type, _from, _to):
+        self.requested.append((_from, _to))
+        try:
+            await asyncio.sleep(0 if _from == self.first_node else self.hold)
+        except asyncio.CancelledError:
+            self.cancelled.append((_from, _to))
+            raise
+        return None if (_from, _to) in self.deny else 10.0
+
+
+@pytest.fixture
+def ground_control(monkeypatch, virtual_clock):
+    async def nothing(*args, **kwargs):
+        return None
+    monkeypatch.setattr(movement, "notify_arrival", nothing)
+    monkeypatch.setattr(movement.fleet, "set_position", nothing)
+    monkeypatch.setattr(movement.config, "MOVEMENT_PREFETCH", True)
+
+    def install(**kwargs):
+        fake = _GroundControl(**kwargs)
+        monkeypatch.setattr(movement, "get_permission_async", fake.get_permission)
+        return fake
+    return install
+
+
+def _pending_moves() -> list:
+    return [task for task in asyncio.all_tasks()
+            if task is not asyncio.current_task() and not task.done()]
+
+
+def _vehicle() -> Vehicle:
+    return Vehicle("bus-1", "bus", "n0", {})
+
+
+ROUTE = ["n0", "n1", "n2", "n3"]
+
+
+def test_route_is_driven_with_prefetch(ground_control, virtual_clock):
+    fake = ground_control(hold=0.0)
+
+    async def scenario():
+        assert await movement.drive_route(_vehicle(), ROUTE) is True
+        assert _pending_moves() == []
+
+    virtual_clock.run(scenario())
+    assert fake.requested == [("n0", "n1"), ("n1", "n2"), ("n2", "n3")]
+    assert fake.cancelled == []
+
+
+def test_cancellation_cancels_prefetched_move(ground_control, virtual_clock):
+    fake = ground_control()
+
+    async def scenario():
+        task = asyncio.create_task(movement.drive_route(_vehicle(), ROUTE))
+        # Первый сегмент проехан (0.4 сек), разрешение на второй ещё ждём
+        await asyncio.sleep(5)
+        assert ("n1", "n2") in fake.requested
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert _pending_moves() == []
+
+    virtual_clock.run(scenario())
+    assert fake.cancelled == [("n1", "n2")]
+
+
+def test_error_on_segment_cancels_prefetched_move(ground_control, virtual_clock):
+    fake = ground_control()
+
+    def on_segment(_from, _to):
+        raise RuntimeError("журнал недоступен")
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await movement.drive_route(_vehicle(), ROUTE, on_segment=on_segment)
+        await asyncio.sleep(0)
+        assert _pending_moves() == []
+
+    virtual_clock.run(scenario())
+    # Запрос на следующий сегмент создан, но отменён до отправки
+    assert fake.requested == [("n0", "n1")]
+
+
+def test_denied_segment_stops_the_route(ground_control, virtual_clock):
+    fake = ground_control(hold=0.0, deny=frozenset({("n1", "n2")}))
+
+    async def scenario():
+        assert await movement.drive_route(_vehicle(), ROUTE) is False
+        await asyncio.sleep(0)
+        assert _pending_moves() == []
+
+    virtual_clock.run(scenario())
+    # Отказ на заранее запрошенное разрешение – один повтор из узла
+    assert fake.requested == [("n0", "n1"), ("n1", "n2"), ("n1", "n2")]
+    assert fake.cancelled == []
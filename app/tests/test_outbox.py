@@ -0,0 +1,161 @@
+# app/tests/test_outbox.py
+#
+# Очередь исходящих уведомлений: порядок по ключу, ограничение на все
+# неотправленные, предел времени повторов и файл после перезапуска.
+# HTTP-клиент подменяется (services/http_client.post).
+
+import asyncio
+import random
+
+import pytest
+
+from services import http_client
+from services.outbox import Outbox
+
+
+class _Response:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+        self.text = ""
+
+
+class _Upstream:
+    """Записывает payload каждого запроса; fail(payload) -> код ответа."""
+
+    def __init__(self, fail=None, delay=lambda: 0.0):
+        self.sent = []
+        self.fail = fail
+        self.delay = delay
+
+    async def post(self, endpoint, url, json=None):
+        await asyncio.sleep(self.delay())
+        self.sent.append(json)
+        status = self.fail(json) if self.fail else 200
+        return _Response(status)
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    def install(**kwargs):
+        fake = _Upstream(**kwargs)
+        monkeypatch.setattr(http_client, "post", fake.post)
+        return fake
+    return install
+
+
+def _outbox(path: str = "", **kwargs) -> Outbox:
+    params = dict(max_size=100, workers=4, max_attempts=3, retry_delay=0.01)
+    params.update(kwargs)
+    return Outbox(path=path, **params)
+
+
+def test_same_key_is_delivered_in_order(upstream):
+    rng = random.Random(1)
+    fake = upstream(delay=lambda: rng.uniform(0, 0.003))
+
+    async def scenario():
+        outbox = _outbox(workers=8)
+        outbox.start()
+        futures = [await outbox.send("arrived", "u", {"key": i % 3, "n": i}, key=f"vehicle/{i % 3}")
+                   for i in range(60)]
+        assert all(await asyncio.gather(*futures))
+        await outbox.stop(1.0)
+
+    asyncio.run(scenario())
+    for key in range(3):
+        sent = [p["n"] for p in fake.sent if p["key"] == key]
+        assert sent == sorted(sent) and len(sent) == 20
+
+
+def test_bound_counts_notifications_waiting_behind_a_key(upstream, monkeypatch):
+    fake = upstream()
+
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def held_post(endpoint, url, json=None):
+            await gate.wait()
+            return await fake.post(endpoint, url, json)
+        monkeypatch.setattr(http_client, "post", held_post)
+
+        outbox = _outbox(max_size=3)
+        outbox.start()
+        # Все три – за одним ключом: одно отправляется, два ждут за ним
+        for i in range(3):
+            await outbox.send("arrived", "u", {"n": i}, key="vehicle/1")
+        blocked = asyncio.create_task(outbox.send("arrived", "u", {"n": 3}, key="vehicle/2"))
+        await asyncio.sleep(0.05)
+        assert not blocked.done()
+        assert outbox.depth() == 3
+        gate.set()
+        delivered = await asyncio.wait_for(blocked, 1.0)
+        assert await asyncio.wait_for(delivered, 1.0) is True
+        await outbox.stop(1.0)
+
+    asyncio.run(scenario())
+    assert [p["n"] for p in fake.sent] == [0, 1, 2, 3]
+
+
+def test_retries_stop_at_max_retry_time(upstream):
+    fake = upstream(fail=lambda payload: 503)
+
+    async def scenario():
+        outbox = _outbox(max_attempts=100, retry_delay=0.05)
+        outbox.start()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        delivered = await outbox.send("arrived", "u", {"n": 1}, key="vehicle/1", max_retry_time=0.3)
+        assert await delivered is False
+        elapsed = loop.time() - started
+        await outbox.stop(1.0)
+        return elapsed, outbox.stats()
+
+    elapsed, stats = asyncio.run(scenario())
+    assert elapsed < 1.0
+    assert stats["dropped"] == 1 and stats["depth"] == 0
+    assert len(fake.sent) >= 2
+
+
+def test_client_errors_are_not_retried(upstream):
+    fake = upstream(fail=lambda payload: 409)
+
+    async def scenario():
+        outbox = _outbox()
+        outbox.start()
+        delivered = await outbox.send("arrived", "u", {"n": 1}, key="vehicle/1")
+        # 4xx – ответ получен, повторять нечего
+        assert await delivered is True
+        await outbox.stop(1.0)
+
+    asyncio.run(scenario())
+    assert len(fake.sent) == 1
+
+
+def test_undelivered_notifications_survive_restart(upstream, tmp_path):
+    path = str(tmp_path / "outbox.jsonl")
+    fake = upstream(fail=lambda payload: 503)
+
+    async def first():
+        outbox = _outbox(path, max_attempts=1000, retry_delay=10.0, compact_every=5)
+        outbox.start()
+        for i in range(20):
+            await outbox.send("arrived", "u", {"n": i}, key=f"vehicle/{i}")
+        await asyncio.sleep(0.05)
+        await outbox.stop(0.0)
+
+    asyncio.run(first())
+    fake.fail = None
+    fake.sent.clear()
+
+    async def second():
+        outbox = _outbox(path)
+        outbox.start()
+        assert outbox.depth() == 20
+        await outbox.stop(1.0)
+        return outbox.stats()
+
+    stats = asyncio.run(second())
+    assert stats["delivered"] == 20
+    assert sorted(p["n"] for p in fake.sent) == list(range(20))
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == ""
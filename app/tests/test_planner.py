@@ -0,0 +1,72 @@
+# app/tests/test_planner.py
+#
+# solve_assignment против полного перебора на маленьких матрицах:
+# сначала как можно больше назначенных строк, среди них – минимальная сумма.
+
+import itertools
+import random
+
+import numpy as np
+import pytest
+
+from services import planner
+
+
+def _brute_force(cost: np.ndarray):
+    R, C = cost.shape
+    best = None
+    for cols in itertools.product(range(-1, C), repeat=R):
+        chosen = [c for c in cols if c >= 0]
+        if len(chosen) != len(set(chosen)):
+            continue
+        if any(c >= 0 and not np.isfinite(cost[r, c]) for r, c in enumerate(cols)):
+            continue
+        key = (-len(chosen), sum(cost[r, c] for r, c in enumerate(cols) if c >= 0))
+        if best is None or key < best:
+            best = key
+    return best
+
+
+def _score(cost: np.ndarray, col4row: np.ndarray):
+    cols = [int(c) for c in col4row if c >= 0]
+    assert len(cols) == len(set(cols)), "столбец назначен дважды"
+    for r, c in enumerate(col4row):
+        if c >= 0:
+            assert np.isfinite(cost[r, c]), "назначена невозможная пара"
+    return -len(cols), sum(cost[r, c] for r, c in enumerate(col4row) if c >= 0)
+
+
+@pytest.fixture(params=["fallback", "default"])
+def solver(request, monkeypatch):
+    if request.param == "fallback":
+        # Своя реализация – и когда scipy установлен
+        monkeypatch.setattr(planner, "linear_sum_assignment", None)
+    return planner.solve_assignment
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_matches_brute_force(solver, seed):
+    rng = random.Random(seed)
+    R, C = rng.randint(1, 5), rng.randint(1, 5)
+    cost = np.array([[float(rng.randint(0, 20)) for _ in range(C)] for _ in range(R)])
+    # Часть пар невозможна (машина не обслуживает эти координаты)
+    mask = np.array([[rng.random() < 0.3 for _ in range(C)] for _ in range(R)])
+    cost[mask] = np.inf
+    col4row = solver(cost)
+    assert col4row.shape == (R,)
+    best = _brute_force(cost)
+    assert _score(cost, col4row)[0] == best[0]
+    assert _score(cost, col4row)[1] == pytest.approx(best[1])
+
+
+def test_empty_and_infeasible(solver):
+    assert solver(np.zeros((0, 3))).tolist() == []
+    assert solver(np.full((2, 2), np.inf)).tolist() == [-1, -1]
+
+
+def test_ties_between_interchangeable_columns(solver):
+    # Машины одного гаража дают одинаковые столбцы
+    cost = np.array([[1.0, 1.0, 5.0], [1.0, 1.0, 5.0], [1.0, 1.0, 5.0]])
+    col4row = solver(cost)
+    assert sorted(col4row.tolist()) == [0, 1, 2]
+    assert _score(cost, col4row) == (-3, 7.0)
@@ -0,0 +1,146 @@
+# app/tests/test_trip_journal.py
+#
+# Журнал поездок: последнее состояние поездок и машин после повторного
+# открытия, и продолжение поездок после падения процесса (два процесса
+# на виртуальных часах с симулятором аэропорта, журнал – общий файл).
+
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+from services.trip_journal import TripJournal, TripStage
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_reopen_keeps_active_trips_and_vehicles(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = TripJournal(path, compact_every=1000)
+    journal.open()
+    journal.record_vehicle({"vehicle_id": "bus-1", "garage_node": "g"})
+    journal.checkpoint("t1", TripStage.QUEUED, aircraft_id="A1", passenger_count=10)
+    journal.checkpoint("t1", TripStage.DRIVING, vehicle_id="bus-1", node="n1", heading_to="n2")
+    journal.checkpoint("t1", TripStage.BOARDING, node="n2", heading_to=None)
+    journal.checkpoint("t2", TripStage.QUEUED, aircraft_id="A2", passenger_count=5)
+    journal.checkpoint("t2", TripStage.DONE)
+    journal.close()
+
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"trip_id": "t3", "stage": "dri')   # недописанная строка при падении
+
+    reopened = TripJournal(path, compact_every=1000)
+    trips, vehicles = reopened.open()
+    reopened.close()
+    assert [v["vehicle_id"] for v in vehicles] == ["bus-1"]
+    assert len(trips) == 1
+    trip = trips[0]
+    assert trip["trip_id"] == "t1"
+    assert trip["stage"] == TripStage.BOARDING.value
+    assert trip["aircraft_id"] == "A1" and trip["vehicle_id"] == "bus-1" and trip["node"] == "n2"
+    assert "heading_to" not in trip
+
+
+def test_requeue_starts_trip_over(tmp_path):
+    journal = TripJournal(str(tmp_path / "journal.jsonl"), compact_every=1000)
+    journal.open()
+    journal.checkpoint("t1", TripStage.DRIVING, vehicle_id="bus-1", heading_to="n2")
+    journal.checkpoint("t1", TripStage.QUEUED, aircraft_id="A1")
+    journal.close()
+    trips, _ = journal.open()
+    journal.close()
+    assert trips[0]["stage"] == TripStage.QUEUED.value
+    assert "vehicle_id" not in trips[0]
+
+
+def test_compaction_during_work_keeps_state(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = TripJournal(path, compact_every=10)
+    journal.open()
+    for i in range(100):
+        journal.checkpoint(f"t{i}", TripStage.QUEUED, aircraft_id=f"A{i}")
+        if i % 2:
+            journal.checkpoint(f"t{i}", TripStage.DONE)
+    journal.close()
+    with open(path, encoding="utf-8") as f:
+        assert sum(1 for _ in f) == 50
+    trips, _ = journal.open()
+    journal.close()
+    assert sorted(int(t["trip_id"][1:]) for t in trips) == list(range(0, 100, 2))
+
+
+_SCENARIO = textwrap.dedent("""
+    import asyncio, itertools, json, os, sys
+    import httpx
+    from services import clock, http_client
+    from services.trip_journal import trip_journal
+    from simulator.airport import AirportGraph, AirportSimulator, create_app
+    from main import app
+
+    phase, aircraft = sys.argv[1], int(sys.argv[2])
+
+    async def scenario():
+        sim = AirportSimulator(AirportGraph(stands=4, seed=1), seed=1, now=clock.time)
+        if phase == "resume":
+            # Ground-control помнит машины, зарегистрированные до падения
+            with open(os.environ["TRANSPORTER_TRIP_JOURNAL_PATH"], encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        vehicle = json.loads(line).get("vehicle")
+                    except ValueError:
+                        continue
+                    if vehicle:
+                        sim.vehicles[vehicle["vehicle_id"]] = vehicle["current_node"]
+            sim._ids = itertools.count(len(sim.vehicles) + 1)
+        await http_client.start_client(httpx.ASGITransport(app=create_app(sim)))
+        async with app.router.lifespan_context(app):
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://transporter")
+            if phase == "crash":
+                for i in range(aircraft):
+                    resp = await client.post("/load", json={"aircraft_id": f"A{i}", "passenger_count": 150,
+                                                            "aircraft_coordinates": f"aircraft-{i % 4}"})
+                    assert resp.status_code == 200, resp.text
+                await clock.sleep(60)
+                stages = sorted(t["stage"] for t in trip_journal.active_trips())
+                print(json.dumps({"stages": stages, "operations": sim.operations}))
+                sys.stdout.flush()
+                os._exit(0)   # падение: ни остановки, ни сжатия журнала
+            for _ in range(3600):
+                if not trip_journal.active_trips():
+                    break
+                await clock.sleep(1)
+            print(json.dumps({"stages": [t["stage"] for t in trip_journal.active_trips()],
+                              "operations": sim.operations}))
+
+    clock.set_clock(clock.VirtualClock())
+    clock.get_clock().run(scenario())
+""")
+
+
+def _run_phase(phase: str, aircraft: int, env: dict) -> dict:
+    result = subprocess.run([sys.executable, "-c", _SCENARIO, phase, str(aircraft)], cwd=APP_DIR, env=env,
+                            capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stderr[-4000:]
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_trips_resume_after_crash(tmp_path):
+    env = dict(os.environ,
+               TRANSPORTER_TRIP_JOURNAL_PATH=str(tmp_path / "journal.jsonl"),
+               TRANSPORTER_WORKER_LOCK_DIR=str(tmp_path),
+               TRANSPORTER_AUDIT_LOG_PATH=str(tmp_path / "audit.log"),
+               TRANSPORTER_FLEET_MAX_SIZE="2")
+    aircraft = 4
+    crashed = _run_phase("crash", aircraft, env)
+    # Падение пришлось на поездки в работе, а не на пустой журнал
+    assert set(crashed["stages"]) - {TripStage.QUEUED.value}
+
+    resumed = _run_phase("resume", aircraft, env)
+    assert resumed["stages"] == []
+    finished = {key for phase in (crashed, resumed)
+                for key, operation in phase["operations"].items() if "finish" in operation}
+    assert finished == {f"boarding/A{i}" for i in range(aircraft)}
+    # Ни один самолёт не получил finish дважды (по разу в каждом процессе)
+    assert not {key for key, operation in crashed["operations"].items() if "finish" in operation} & \
+        {key for key, operation in resumed["operations"].items() if "finish" in operation}